@@ -0,0 +1,298 @@
+import json
+import re
+import zlib
+
+# Provider policies, configured per kind of request
+POLICY_LOCAL = 'local'              # local provider only, never calls the LLM
+POLICY_LOCAL_FIRST = 'local_first'  # answer locally now, upgrade to the LLM answer in the background
+POLICY_LLM = 'llm'                  # LLM, with the local provider as fallback
+
+# What each SOLO level asks of a learner; also used when prompting for new questions
+SOLO_LEVEL_GUIDELINES = {
+    'Pre-structural': 'Test misconceptions',
+    'Uni-structural': 'Single concept focus',
+    'Multi-structural': 'Multiple related concepts',
+    'Relational': 'Connections between concepts',
+    'Extended Abstract': 'Real-world applications'
+}
+
+HINT_FALLBACK = "Think about the fundamental concepts we've covered in this topic. Consider the relationships between different elements."
+FEEDBACK_FALLBACK = "Great effort! Keep building your understanding of Knowledge Graphs step by step."
+ANALYSIS_FALLBACK = "You're making excellent progress in your Knowledge Graph learning journey! Keep exploring and connecting concepts across different levels."
+
+
+def build_hint_prompt(question):
+    """Build the Gemini prompt for a hint on one question"""
+    return f"""
+        As an expert Knowledge Graph educator, provide a subtle hint for this SOLO {question['level']} level question about {question['topic']}:
+        
+        Question: {question['question']}
+        
+        Provide a brief, encouraging hint that guides thinking without giving away the answer. Keep it under 50 words and make it engaging.
+        """
+
+
+def build_feedback_prompt(question, selected_option, is_correct):
+    """Build the Gemini prompt for feedback on one answer"""
+    options = question['options']
+    correct_option = question['correct_option']
+
+    return f"""
+        As a Knowledge Graph learning expert, provide personalized feedback for this student response:
+        
+        Question: {question['question']}
+        SOLO Level: {question['level']}
+        Topic: {question['topic']}
+        Options: {', '.join(options)}
+        Student Selected: {selected_option}
+        Correct Answer: {correct_option}
+        Result: {'Correct' if is_correct else 'Incorrect'}
+        
+        Provide encouraging, specific feedback that:
+        1. Acknowledges their thinking process
+        2. Explains why the answer is correct/incorrect
+        3. Connects to SOLO taxonomy level
+        4. Suggests next learning steps
+        
+        Keep it conversational and under 100 words.
+        """
+
+
+def build_analysis_prompt(answers, solo_performance):
+    """Build the Gemini prompt for the end-of-quiz analysis"""
+    # Prepare performance summary
+    performance_summary = []
+    for level, perf in solo_performance.items():
+        if perf['total'] > 0:
+            performance_summary.append(f"{level}: {perf['correct']}/{perf['total']} ({perf['percentage']:.0f}%)")
+
+    return f"""
+        As an expert educational psychologist specializing in SOLO Taxonomy and Knowledge Graphs, analyze this student's learning journey:
+        
+        Performance Summary:
+        {chr(10).join(performance_summary)}
+        
+        Total Questions: {len(answers)}
+        
+        Provide a comprehensive analysis including:
+        1. SOLO taxonomy progression insights
+        2. Knowledge Graph concept mastery
+        3. Learning strengths and growth areas
+        4. Specific recommendations for advancement
+        5. Motivational encouragement
+        
+        Structure as: **Strengths** | **Growth Areas** | **Next Steps** | **Encouragement**
+        Keep each section concise but meaningful.
+        """
+
+
+def build_question_prompt(topic, level, avoid=()):
+    """Build the Gemini prompt for generating a new question, distinct from the questions in `avoid`"""
+    guidelines = '\n'.join(f'        - {name}: {text}' for name, text in SOLO_LEVEL_GUIDELINES.items())
+    distinct = ''
+    if avoid:
+        existing = '\n'.join(f'        - {question}' for question in avoid)
+        distinct = f"""
+        The question must be clearly different from these existing questions:
+{existing}
+        """
+    return f"""
+        Create a {level} level Knowledge Graph question about {topic} following SOLO Taxonomy principles:
+        
+        SOLO Level Guidelines:
+{guidelines}
+        
+        Return a JSON object with:
+        {{
+            "question": "Question text",
+            "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+            "correct_option": "Exact text of correct option",
+            "explanation": "Detailed explanation"
+        }}
+        {distinct}
+        Ensure the question is educationally sound and appropriate for the SOLO level.
+        """
+
+
+def build_review_prompt(answers, solo_performance, feedback_items):
+    """Build the single Gemini prompt for a batched quiz review.
+
+    The response carries the end-of-quiz analysis and feedback for each of
+    ``feedback_items`` ((answer_number, question, selected_option, is_correct)
+    tuples) as one JSON object; see parse_review(). Feedback is keyed by the
+    answer's number, as a question can be answered twice in one quiz.
+    """
+    performance_summary = []
+    for level, perf in solo_performance.items():
+        if perf['total'] > 0:
+            performance_summary.append(f"{level}: {perf['correct']}/{perf['total']} ({perf['percentage']:.0f}%)")
+
+    answer_blocks = []
+    for number, question, selected_option, is_correct in feedback_items:
+        answer_blocks.append(f"""
+        Answer Number: {number}
+        Question: {question['question']}
+        SOLO Level: {question['level']}
+        Topic: {question['topic']}
+        Options: {', '.join(question['options'])}
+        Student Selected: {selected_option}
+        Correct Answer: {question['correct_option']}
+        Result: {'Correct' if is_correct else 'Incorrect'}""")
+
+    return f"""
+        As an expert educational psychologist specializing in SOLO Taxonomy and Knowledge Graphs, review this student's quiz:
+        
+        Performance Summary:
+        {chr(10).join(performance_summary)}
+        
+        Total Questions: {len(answers)}
+        
+        Answers needing feedback:
+        {''.join(answer_blocks)}
+        
+        Return a JSON object with:
+        {{
+            "analysis": "Comprehensive analysis structured as **Strengths** | **Growth Areas** | **Next Steps** | **Encouragement**",
+            "feedback": [
+                {{"answer_number": 1, "feedback": "Encouraging, specific feedback for that answer"}}
+            ]
+        }}
+        
+        The analysis should cover SOLO taxonomy progression, Knowledge Graph concept mastery and specific recommendations.
+        Give exactly one feedback entry per answer above, each conversational and under 60 words, explaining why the answer is correct or incorrect and connecting it to its SOLO level.
+        """
+
+
+def parse_review(response_text, answer_numbers):
+    """Validate a batched review response.
+
+    Returns (analysis, feedback) where analysis is a string or None and
+    feedback maps answer numbers from ``answer_numbers`` to feedback strings;
+    malformed or unexpected entries are dropped. Raises ValueError when the
+    response is not a usable JSON object.
+    """
+    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if not json_match:
+        raise ValueError('review response contains no JSON object')
+    data = json.loads(json_match.group())
+    if not isinstance(data, dict):
+        raise ValueError('review response is not a JSON object')
+
+    analysis = data.get('analysis')
+    if not isinstance(analysis, str) or not analysis.strip():
+        analysis = None
+    else:
+        analysis = analysis.strip()
+
+    feedback = {}
+    items = data.get('feedback')
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        number, text = item.get('answer_number'), item.get('feedback')
+        if isinstance(number, str) and number.isdigit():
+            number = int(number)
+        if number in answer_numbers and isinstance(text, str) and text.strip():
+            feedback.setdefault(number, text.strip())
+
+    if analysis is None and not feedback:
+        raise ValueError('review response has neither an analysis nor feedback')
+    return analysis, feedback
+
+
+class GeminiProvider:
+    """Hints, feedback and analysis written by Gemini.
+
+    ``generate_text(kind, prompt)`` makes the (cached, guarded) upstream call
+    and raises when it fails; ``cached_text(kind, prompt)`` returns a cached
+    response or None without calling upstream.
+    """
+
+    def __init__(self, generate_text, cached_text):
+        self._generate_text = generate_text
+        self._cached_text = cached_text
+
+    def hint(self, question):
+        return self._generate_text('hint', build_hint_prompt(question))
+
+    def feedback(self, question, selected_option, is_correct):
+        return self._generate_text('feedback', build_feedback_prompt(question, selected_option, is_correct))
+
+    def analysis(self, answers, solo_performance):
+        return self._generate_text('analysis', build_analysis_prompt(answers, solo_performance))
+
+    def cached(self, kind, *args):
+        """Return an already generated response for a hint/feedback/analysis call, or None"""
+        builders = {'hint': build_hint_prompt, 'feedback': build_feedback_prompt, 'analysis': build_analysis_prompt}
+        return self._cached_text(kind, builders[kind](*args))
+
+
+class LocalProvider:
+    """Instant hints, feedback and analysis assembled from the question bank.
+
+    Uses only what is already stored with each question (its explanation,
+    correct option and distractors) and the SOLO level guidelines, so it
+    never blocks and never fails.
+    """
+
+    def hint(self, question):
+        parts = []
+        guideline = SOLO_LEVEL_GUIDELINES.get(question.get('level'))
+        if guideline:
+            parts.append(f"This is a {question['level']} question ({guideline.lower()}).")
+        distractors = [option for option in question.get('options') or []
+                       if option != question.get('correct_option')]
+        if distractors:
+            # Rule out the same distractor every time for a given question
+            distractor = distractors[zlib.crc32(question['question'].encode('utf-8')) % len(distractors)]
+            parts.append(f'You can rule out "{distractor}".')
+        if not parts:
+            return HINT_FALLBACK
+        parts.append(f"Think about what you know about {question['topic']}.")
+        return ' '.join(parts)
+
+    def feedback(self, question, selected_option, is_correct):
+        if is_correct:
+            parts = [f'Well done, "{selected_option}" is correct.']
+        elif selected_option:
+            parts = [f'Not quite: the answer is "{question["correct_option"]}", not "{selected_option}".']
+        else:
+            parts = [f'The answer is "{question["correct_option"]}".']
+        if question.get('explanation'):
+            parts.append(question['explanation'])
+        guideline = SOLO_LEVEL_GUIDELINES.get(question['level'])
+        if guideline:
+            parts.append(f"{question['level']} questions are about {guideline.lower()}.")
+        return ' '.join(parts)
+
+    def analysis(self, answers, solo_performance):
+        attempted = [(level, perf) for level, perf in solo_performance.items() if perf['total'] > 0]
+        if not attempted:
+            return ANALYSIS_FALLBACK
+        best_level, best = max(attempted, key=lambda item: item[1]['percentage'])
+        weak = [(level, perf) for level, perf in attempted if perf['percentage'] < 100]
+
+        sections = ['**Strengths**',
+                    f"Your strongest level was {best_level} ({best['correct']}/{best['total']} correct)."]
+        sections.append('**Growth Areas**')
+        if weak:
+            weakest_level, weakest = min(weak, key=lambda item: item[1]['percentage'])
+            sections.append(f"{weakest_level} ({weakest['correct']}/{weakest['total']} correct): "
+                            f"{SOLO_LEVEL_GUIDELINES.get(weakest_level, 'review these questions').lower()}.")
+        else:
+            sections.append('You answered every question correctly.')
+
+        sections.append('**Next Steps**')
+        levels = list(SOLO_LEVEL_GUIDELINES)
+        highest = max((levels.index(level) for level, _ in attempted if level in levels), default=len(levels) - 1)
+        if weak:
+            sections.append(f'Revisit the explanations for the {weakest_level} questions you missed.')
+        elif highest + 1 < len(levels):
+            next_level = levels[highest + 1]
+            sections.append(f'Move on to {next_level} questions: {SOLO_LEVEL_GUIDELINES[next_level].lower()}.')
+        else:
+            sections.append('Apply what you know to a Knowledge Graph of your own.')
+
+        sections.append('**Encouragement**')
+        sections.append(ANALYSIS_FALLBACK)
+        return '\n'.join(sections)
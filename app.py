@@ -1,30 +1,155 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, flash, session, jsonify, g,
+                   has_app_context, Response, stream_with_context)
 import sqlite3
 import json
+import base64
 import os
 from datetime import datetime
 import random
-import google.generativeai as genai
+import uuid
+import hashlib
+import threading
+import click
+import functools
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any
 from dotenv import load_dotenv
+from llm_cache import LLMCache
+from write_behind import WriteBehindQueue
+from quiz_sessions import SQLiteQuizSessionStore, MemoryQuizSessionStore
+from storage import SQLiteStorage, PostgresStorage, MemoryStorage
+from scheduler import AdaptiveScheduler
+from metrics import MetricsRegistry
+from question_io import export_questions, import_questions
+from near_duplicates import NearDuplicateIndex
+from attempt_archive import AttemptArchive, scan_attempts
+from leaderboards import SCOPES as LEADERBOARD_SCOPES, current_periods, scan_results
+from resilience import UpstreamGuard, CircuitBreaker, UpstreamUnavailable
+from ai_providers import (GeminiProvider, LocalProvider, POLICY_LOCAL, POLICY_LOCAL_FIRST, POLICY_LLM, SOLO_LEVEL_GUIDELINES,
+                          ANALYSIS_FALLBACK, build_feedback_prompt, build_analysis_prompt, build_question_prompt,
+                          build_review_prompt, parse_review)
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = 'soloquiz_secret_key_2024'
+app.config['DATABASE'] = os.getenv('SOLOQUIZ_DB', 'soloquiz.db')
+app.config['DB_BUSY_TIMEOUT'] = float(os.getenv('SOLOQUIZ_DB_BUSY_TIMEOUT', '5'))
+app.config['DB_SYNCHRONOUS'] = os.getenv('SOLOQUIZ_DB_SYNCHRONOUS', 'NORMAL')
+app.config['DB_STATEMENT_CACHE'] = int(os.getenv('SOLOQUIZ_DB_STATEMENT_CACHE', '256'))
+# 'sync' commits every attempt before responding; 'batched' queues attempts for group commit
+app.config['ATTEMPT_WRITE_MODE'] = os.getenv('ATTEMPT_WRITE_MODE', 'sync')
+app.config['ATTEMPT_BATCH_SIZE'] = int(os.getenv('ATTEMPT_BATCH_SIZE', '100'))
+app.config['ATTEMPT_FLUSH_INTERVAL'] = float(os.getenv('ATTEMPT_FLUSH_INTERVAL', '0.05'))
+app.config['ATTEMPT_QUEUE_SIZE'] = int(os.getenv('ATTEMPT_QUEUE_SIZE', '10000'))
+# Batches that cannot be written are kept in this file and replayed (default: next to the database)
+app.config['ATTEMPT_SPILL_PATH'] = os.getenv('ATTEMPT_SPILL_PATH')
+# Attempts older than ATTEMPT_HOT_DAYS can be moved by `flask archive-attempts` into compressed
+# monthly files under ATTEMPT_ARCHIVE_DIR (default: next to the database)
+app.config['ATTEMPT_HOT_DAYS'] = int(os.getenv('ATTEMPT_HOT_DAYS', '180'))
+app.config['ATTEMPT_ARCHIVE_DIR'] = os.getenv('ATTEMPT_ARCHIVE_DIR')
+# Where questions, attempts, quiz sessions and the LLM cache live: 'sqlite' (the DATABASE file),
+# 'postgres' (DATABASE_URL, shared by any number of app nodes) or 'memory' (one process, for tests).
+# Drafts, generation jobs and the attempt archive always stay in the SQLite database.
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'sqlite')
+app.config['DATABASE_URL'] = os.getenv('DATABASE_URL')
+app.config['DB_POOL_MIN'] = int(os.getenv('DB_POOL_MIN', '1'))
+app.config['DB_POOL_MAX'] = int(os.getenv('DB_POOL_MAX', '10'))
+# With the sqlite backend: 'sqlite' is shared by all workers; 'memory' is only suitable for a single process
+app.config['QUIZ_SESSION_STORE'] = os.getenv('QUIZ_SESSION_STORE', 'sqlite')
+# 'fixed' asks every question in bank order; 'adaptive' picks ADAPTIVE_QUIZ_LENGTH questions per quiz
+# from the student's SOLO-level mastery and spaced-repetition reviews of missed questions
+app.config['QUIZ_MODE'] = os.getenv('QUIZ_MODE', 'fixed')
+app.config['ADAPTIVE_QUIZ_LENGTH'] = int(os.getenv('ADAPTIVE_QUIZ_LENGTH', '10'))
+app.config['ADAPTIVE_MASTERY_THRESHOLD'] = float(os.getenv('ADAPTIVE_MASTERY_THRESHOLD', '0.8'))
+app.config['ADAPTIVE_MIN_ANSWERS'] = int(os.getenv('ADAPTIVE_MIN_ANSWERS', '3'))
+app.config['REVIEW_RELEARN_SECONDS'] = float(os.getenv('REVIEW_RELEARN_SECONDS', '600'))
+# Leaderboards keep this many leaders per scope and window
+app.config['LEADERBOARD_SIZE'] = int(os.getenv('LEADERBOARD_SIZE', '20'))
+# 'per_answer' generates AI feedback after every answer; 'batched' asks Gemini once, at the
+# end of the quiz, for the analysis and the feedback on every answer
+app.config['FEEDBACK_MODE'] = os.getenv('FEEDBACK_MODE', 'per_answer')
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv('GEMINI_API_KEY', 'your-gemini-api-key-here'))
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
+# Metrics; set METRICS_DIR to a directory shared by all gunicorn workers to aggregate them
+metrics = MetricsRegistry(multiprocess_dir=os.getenv('METRICS_DIR'))
+metrics.describe('soloquiz_request_duration_seconds', 'histogram', 'Request latency by Flask endpoint')
+metrics.describe('soloquiz_requests_total', 'counter', 'Requests by Flask endpoint and status code')
+metrics.describe('soloquiz_sql_duration_seconds', 'histogram', 'SQLite statement time, including fetches')
+metrics.describe('soloquiz_ai_duration_seconds', 'histogram', 'AI helper latency')
+metrics.describe('soloquiz_ai_requests_total', 'counter', 'AI helper calls')
+metrics.describe('soloquiz_ai_errors_total', 'counter', 'AI helper calls where Gemini failed')
+metrics.describe('soloquiz_ai_fallbacks_total', 'counter', 'AI helper calls answered with fallback content')
+metrics.describe('soloquiz_ai_rejected_total', 'counter', 'Gemini calls refused or abandoned by the upstream guard')
 
-# Database initialization
-def init_db():
-    """Initialize database and create tables"""
-    conn = sqlite3.connect('soloquiz.db')
-    cursor = conn.cursor()
-    
-    # Create tables
-    cursor.execute('''
+# Gemini AI client, created on first use so startup doesn't pay for the SDK import
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Return the Gemini model, configuring the client on first use"""
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY', 'your-gemini-api-key-here'))
+                model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    return model
+
+# Every Gemini call goes through this guard: a per-process concurrency cap with a
+# bounded wait queue, a deadline per kind of call and a circuit breaker
+app.config['AI_MAX_CONCURRENT'] = int(os.getenv('AI_MAX_CONCURRENT', '8'))
+app.config['AI_MAX_WAITING'] = int(os.getenv('AI_MAX_WAITING', '32'))
+app.config['AI_DEADLINES'] = {
+    # Hints are requested mid-question, so they fail fast; the analysis can take longer
+    'hint': float(os.getenv('AI_DEADLINE_HINT', '3')),
+    'feedback': float(os.getenv('AI_DEADLINE_FEEDBACK', '10')),
+    'analysis': float(os.getenv('AI_DEADLINE_ANALYSIS', '30')),
+    'question': float(os.getenv('AI_DEADLINE_QUESTION', '20')),
+    'review': float(os.getenv('AI_DEADLINE_REVIEW', '45'))
+}
+ai_guard = UpstreamGuard(
+    max_concurrent=app.config['AI_MAX_CONCURRENT'],
+    max_waiting=app.config['AI_MAX_WAITING'],
+    breaker=CircuitBreaker(failure_threshold=int(os.getenv('AI_BREAKER_FAILURES', '5')),
+                           reset_timeout=float(os.getenv('AI_BREAKER_RESET', '30')))
+)
+
+# Which provider answers each kind of request: 'local' (instant, never calls Gemini),
+# 'local_first' (local answer now, Gemini answer generated in the background) or
+# 'llm' (Gemini, with the local answer as fallback)
+app.config['AI_POLICIES'] = {
+    'hint': os.getenv('AI_POLICY_HINT', POLICY_LLM),
+    'feedback': os.getenv('AI_POLICY_FEEDBACK', POLICY_LLM),
+    'analysis': os.getenv('AI_POLICY_ANALYSIS', POLICY_LLM)
+}
+
+# Background pool for AI work so answer submissions don't wait on Gemini
+feedback_executor = ThreadPoolExecutor(max_workers=int(os.getenv('AI_FEEDBACK_WORKERS', '8')),
+                                       thread_name_prefix='ai-feedback')
+
+# Bulk question generation jobs share one bounded pool per process
+app.config['GENERATION_WORKERS'] = int(os.getenv('GENERATION_WORKERS', '4'))
+app.config['GENERATION_RETRIES'] = int(os.getenv('GENERATION_RETRIES', '2'))
+app.config['GENERATION_MAX_QUESTIONS'] = int(os.getenv('GENERATION_MAX_QUESTIONS', '200'))
+generation_executor = ThreadPoolExecutor(max_workers=app.config['GENERATION_WORKERS'],
+                                         thread_name_prefix='question-generation')
+
+# Questions at least this similar (Jaccard over word shingles) to an existing one are duplicates
+app.config['DUPLICATE_THRESHOLD'] = float(os.getenv('DUPLICATE_THRESHOLD', '0.7'))
+
+# Item analysis reads the whole attempt history, so it runs in the background and /admin shows
+# the latest result; one older than this (or from another question bank version) is recomputed
+app.config['ITEM_ANALYSIS_MAX_AGE'] = float(os.getenv('ITEM_ANALYSIS_MAX_AGE', '300'))
+item_analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='item-analysis')
+
+SOLO_LEVEL_ORDER = {level: order for order, level in enumerate(SOLO_LEVEL_GUIDELINES, start=1)}
+
+# Database schema, applied as numbered migrations tracked in PRAGMA user_version
+def _migration_base_tables(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS questions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             topic TEXT NOT NULL,
@@ -38,7 +163,7 @@ def init_db():
         )
     ''')
     
-    cursor.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS attempts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT NOT NULL,
@@ -49,19 +174,333 @@ def init_db():
             FOREIGN KEY(question_id) REFERENCES questions(id)
         )
     ''')
+
+def _migration_question_bank_version(conn):
+    # Shared counters (e.g. the question bank version) visible to every worker
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('question_bank_version', 0)")
+    
+    # Bump the question bank version on every write so cached copies are invalidated
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS questions_version_after_{event.lower()}
+            AFTER {event} ON questions
+            BEGIN
+                UPDATE app_meta SET value = value + 1 WHERE key = 'question_bank_version';
+            END
+        ''')
+
+def _migration_attempt_feedback(conn):
+    # AI feedback generated in the background, polled by the quiz page
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attempt_feedback (
+            attempt_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            feedback TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migration_llm_cache(conn):
+    # Persistent tier of the LLM response cache
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)')
+
+def _migration_precomputed_feedback(conn):
+    # Feedback precomputed offline for every (question, option) pair
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS precomputed_feedback (
+            question_id INTEGER NOT NULL,
+            option_index INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            feedback TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (question_id, option_index)
+        )
+    ''')
+
+def _migration_progress_rollups(conn):
+    # Progress rollups, updated in the same transaction as each attempt
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS topic_stats (
+            topic TEXT PRIMARY KEY,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS level_stats (
+            level TEXT PRIMARY KEY,
+            level_order INTEGER NOT NULL,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_level_stats (
+            username TEXT NOT NULL,
+            level TEXT NOT NULL,
+            level_order INTEGER NOT NULL,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, level)
+        )
+    ''')
     
-    conn.commit()
+    # Backfill from the existing attempt history
+    rebuild_progress_rollups(conn, commit=False)
+
+def _migration_quiz_sessions(conn):
+    # Server-side quiz progress; the cookie only holds the session id
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_sessions (
+            session_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            current_index INTEGER NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL DEFAULT 0,
+            answers TEXT NOT NULL DEFAULT '',
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_sessions_updated_at ON quiz_sessions(updated_at)')
+
+def _migration_question_generation(conn):
+    # Bulk generation jobs and the drafts they produce, which admins review before publishing
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            generated INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_drafts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            level TEXT NOT NULL,
+            level_order INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_option TEXT NOT NULL,
+            explanation TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_drafts_job_id ON question_drafts(job_id)')
+
+def _migration_user_progress(conn):
+    # Newest-first attempt history per user, read from the index alone; the trailing
+    # columns make it covering, and `id` breaks ties between equal timestamps
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_attempts_username_timestamp
+                    ON attempts(username, timestamp, id, question_id, selected_option, is_correct)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_attempts_question_id ON attempts(question_id)')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_topic_stats (
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, topic)
+        )
+    ''')
+    # Backfill the new rollup; nothing can have been archived before migration 10
+    rebuild_user_topic_rollup(conn)
+
+def _migration_attempt_archive(conn):
+    # Committed segments of the attempt archive; a segment file is only read once listed here
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attempt_archive (
+            path TEXT PRIMARY KEY,
+            month TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            min_id INTEGER NOT NULL,
+            max_id INTEGER NOT NULL,
+            min_timestamp TEXT NOT NULL,
+            max_timestamp TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_adaptive_scheduling(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_mastery (
+            username TEXT NOT NULL,
+            level TEXT NOT NULL,
+            level_order INTEGER NOT NULL,
+            mastery REAL NOT NULL,
+            answered INTEGER NOT NULL,
+            last_new_id INTEGER NOT NULL,
+            PRIMARY KEY (username, level)
+        )
+    ''')
+    # Spaced-repetition queue; the next due review of a user is the first entry of idx_review_queue_due
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS review_queue (
+            username TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            due_at REAL NOT NULL,
+            interval_seconds REAL NOT NULL,
+            ease REAL NOT NULL,
+            repetitions INTEGER NOT NULL,
+            PRIMARY KEY (username, question_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_review_queue_due ON review_queue(username, due_at, question_id)')
+
+def _migration_leaderboards(conn):
+    # Scores per (scope, period, user); scope is 'overall', 'topic:<topic>' or 'level:<level>'
+    # and period 'all' or an ISO week
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_scores (
+            scope TEXT NOT NULL,
+            period TEXT NOT NULL,
+            username TEXT NOT NULL,
+            correct INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (scope, period, username)
+        )
+    ''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_leaderboard_scores_rank
+                    ON leaderboard_scores(scope, period, correct DESC, total, username)''')
+    # Users per score, so a rank is a sum over distinct scores rather than a count of users
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_score_counts (
+            scope TEXT NOT NULL,
+            period TEXT NOT NULL,
+            correct INTEGER NOT NULL,
+            users INTEGER NOT NULL,
+            PRIMARY KEY (scope, period, correct)
+        )
+    ''')
+    # The top LEADERBOARD_SIZE of each leaderboard, as served by /leaderboard
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_top (
+            scope TEXT NOT NULL,
+            period TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            correct INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (scope, period, position)
+        )
+    ''')
+    
+    # Backfill from the attempt history, archive included
+    questions = {row['id']: dict(row) for row in conn.execute('SELECT id, topic, level FROM questions')}
+    chunks = scan_attempts(conn, get_attempt_archive(), ('username', 'question_id', 'is_correct', 'timestamp'))
+    store = SQLiteStorage(lambda: conn, None, get_attempt_archive, leaderboard_size=app.config['LEADERBOARD_SIZE'])
+    store.replace_leaderboards(scan_results(chunks, questions), commit=False)
+
+def _migration_question_search(conn):
+    # Admin question browser: keyset order over the whole bank and within a level
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_browse ON questions(topic, level_order, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_level ON questions(level, topic, level_order, id)')
+    
+    # Full-text index over question text, options and explanation, reading the text from `questions`.
+    # Unstemmed, so word prefixes match as they do on the PostgreSQL and memory backends.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            question, options, explanation,
+            content='questions', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_after_insert AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO questions_fts (rowid, question, options, explanation)
+            VALUES (new.id, new.question, new.options, new.explanation);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_after_delete AFTER DELETE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, options, explanation)
+            VALUES ('delete', old.id, old.question, old.options, old.explanation);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_fts_after_update AFTER UPDATE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, options, explanation)
+            VALUES ('delete', old.id, old.question, old.options, old.explanation);
+            INSERT INTO questions_fts (rowid, question, options, explanation)
+            VALUES (new.id, new.question, new.options, new.explanation);
+        END
+    ''')
+    conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
+# Append new migrations to the end; never edit or reorder applied ones
+SCHEMA_MIGRATIONS = [
+    (1, 'questions and attempts tables', _migration_base_tables),
+    (2, 'question bank version counter', _migration_question_bank_version),
+    (3, 'background attempt feedback', _migration_attempt_feedback),
+    (4, 'LLM response cache', _migration_llm_cache),
+    (5, 'precomputed feedback', _migration_precomputed_feedback),
+    (6, 'progress rollups', _migration_progress_rollups),
+    (7, 'server-side quiz sessions', _migration_quiz_sessions),
+    (8, 'bulk question generation', _migration_question_generation),
+    (9, 'per-user progress', _migration_user_progress),
+    (10, 'attempt archive', _migration_attempt_archive),
+    (11, 'adaptive scheduling', _migration_adaptive_scheduling),
+    (12, 'leaderboards', _migration_leaderboards),
+    (13, 'question search', _migration_question_search),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def migrate_db(conn):
+    """Apply pending schema migrations; returns the descriptions of those applied"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return []
+    
+    applied = []
+    # BEGIN IMMEDIATE serializes workers that start migrating at the same time
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+        for version, description, migration in SCHEMA_MIGRATIONS:
+            if version > current:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                applied.append(f'{version}: {description}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+def init_db():
+    """Create the database or upgrade it to the latest schema version"""
+    conn = connect_db()
+    applied = migrate_db(conn)
     conn.close()
+    return applied
 
 def seed_database():
-    """Seed database with sample questions"""
-    conn = sqlite3.connect('soloquiz.db')
-    cursor = conn.cursor()
-    
+    """Seed the question bank with sample questions"""
     # Check if questions already exist
-    cursor.execute('SELECT COUNT(*) FROM questions')
-    if cursor.fetchone()[0] > 0:
-        conn.close()
+    if storage.question_count() > 0:
         return
     
     # Sample questions for Knowledge Graphs
@@ -306,29 +745,348 @@ def seed_database():
     ]
     
     # Insert sample questions
-    for q in sample_questions:
-        cursor.execute('''
-            INSERT INTO questions (topic, level, level_order, question, options, correct_option, explanation)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (q['topic'], q['level'], q['level_order'], q['question'], q['options'], q['correct_option'], q['explanation']))
-    
-    conn.commit()
-    conn.close()
+    storage.add_questions(sample_questions)
     print("Database seeded with sample questions!")
 
-def get_db_connection():
-    conn = sqlite3.connect('soloquiz.db')
+@functools.lru_cache(maxsize=512)
+def _statement_label(sql):
+    return ' '.join(sql.split())[:160]
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records execute and fetch time per SQL statement"""
+    _label = None
+    
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._label:
+                metrics.observe('soloquiz_sql_duration_seconds', time.perf_counter() - start,
+                                statement=self._label)
+    
+    def execute(self, sql, parameters=()):
+        self._label = _statement_label(sql)
+        return self._timed(super().execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._label = _statement_label(sql)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+    
+    def fetchone(self):
+        return self._timed(super().fetchone)
+    
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, size or self.arraysize)
+    
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through InstrumentedCursor"""
+    
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def connect_db():
+    """Open a new tuned connection to the configured database"""
+    conn = sqlite3.connect(app.config['DATABASE'],
+                           timeout=app.config['DB_BUSY_TIMEOUT'],
+                           cached_statements=app.config['DB_STATEMENT_CACHE'],
+                           factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the single writer instead of blocking on the rollback journal
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f"PRAGMA synchronous={app.config['DB_SYNCHRONOUS']}")
     return conn
 
-# Initialize database and seed on startup
-if not os.path.exists('soloquiz.db'):
-    init_db()
+_thread_db = threading.local()
+_schema_checked = False
+
+def _open_connection():
+    """Open a connection, bringing an outdated schema up to date once per process"""
+    global _schema_checked
+    conn = connect_db()
+    if not _schema_checked:
+        migrate_db(conn)
+        _schema_checked = True
+    return conn
+
+def get_db_connection():
+    """Return the connection for the current request, or for this thread outside a request.
+
+    The connection is shared and closed automatically, so callers must not close it.
+    """
+    if has_app_context():
+        if 'db' not in g:
+            g.db = _open_connection()
+        return g.db
+    
+    conn = getattr(_thread_db, 'conn', None)
+    if conn is None:
+        conn = _thread_db.conn = _open_connection()
+    return conn
+
+def get_attempt_archive():
+    """The cold tier of the attempt history"""
+    return AttemptArchive(app.config['ATTEMPT_ARCHIVE_DIR'] or f"{app.config['DATABASE']}-archive")
+
+@app.teardown_appcontext
+def close_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+# Storage repository for questions, attempts, quiz sessions and cached AI output
+def create_storage():
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 'postgres':
+        store = PostgresStorage(app.config['DATABASE_URL'], min_connections=app.config['DB_POOL_MIN'],
+                                max_connections=app.config['DB_POOL_MAX'],
+                                leaderboard_size=app.config['LEADERBOARD_SIZE'])
+        store.create_schema()
+        return store
+    if backend == 'memory':
+        return MemoryStorage(leaderboard_size=app.config['LEADERBOARD_SIZE'])
+    if app.config['QUIZ_SESSION_STORE'] == 'memory':
+        sessions = MemoryQuizSessionStore()
+    else:
+        sessions = SQLiteQuizSessionStore(connect=get_db_connection)
+    return SQLiteStorage(get_db_connection, sessions, get_attempt_archive,
+                         leaderboard_size=app.config['LEADERBOARD_SIZE'])
+
+storage = create_storage()
+quiz_sessions = storage.sessions
+if app.config['STORAGE_BACKEND'] == 'memory':
     seed_database()
 
+scheduler = AdaptiveScheduler(storage, mastery_threshold=app.config['ADAPTIVE_MASTERY_THRESHOLD'],
+                              min_answers=app.config['ADAPTIVE_MIN_ANSWERS'],
+                              relearn_interval=app.config['REVIEW_RELEARN_SECONDS'])
+
+
+# Question bank cache
+QuestionBank = namedtuple('QuestionBank', ['version', 'questions', 'by_id'])
+
+_question_bank = QuestionBank(version=None, questions=[], by_id={})
+_question_bank_lock = threading.Lock()
+
+def question_content_hash(question):
+    """Hash of the fields that feed the feedback prompt, used to detect edited questions"""
+    content = json.dumps([question['question'], question['level'], question['topic'],
+                          question['options'], question['correct_option']])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def _question_from_row(row):
+    """Convert a questions row into a dict with its options already decoded"""
+    question = dict(row)
+    question['options'] = json.loads(question['options'])
+    question['content_hash'] = question_content_hash(question)
+    return question
+
+def get_question_bank():
+    """Return the cached question bank, reloading it if another write bumped the version"""
+    global _question_bank
+    version = storage.question_bank_version()
+    bank = _question_bank
+    if bank.version == version:
+        return bank
+    
+    with _question_bank_lock:
+        if _question_bank.version != version:
+            questions = [_question_from_row(row) for row in storage.list_questions()]
+            _question_bank = QuestionBank(
+                version=version,
+                questions=questions,
+                by_id={q['id']: q for q in questions}
+            )
+        return _question_bank
+
+# Near-duplicate index over the question bank, kept in step with its version
+question_index = NearDuplicateIndex(threshold=app.config['DUPLICATE_THRESHOLD'])
+
+def find_duplicate(text, exclude_id=None):
+    """Return (question, similarity) for the closest near-duplicate of `text` in the bank, or None"""
+    bank = get_question_bank()
+    if question_index.version != bank.version:
+        question_index.sync({q['id']: q['question'] for q in bank.questions}, bank.version)
+    for question_id, similarity in question_index.query(text, exclude=exclude_id):
+        if question_id in bank.by_id:
+            return bank.by_id[question_id], similarity
+    return None
+
+def duplicate_import_check():
+    """Build an import check rejecting rows that duplicate the bank or an earlier row of the same file"""
+    seen = NearDuplicateIndex(threshold=app.config['DUPLICATE_THRESHOLD'])
+    
+    def check(row, line_number):
+        duplicate = find_duplicate(row['question'], exclude_id=row['id'])
+        if duplicate is not None:
+            return f'near-duplicate of question {duplicate[0]["id"]} ({duplicate[1]:.0%} similar)'
+        matches = seen.query(row['question'])
+        if matches:
+            return f'near-duplicate of line {matches[0][0]} ({matches[0][1]:.0%} similar)'
+        seen.add(line_number, row['question'])
+        return None
+    return check
+
+# Item analysis, recomputed in the background at most every ITEM_ANALYSIS_MAX_AGE seconds
+_item_analysis = None  # (question bank version, computed at, ItemAnalysis)
+_item_analysis_job = None
+_item_analysis_lock = threading.Lock()
+
+def get_item_analysis():
+    """Return the latest question quality statistics, or None before the first run has finished.
+    
+    A stale result is returned as is while a background job recomputes it,
+    so the caller never waits for the attempt history to be scanned.
+    """
+    global _item_analysis_job
+    bank = get_question_bank()
+    cached = _item_analysis
+    if not (cached and cached[0] == bank.version
+            and time.time() - cached[1] < app.config['ITEM_ANALYSIS_MAX_AGE']):
+        with _item_analysis_lock:
+            if _item_analysis_job is None or _item_analysis_job.done():
+                _item_analysis_job = item_analysis_executor.submit(refresh_item_analysis, bank)
+    return cached[2] if cached else None
+
+def refresh_item_analysis(bank):
+    """Recompute the item analysis of `bank` from the whole attempt history"""
+    global _item_analysis
+    # Imported here so NumPy only loads in processes that run the analysis
+    from item_analysis import analyze_items
+    try:
+        chunks = storage.scan_attempts(('username', 'question_id', 'selected_option'))
+        _item_analysis = (bank.version, time.time(), analyze_items(chunks, bank.questions))
+    except Exception:
+        app.logger.exception('Item analysis failed')
+
+# LLM response cache (TTLs in seconds; 0 disables caching for that kind)
+llm_cache = LLMCache(
+    store=storage,
+    ttls={
+        'hint': int(os.getenv('LLM_CACHE_TTL_HINT', str(7 * 24 * 3600))),
+        'feedback': int(os.getenv('LLM_CACHE_TTL_FEEDBACK', str(7 * 24 * 3600))),
+        'analysis': int(os.getenv('LLM_CACHE_TTL_ANALYSIS', str(24 * 3600))),
+        'review': int(os.getenv('LLM_CACHE_TTL_REVIEW', str(24 * 3600))),
+        # Admins expect a fresh question on every click, so only coalesce by default
+        'question': int(os.getenv('LLM_CACHE_TTL_QUESTION', '0'))
+    },
+    memory_size=int(os.getenv('LLM_CACHE_MEMORY_SIZE', '1024')),
+    max_rows=int(os.getenv('LLM_CACHE_MAX_ROWS', '10000'))
+)
+
+def generate_text(kind, prompt):
+    """Call Gemini through the response cache and the upstream guard"""
+    deadline = app.config['AI_DEADLINES'][kind]
+    
+    def call_model():
+        response = get_model().generate_content(prompt, request_options={'timeout': deadline})
+        return response.text.strip()
+    
+    return llm_cache.get_or_generate(kind, prompt, lambda: ai_guard.call(call_model, timeout=deadline))
+
+gemini_provider = GeminiProvider(generate_text, llm_cache.get)
+local_provider = LocalProvider()
+
+def get_quiz_state():
+    """Return the current visitor's quiz state, or None if no quiz is in progress"""
+    return quiz_sessions.get(session.get('quiz_session_id'))
+
+def quiz_length(bank):
+    """Number of questions in a quiz"""
+    if app.config['QUIZ_MODE'] == 'adaptive':
+        return app.config['ADAPTIVE_QUIZ_LENGTH']
+    return len(bank.questions)
+
+def current_quiz_question(state, bank):
+    """The question the visitor is answering now, or None when the quiz is over"""
+    if app.config['QUIZ_MODE'] != 'adaptive':
+        return bank.questions[state.current_index] if state.current_index < len(bank.questions) else None
+    if state.current_index >= app.config['ADAPTIVE_QUIZ_LENGTH']:
+        return None
+    
+    # Keep showing the same pick until it is answered, even if a review falls due meanwhile
+    pending = session.get('adaptive_question')
+    if pending and pending[:2] == [state.session_id, state.current_index] and pending[2] in bank.by_id:
+        return bank.by_id[pending[2]]
+    question = scheduler.next_question(state.username, bank, time.time())
+    if question is not None:
+        session['adaptive_question'] = [state.session_id, state.current_index, question['id']]
+    return question
+
+def expand_answers(state, bank):
+    """Turn a session's compact (question_id, option_index) answers into answer dicts"""
+    answers = []
+    for question_id, option_index in state.answers:
+        question = bank.by_id.get(question_id)
+        if question is None:
+            continue
+        selected_option = question['options'][option_index] if 0 <= option_index < len(question['options']) else None
+        answers.append({
+            'question_id': question_id,
+            'selected_option': selected_option,
+            'is_correct': selected_option == question['correct_option'],
+            'level': question['level'],
+            'topic': question['topic'],
+            'question_text': question['question']
+        })
+    return answers
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are measured to the first byte
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('soloquiz_request_duration_seconds', time.perf_counter() - start,
+                        endpoint=endpoint, method=request.method)
+        metrics.inc('soloquiz_requests_total', endpoint=endpoint, status=str(response.status_code))
+    return response
+
+def track_ai_helper(func):
+    """Count calls to an AI helper and record their latency"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics.inc('soloquiz_ai_requests_total', helper=func.__name__)
+        with metrics.time('soloquiz_ai_duration_seconds', helper=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def record_ai_fallback(helper, error=None):
+    """Count an AI helper answering with fallback content, and the upstream error if any"""
+    if isinstance(error, UpstreamUnavailable):
+        metrics.inc('soloquiz_ai_rejected_total', helper=helper, reason=error.reason)
+    elif error is not None:
+        metrics.inc('soloquiz_ai_errors_total', helper=helper)
+    metrics.inc('soloquiz_ai_fallbacks_total', helper=helper)
+
+def get_precomputed_feedback(question, option_index):
+    """Return feedback warmed by `flask warm-feedback` for an option, if it is still current"""
+    if option_index < 0:
+        return None
+    return storage.precomputed_feedback(question['id'], option_index, question['content_hash'])
+
+def sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.template_filter('from_json')
 def from_json_filter(value):
-    return json.loads(value)
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
 
 @app.route('/')
 def home():
@@ -336,144 +1094,410 @@ def home():
 
 @app.route('/start_quiz')
 def start_quiz():
-    # Reset session for new quiz
-    session['current_question_index'] = 0
-    session['score'] = 0
-    session['answers'] = []
-    session['username'] = request.args.get('username', 'Anonymous')
-    session['ai_insights'] = []
+    if not get_question_bank().questions:
+        flash('There are no questions yet. Add some in Educator Mode or run `flask init-db`.', 'error')
+        return redirect(url_for('home'))
+    
+    # Start a new server-side quiz session
+    session.clear()
+    session['quiz_session_id'] = quiz_sessions.create(request.args.get('username', 'Anonymous'))
     
     return redirect(url_for('quiz'))
 
 @app.route('/quiz')
 def quiz():
-    if 'current_question_index' not in session:
+    state = get_quiz_state()
+    if state is None:
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions ORDER BY level_order, id').fetchall()
-    conn.close()
-    
-    if session['current_question_index'] >= len(questions):
+    bank = get_question_bank()
+    current_question = current_quiz_question(state, bank)
+    if current_question is None:
+        if state.current_index == 0:
+            flash('Nothing to practise right now: every question is answered and no reviews are due.', 'success')
+            return redirect(url_for('home'))
         return redirect(url_for('results'))
-    
-    current_question = questions[session['current_question_index']]
-    total_questions = len(questions)
+    total_questions = quiz_length(bank)
     
     return render_template('quiz.html', 
                          question=current_question,
-                         current_index=session['current_question_index'],
+                         current_index=state.current_index,
                          total_questions=total_questions)
 
 @app.route('/submit_answer', methods=['POST'])
 def submit_answer():
-    if 'current_question_index' not in session:
+    state = get_quiz_state()
+    if state is None:
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions ORDER BY level_order, id').fetchall()
-    current_question = questions[session['current_question_index']]
+    bank = get_question_bank()
+    current_question = current_quiz_question(state, bank)
+    if current_question is None:
+        return jsonify({'error': 'Quiz already finished', 'next_url': url_for('results')}), 409
     
     selected_option = request.form.get('answer')
     is_correct = selected_option == current_question['correct_option']
+    option_index = current_question['options'].index(selected_option) if selected_option in current_question['options'] else -1
     
-    if is_correct:
-        session['score'] += 1
+    # Store answer; a repeated submit for the same question is rejected
+    if not quiz_sessions.record_answer(state.session_id, state.current_index, current_question['id'],
+                                       option_index, is_correct):
+        return jsonify({'error': 'Answer already submitted', 'next_url': url_for('quiz')}), 409
+    if app.config['QUIZ_MODE'] == 'adaptive':
+        scheduler.record_answer(state.username, current_question, is_correct, time.time())
     
-    # Store answer
-    answer_data = {
-        'question_id': current_question['id'],
+    # Serve feedback warmed by `flask warm-feedback` when it is still current
+    ai_feedback = get_precomputed_feedback(current_question, option_index)
+    
+    # Save to database, either now or through the write-behind queue
+    attempt = {
+        'username': state.username,
+        'question': current_question,
         'selected_option': selected_option,
-        'is_correct': is_correct,
-        'level': current_question['level'],
-        'topic': current_question['topic'],
-        'question_text': current_question['question']
+        'is_correct': is_correct
     }
-    session['answers'].append(answer_data)
+    if app.config['ATTEMPT_WRITE_MODE'] == 'batched':
+        # Stamped now, as the write may happen much later if the batch has to be replayed
+        attempt['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        attempt_writer.put(attempt)
+        attempt_id = uuid.uuid4().hex
+    else:
+        attempt_id = str(storage.add_attempts([attempt]))
     
-    # Generate AI feedback using Gemini
-    ai_feedback = generate_ai_feedback(current_question, selected_option, is_correct)
-    
-    # Save to database
-    conn.execute('''INSERT INTO attempts 
-                    (username, question_id, selected_option, is_correct) 
-                    VALUES (?, ?, ?, ?)''',
-                 (session['username'], current_question['id'], selected_option, is_correct))
-    conn.commit()
-    conn.close()
-    
-    session['current_question_index'] += 1
+    # On a miss, generate AI feedback using Gemini in the background; the page polls for it.
+    # Depending on the feedback policy a local answer is shown meanwhile, or instead.
+    feedback_url = None
+    feedback_deferred = ai_feedback is None and app.config['FEEDBACK_MODE'] == 'batched'
+    if ai_feedback is None and not feedback_deferred:
+        policy = app.config['AI_POLICIES']['feedback']
+        if policy in (POLICY_LOCAL, POLICY_LOCAL_FIRST):
+            ai_feedback = local_provider.feedback(current_question, selected_option, is_correct)
+        if policy != POLICY_LOCAL:
+            feedback_executor.submit(run_feedback_job, attempt_id, current_question, selected_option, is_correct)
+            feedback_url = url_for('attempt_feedback', attempt_id=attempt_id)
     
     return jsonify({
         'is_correct': is_correct,
         'explanation': current_question['explanation'],
+        'attempt_id': attempt_id,
         'ai_feedback': ai_feedback,
-        'next_url': url_for('quiz') if session['current_question_index'] < len(questions) else url_for('results')
+        'feedback_url': feedback_url,
+        'feedback_deferred': feedback_deferred,
+        'next_url': url_for('quiz') if state.current_index + 1 < quiz_length(bank) else url_for('results')
     })
 
+@app.route('/attempt_feedback/<attempt_id>')
+def attempt_feedback(attempt_id):
+    """Poll for the AI feedback of a submitted answer"""
+    row = storage.attempt_feedback(attempt_id)
+    
+    if row is None:
+        return jsonify({'status': 'pending', 'ai_feedback': None})
+    
+    status, feedback = row
+    return jsonify({'status': status, 'ai_feedback': feedback})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint, aggregated across workers when METRICS_DIR is set"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/llm_cache_stats')
+def llm_cache_stats():
+    """Hit/miss counters of the LLM response cache and upstream guard state for this worker"""
+    return jsonify(dict(llm_cache.stats(), upstream=ai_guard.stats()))
+
 @app.route('/get_ai_hint', methods=['POST'])
 def get_ai_hint():
     """Get AI hint for current question"""
     data = request.get_json()
-    question_text = data.get('question')
-    level = data.get('level')
-    topic = data.get('topic')
+    question = get_question_bank().by_id.get(data.get('question_id'))
+    if question is None:
+        question = {
+            'question': data.get('question'),
+            'level': data.get('level'),
+            'topic': data.get('topic')
+        }
     
-    hint = generate_ai_hint(question_text, level, topic)
+    hint = generate_ai_hint(question)
     return jsonify({'hint': hint})
 
 @app.route('/results')
 def results():
-    if 'score' not in session:
+    state = get_quiz_state()
+    if state is None:
         return redirect(url_for('home'))
     
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions ORDER BY level_order, id').fetchall()
-    conn.close()
+    bank = get_question_bank()
+    # An adaptive quiz can end early when nothing is left to practise
+    total_questions = state.current_index if app.config['QUIZ_MODE'] == 'adaptive' else len(bank.questions)
     
-    total_questions = len(questions)
-    score = session['score']
-    percentage = (score / total_questions) * 100
+    score = state.score
+    percentage = (score / total_questions) * 100 if total_questions else 0
     
     # Calculate SOLO level performance
-    solo_performance = calculate_solo_performance(session['answers'])
-    
-    # Generate comprehensive AI analysis
-    ai_analysis = generate_comprehensive_ai_analysis(session['answers'], solo_performance)
+    answers = expand_answers(state, bank)
+    solo_performance = calculate_solo_performance(answers)
     
+    # The AI analysis (and in batched mode the feedback per answer) is streamed
+    # into the page by /results/analysis_stream
     return render_template('results.html',
                          score=score,
                          total_questions=total_questions,
                          percentage=percentage,
                          solo_performance=solo_performance,
-                         ai_analysis=ai_analysis)
+                         username=state.username,
+                         review_answers=answers if app.config['FEEDBACK_MODE'] == 'batched' else None,
+                         analysis_url=url_for('results_analysis_stream'))
+
+@app.route('/results/analysis_stream')
+def results_analysis_stream():
+    """Stream the comprehensive AI analysis as Server-Sent Events"""
+    state = get_quiz_state()
+    if state is None:
+        return redirect(url_for('home'))
+    
+    bank = get_question_bank()
+    answers = expand_answers(state, bank)
+    solo_performance = calculate_solo_performance(answers)
+    prompt = build_analysis_prompt(answers, solo_performance)
+    policy = app.config['AI_POLICIES']['analysis']
+    
+    deadline = app.config['AI_DEADLINES']['analysis']
+    
+    def open_stream():
+        return get_model().generate_content(prompt, stream=True, request_options={'timeout': deadline})
+    
+    def generate():
+        if policy == POLICY_LOCAL:
+            yield sse('chunk', {'text': local_provider.analysis(answers, solo_performance)})
+            yield sse('done', {})
+            return
+        
+        cached = llm_cache.get('analysis', prompt)
+        if cached is not None:
+            yield sse('chunk', {'text': cached})
+            yield sse('done', {})
+            return
+        
+        # A draft is shown until the first Gemini chunk replaces it
+        draft = policy == POLICY_LOCAL_FIRST
+        if draft:
+            yield sse('draft', {'text': local_provider.analysis(answers, solo_performance)})
+        
+        streamed = []
+        metrics.inc('soloquiz_ai_requests_total', helper='stream_ai_analysis')
+        try:
+            with metrics.time('soloquiz_ai_duration_seconds', helper='stream_ai_analysis'):
+                for chunk in ai_guard.stream(open_stream, timeout=deadline):
+                    if chunk.text:
+                        streamed.append(chunk.text)
+                        yield sse('chunk', {'text': chunk.text})
+        except Exception as e:
+            # Keep whatever already arrived; the page decides how to show the fallback
+            record_ai_fallback('stream_ai_analysis', e)
+            if streamed:
+                yield sse('fallback', {'text': ANALYSIS_FALLBACK, 'partial': True})
+            elif draft:
+                yield sse('done', {})
+            else:
+                yield sse('fallback', {'text': local_provider.analysis(answers, solo_performance), 'partial': False})
+            return
+        
+        if not streamed:
+            record_ai_fallback('stream_ai_analysis')
+            if draft:
+                yield sse('done', {})
+            else:
+                yield sse('fallback', {'text': local_provider.analysis(answers, solo_performance), 'partial': False})
+            return
+        llm_cache.put('analysis', prompt, ''.join(streamed).strip())
+        yield sse('done', {})
+    
+    if app.config['FEEDBACK_MODE'] == 'batched':
+        events = quiz_review_events(answers, solo_performance, bank)
+    else:
+        events = generate()
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/progress')
 def progress():
-    conn = get_db_connection()
+    username = request.args.get('username', '').strip()
     
-    # Get user's attempt history
-    attempts = conn.execute('''
-        SELECT a.*, q.level, q.topic 
-        FROM attempts a 
-        JOIN questions q ON a.question_id = q.id 
-        ORDER BY a.timestamp DESC
-    ''').fetchall()
-    
-    conn.close()
+    # Read the maintained rollups instead of scanning the attempt history
+    topic_stats, level_stats = storage.progress_stats(username or None)
     
     # Calculate progress metrics
-    progress_data = calculate_progress_metrics(attempts)
+    progress_data = calculate_progress_metrics(topic_stats, level_stats)
+    
+    return render_template('progress.html', progress_data=progress_data, username=username,
+                           history_url=url_for('api_progress', username=username) if username else None)
+
+def encode_cursor(*values):
+    """Opaque pagination token for the position after a row"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, *types):
+    """Inverse of encode_cursor, checked against the expected type of each value.
     
-    return render_template('progress.html', progress_data=progress_data)
+    Raises ValueError for a malformed token or, when `types` are given,
+    one that does not hold exactly one value of each of them.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('invalid cursor') from e
+    # bool is an int subclass, but never a valid cursor value
+    if not isinstance(values, list):
+        raise ValueError('invalid cursor')
+    if types and (len(values) != len(types) or any(isinstance(value, bool) or not isinstance(value, kind)
+                                                   for value, kind in zip(values, types))):
+        raise ValueError('invalid cursor')
+    return values
+
+@app.route('/api/progress/<username>')
+def api_progress(username):
+    """A user's attempt history, newest first, one keyset page at a time.
+    
+    Pass the returned `next_cursor` as `cursor` to get the following page;
+    it is null on the last page.
+    """
+    limit = request.args.get('limit', 20, type=int)
+    if not 1 <= limit <= 100:
+        return jsonify({'error': 'limit must be between 1 and 100'}), 400
+    
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            timestamp, attempt_id = decode_cursor(cursor, str, int)
+            datetime.fromisoformat(timestamp)
+        except ValueError:
+            return jsonify({'error': 'invalid cursor'}), 400
+        before = (timestamp, attempt_id)
+    rows = storage.user_attempts(username, before=before, limit=limit + 1)
+    
+    # The extra row only tells us whether there is another page
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    by_id = get_question_bank().by_id
+    attempts = []
+    for row in rows:
+        question = by_id.get(row['question_id'])
+        attempts.append({
+            'id': row['id'],
+            'question_id': row['question_id'],
+            'question': question['question'] if question else None,
+            'topic': question['topic'] if question else None,
+            'level': question['level'] if question else None,
+            'selected_option': row['selected_option'],
+            'is_correct': bool(row['is_correct']),
+            'timestamp': row['timestamp']
+        })
+    
+    return jsonify({
+        'username': username,
+        'attempts': attempts,
+        'next_cursor': encode_cursor(rows[-1]['timestamp'], rows[-1]['id']) if has_more else None
+    })
+
+def get_leaderboard(scope, name, window, username=None):
+    """A leaderboard's leaders plus, given a username, that user's standing; raises ValueError for an unknown board"""
+    if scope not in LEADERBOARD_SCOPES:
+        raise ValueError(f'scope must be one of {", ".join(LEADERBOARD_SCOPES)}')
+    periods = current_periods()
+    if window not in periods:
+        raise ValueError(f'window must be one of {", ".join(periods)}')
+    if scope != 'overall' and not name:
+        raise ValueError(f'a {scope} leaderboard needs a name')
+    
+    # Both reads are primary key lookups on tables of bounded size, whatever the attempt volume
+    key = 'overall' if scope == 'overall' else f'{scope}:{name}'
+    standing = storage.leaderboard_rank(key, periods[window], username) if username else None
+    return {
+        'scope': scope,
+        'name': name if scope != 'overall' else None,
+        'window': window,
+        'period': periods[window],
+        'leaders': storage.leaderboard(key, periods[window]),
+        'user': dict(standing, username=username) if standing else None
+    }
+
+@app.route('/leaderboard')
+def leaderboard():
+    bank = get_question_bank()
+    try:
+        board = get_leaderboard(request.args.get('scope', 'overall'), request.args.get('name', '').strip(),
+                                request.args.get('window', 'all'), request.args.get('username', '').strip())
+    except ValueError as e:
+        flash(f'Unknown leaderboard: {e}.', 'error')
+        board = get_leaderboard('overall', '', 'all')
+    
+    return render_template('leaderboard.html', board=board,
+                           topics=sorted({q['topic'] for q in bank.questions}),
+                           levels=sorted({q['level'] for q in bank.questions}, key=lambda level: SOLO_LEVEL_ORDER.get(level, 0)),
+                           username=request.args.get('username', '').strip())
+
+@app.route('/api/leaderboard')
+def api_leaderboard():
+    """Top users of a leaderboard (?scope=overall|topic|level&name=...&window=all|week), plus ?username's rank"""
+    try:
+        board = get_leaderboard(request.args.get('scope', 'overall'), request.args.get('name', '').strip(),
+                                request.args.get('window', 'all'), request.args.get('username', '').strip())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(board)
 
 @app.route('/admin')
 def admin():
-    conn = get_db_connection()
-    questions = conn.execute('SELECT * FROM questions ORDER BY topic, level_order').fetchall()
-    conn.close()
+    # The question list itself is loaded a page at a time from /api/questions
+    return render_template('admin.html', question_count=storage.question_count(), drafts=storage.question_drafts(),
+                           topics=sorted({q['topic'] for q in get_question_bank().questions}),
+                           solo_levels=list(SOLO_LEVEL_ORDER), item_analysis=get_item_analysis())
+
+@app.route('/api/questions')
+def api_questions():
+    """Search the question bank (?q=free text&topic=...&level=...), one keyset page at a time.
+    
+    Results are ordered by topic, SOLO level and id. Pass the returned
+    `next_cursor` as `cursor` to get the following page; it is null on
+    the last page.
+    """
+    limit = request.args.get('limit', 20, type=int)
+    if not 1 <= limit <= 100:
+        return jsonify({'error': 'limit must be between 1 and 100'}), 400
     
-    return render_template('admin.html', questions=questions)
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            topic, level_order, question_id = decode_cursor(cursor, str, int, int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        after = (topic, level_order, question_id)
+    rows = storage.search_questions(text=request.args.get('q', '').strip() or None,
+                                    topic=request.args.get('topic') or None,
+                                    level=request.args.get('level') or None,
+                                    after=after, limit=limit + 1)
+    
+    # The extra row only tells us whether there is another page
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    questions = [{
+        'id': row['id'],
+        'topic': row['topic'],
+        'level': row['level'],
+        'question': row['question'],
+        'options': json.loads(row['options']),
+        'correct_option': row['correct_option'],
+        'explanation': row['explanation']
+    } for row in rows]
+    
+    return jsonify({
+        'questions': questions,
+        'next_cursor': encode_cursor(rows[-1]['topic'], rows[-1]['level_order'], rows[-1]['id']) if has_more else None
+    })
 
 @app.route('/add_question', methods=['POST'])
 def add_question():
@@ -489,26 +1513,47 @@ def add_question():
     correct_option = request.form['correct_option']
     explanation = request.form['explanation']
     
-    # Map SOLO levels to order
-    level_order_map = {
-        'Pre-structural': 1,
-        'Uni-structural': 2,
-        'Multi-structural': 3,
-        'Relational': 4,
-        'Extended Abstract': 5
-    }
+    duplicate = find_duplicate(question)
+    if duplicate is not None:
+        existing, similarity = duplicate
+        flash(f'Not added: this question is {similarity:.0%} similar to existing question '
+              f'#{existing["id"]} ("{existing["question"]}").', 'error')
+        return redirect(url_for('admin'))
     
-    conn = get_db_connection()
-    conn.execute('''INSERT INTO questions 
-                    (topic, level, level_order, question, options, correct_option, explanation) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                 (topic, level, level_order_map[level], question, options, correct_option, explanation))
-    conn.commit()
-    conn.close()
+    question_id = storage.add_question({
+        'topic': topic,
+        'level': level,
+        'level_order': SOLO_LEVEL_ORDER[level],
+        'question': question,
+        'options': options,
+        'correct_option': correct_option,
+        'explanation': explanation
+    })
+    question_index.add(question_id, question)
     
     flash('Question added successfully!', 'success')
     return redirect(url_for('admin'))
 
+@app.route('/export_questions')
+def export_questions_endpoint():
+    """Download the question bank as JSONL, streamed as it is read"""
+    # stream_with_context keeps the request context, and so SQLite's connection, open while batches are read
+    return Response(stream_with_context(export_questions(storage)), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=questions.jsonl'})
+
+@app.route('/import_questions', methods=['POST'])
+def import_questions_endpoint():
+    """Upsert questions from an uploaded JSONL file (or a raw JSONL body)"""
+    upload = request.files.get('file')
+    lines = upload.stream if upload else request.stream
+    
+    result = import_questions(storage, lines, SOLO_LEVEL_ORDER, check=duplicate_import_check())
+    return jsonify({
+        'imported': result.imported,
+        'error_count': result.error_count,
+        'errors': [{'line': line, 'error': error} for line, error in result.errors]
+    })
+
 @app.route('/generate_question', methods=['POST'])
 def generate_question():
     """Generate a new question using Gemini AI"""
@@ -519,122 +1564,263 @@ def generate_question():
     generated_question = generate_ai_question(topic, level)
     return jsonify(generated_question)
 
-# AI Helper Functions using Gemini 2.0 Flash
-def generate_ai_hint(question_text, level, topic):
-    """Generate a helpful hint using Gemini"""
+@app.route('/generate_questions', methods=['POST'])
+def generate_questions():
+    """Start a background job generating `count` questions for every topic and level"""
+    data = request.get_json()
+    topics = [topic.strip() for topic in data.get('topics', []) if isinstance(topic, str) and topic.strip()]
+    levels = data.get('levels', [])
     try:
-        prompt = f"""
-        As an expert Knowledge Graph educator, provide a subtle hint for this SOLO {level} level question about {topic}:
-        
-        Question: {question_text}
-        
-        Provide a brief, encouraging hint that guides thinking without giving away the answer. Keep it under 50 words and make it engaging.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return "Think about the fundamental concepts we've covered in this topic. Consider the relationships between different elements."
+        count = int(data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    
+    if not topics or not levels:
+        return jsonify({'error': 'Select at least one topic and one SOLO level'}), 400
+    unknown = [level for level in levels if level not in SOLO_LEVEL_ORDER]
+    if unknown:
+        return jsonify({'error': f'Unknown SOLO level: {unknown[0]}'}), 400
+    total = len(topics) * len(levels) * count
+    if count < 1 or total > app.config['GENERATION_MAX_QUESTIONS']:
+        return jsonify({'error': f'A job can generate 1 to {app.config["GENERATION_MAX_QUESTIONS"]} questions'}), 400
+    
+    job_id = start_generation_job(topics, levels, count)
+    return jsonify({'job_id': job_id, 'total': total,
+                    'status_url': url_for('generation_job_status', job_id=job_id)}), 202
 
-def generate_ai_feedback(question, selected_option, is_correct):
-    """Generate personalized AI feedback using Gemini"""
+@app.route('/generation_jobs/<job_id>')
+def generation_job_status(job_id):
+    """Poll the progress of a bulk generation job"""
+    job = storage.generation_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/question_drafts/<int:draft_id>/<action>', methods=['POST'])
+def review_question_draft(draft_id, action):
+    """Publish a generated draft to the question bank, or discard it"""
+    if action not in ('approve', 'reject'):
+        return redirect(url_for('admin'))
+    
+    if action == 'approve':
+        draft = storage.question_draft(draft_id)
+        if draft is not None:
+            storage.add_question(draft)
+    storage.delete_question_draft(draft_id)
+    
+    flash('Question published!' if action == 'approve' else 'Draft discarded.', 'success')
+    return redirect(url_for('admin'))
+
+# AI Helper Functions; each kind of request is served according to its provider policy
+def ask_ai(kind, helper, *args):
+    """Answer a hint/feedback/analysis request according to AI_POLICIES[kind]"""
+    policy = app.config['AI_POLICIES'][kind]
+    if policy == POLICY_LOCAL:
+        return getattr(local_provider, kind)(*args)
+    if policy == POLICY_LOCAL_FIRST:
+        upgraded = gemini_provider.cached(kind, *args)
+        if upgraded is not None:
+            return upgraded
+        # Generate the Gemini answer into the cache for the next request
+        feedback_executor.submit(ask_llm, kind, helper, *args)
+        return getattr(local_provider, kind)(*args)
+    return ask_llm(kind, helper, *args)
+
+def ask_llm(kind, helper, *args):
+    """Answer with Gemini, falling back to the local provider"""
     try:
-        options = json.loads(question['options'])
-        correct_option = question['correct_option']
-        
-        prompt = f"""
-        As a Knowledge Graph learning expert, provide personalized feedback for this student response:
-        
-        Question: {question['question']}
-        SOLO Level: {question['level']}
-        Topic: {question['topic']}
-        Options: {', '.join(options)}
-        Student Selected: {selected_option}
-        Correct Answer: {correct_option}
-        Result: {'Correct' if is_correct else 'Incorrect'}
-        
-        Provide encouraging, specific feedback that:
-        1. Acknowledges their thinking process
-        2. Explains why the answer is correct/incorrect
-        3. Connects to SOLO taxonomy level
-        4. Suggests next learning steps
-        
-        Keep it conversational and under 100 words.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return getattr(gemini_provider, kind)(*args)
     except Exception as e:
-        return "Great effort! Keep building your understanding of Knowledge Graphs step by step."
+        record_ai_fallback(helper, e)
+        return getattr(local_provider, kind)(*args)
+
+@track_ai_helper
+def generate_ai_hint(question):
+    """Generate a helpful hint for a question"""
+    return ask_ai('hint', 'generate_ai_hint', question)
 
+@track_ai_helper
+def generate_ai_feedback(question, selected_option, is_correct):
+    """Generate personalized feedback with Gemini, whatever the feedback policy"""
+    return ask_llm('feedback', 'generate_ai_feedback', question, selected_option, is_correct)
+
+def run_feedback_job(attempt_id, question, selected_option, is_correct):
+    """Generate feedback for an attempt and store it for the polling endpoint"""
+    feedback = generate_ai_feedback(question, selected_option, is_correct)
+    storage.save_attempt_feedback(attempt_id, feedback)
+
+@track_ai_helper
 def generate_comprehensive_ai_analysis(answers, solo_performance):
-    """Generate comprehensive learning analysis using Gemini"""
+    """Generate comprehensive learning analysis"""
+    return ask_ai('analysis', 'generate_comprehensive_ai_analysis', answers, solo_performance)
+
+@track_ai_helper
+def generate_quiz_review(answers, solo_performance, feedback_items):
+    """Ask Gemini for the analysis and the feedback on every answer in one call.
+
+    Returns (analysis, feedback) as validated by parse_review(); raises if
+    the call fails or the response is unusable.
+    """
+    prompt = build_review_prompt(answers, solo_performance, feedback_items)
+    response_text = generate_text('review', prompt)
     try:
-        # Prepare performance summary
-        performance_summary = []
-        for level, perf in solo_performance.items():
-            if perf['total'] > 0:
-                performance_summary.append(f"{level}: {perf['correct']}/{perf['total']} ({perf['percentage']:.0f}%)")
-        
-        prompt = f"""
-        As an expert educational psychologist specializing in SOLO Taxonomy and Knowledge Graphs, analyze this student's learning journey:
-        
-        Performance Summary:
-        {chr(10).join(performance_summary)}
-        
-        Total Questions: {len(answers)}
-        
-        Provide a comprehensive analysis including:
-        1. SOLO taxonomy progression insights
-        2. Knowledge Graph concept mastery
-        3. Learning strengths and growth areas
-        4. Specific recommendations for advancement
-        5. Motivational encouragement
-        
-        Structure as: **Strengths** | **Growth Areas** | **Next Steps** | **Encouragement**
-        Keep each section concise but meaningful.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return "You're making excellent progress in your Knowledge Graph learning journey! Keep exploring and connecting concepts across different levels."
+        return parse_review(response_text, {number for number, _, _, _ in feedback_items})
+    except ValueError:
+        llm_cache.invalidate('review', prompt)
+        raise
 
-def generate_ai_question(topic, level):
-    """Generate a new question using Gemini AI"""
+def quiz_review_events(answers, solo_performance, bank):
+    """Server-Sent Events for a batched review: the analysis, then feedback for each answer.
+    
+    Feedback is keyed by the answer's number in the quiz, since a question can be answered twice.
+    """
+    feedback_items = []
+    for number, answer in enumerate(answers, start=1):
+        question = bank.by_id[answer['question_id']]
+        selected_option = answer['selected_option']
+        option_index = question['options'].index(selected_option) if selected_option in question['options'] else -1
+        precomputed = get_precomputed_feedback(question, option_index)
+        if precomputed is not None:
+            yield sse('feedback', {'answer': number, 'feedback': precomputed})
+        else:
+            feedback_items.append((number, question, selected_option, answer['is_correct']))
+    
+    policy = app.config['AI_POLICIES']['analysis']
+    if policy == POLICY_LOCAL:
+        analysis = local_provider.analysis(answers, solo_performance)
+        feedback = {item[0]: local_provider.feedback(*item[1:]) for item in feedback_items}
+    else:
+        if policy == POLICY_LOCAL_FIRST:
+            yield sse('draft', {'text': local_provider.analysis(answers, solo_performance)})
+        try:
+            analysis, feedback = generate_quiz_review(answers, solo_performance, feedback_items)
+        except Exception as e:
+            record_ai_fallback('generate_quiz_review', e)
+            analysis, feedback = local_provider.analysis(answers, solo_performance), {}
+        else:
+            if analysis is None:
+                record_ai_fallback('generate_quiz_review')
+                analysis = local_provider.analysis(answers, solo_performance)
+    
+    yield sse('chunk', {'text': analysis})
+    for number, _, _, _ in feedback_items:
+        if number in feedback:
+            yield sse('feedback', {'answer': number, 'feedback': feedback[number]})
+    
+    # Answers the review left out get their feedback generated one by one
+    missing = [item for item in feedback_items if item[0] not in feedback]
+    futures = {feedback_executor.submit(generate_ai_feedback, *item[1:]): item[0] for item in missing}
+    for future in as_completed(futures):
+        yield sse('feedback', {'answer': futures[future], 'feedback': future.result()})
+    yield sse('done', {})
+
+@track_ai_helper
+def generate_ai_question(topic, level, avoid=()):
+    """Generate a new question using Gemini AI, distinct from the question texts in `avoid`"""
     try:
-        prompt = f"""
-        Create a {level} level Knowledge Graph question about {topic} following SOLO Taxonomy principles:
-        
-        SOLO Level Guidelines:
-        - Pre-structural: Test misconceptions
-        - Uni-structural: Single concept focus
-        - Multi-structural: Multiple related concepts
-        - Relational: Connections between concepts
-        - Extended Abstract: Real-world applications
-        
-        Return a JSON object with:
-        {{
-            "question": "Question text",
-            "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-            "correct_option": "Exact text of correct option",
-            "explanation": "Detailed explanation"
-        }}
-        
-        Ensure the question is educationally sound and appropriate for the SOLO level.
-        """
-        
-        response = model.generate_content(prompt)
+        prompt = build_question_prompt(topic, level, avoid)
+        response_text = generate_text('question', prompt)
         # Parse the JSON response
         import re
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
         if json_match:
-            return json.loads(json_match.group())
+            try:
+                data = json.loads(json_match.group())
+            except json.JSONDecodeError:
+                llm_cache.invalidate('question', prompt)
+                raise
+            # Flag questions the bank already has so they are not published twice
+            if isinstance(data, dict) and isinstance(data.get('question'), str):
+                duplicate = find_duplicate(data['question'])
+                if duplicate is not None:
+                    existing, similarity = duplicate
+                    data['duplicate_of'] = {'id': existing['id'], 'question': existing['question'],
+                                            'similarity': round(similarity, 2)}
+            return data
         else:
+            llm_cache.invalidate('question', prompt)
+            record_ai_fallback('generate_ai_question')
             return {"error": "Could not generate question"}
     except Exception as e:
+        record_ai_fallback('generate_ai_question', e)
         return {"error": f"Error generating question: {str(e)}"}
 
+def validate_generated_question(data):
+    """Return the problem with a generated question, or None if it can be stored"""
+    if not isinstance(data, dict):
+        return 'not a JSON object'
+    if data.get('error'):
+        return data['error']
+    if not isinstance(data.get('question'), str) or not data['question'].strip():
+        return 'missing question text'
+    options = data.get('options')
+    if not isinstance(options, list) or len(options) != 4 or \
+            not all(isinstance(option, str) and option.strip() for option in options):
+        return 'expected exactly four options'
+    if len(set(options)) != 4:
+        return 'options are not distinct'
+    if data.get('correct_option') not in options:
+        return 'correct_option is not one of the options'
+    if not isinstance(data.get('explanation'), str):
+        return 'missing explanation'
+    if data.get('duplicate_of'):
+        return f'near-duplicate of question {data["duplicate_of"]["id"]}'
+    return None
+
+def generate_question_cell(topic, level, count, retries):
+    """Generate up to `count` valid, distinct questions for one topic and level.
+    
+    Each question gets `retries` extra attempts; returns (questions, failures).
+    """
+    questions = []
+    failures = 0
+    for _ in range(count):
+        for attempt in range(retries + 1):
+            data = generate_ai_question(topic, level, avoid=[q['question'] for q in questions])
+            if validate_generated_question(data) is None:
+                questions.append(data)
+                break
+            if attempt < retries:
+                time.sleep(0.5 * 2 ** attempt)
+        else:
+            failures += 1
+    return questions, failures
+
+def start_generation_job(topics, levels, count):
+    """Record a bulk generation job and run it in the background; returns its id"""
+    job_id = uuid.uuid4().hex
+    storage.create_generation_job(job_id, len(topics) * len(levels) * count, time.time())
+    
+    threading.Thread(target=run_generation_job, args=(job_id, topics, levels, count),
+                     name=f'generation-job-{job_id[:8]}', daemon=True).start()
+    return job_id
+
+def run_generation_job(job_id, topics, levels, count):
+    """Generate every (topic, level) cell on the pool and stage the results as drafts"""
+    try:
+        futures = {generation_executor.submit(generate_question_cell, topic, level, count,
+                                              app.config['GENERATION_RETRIES']): (topic, level)
+                   for topic in topics for level in levels}
+        for future in as_completed(futures):
+            topic, level = futures[future]
+            try:
+                questions, failures = future.result()
+            except Exception:
+                app.logger.exception('Generating %s / %s questions failed', topic, level)
+                questions, failures = [], count
+    
+            # One transaction per cell: its drafts plus the progress counters
+            drafts = [{'topic': topic, 'level': level, 'level_order': SOLO_LEVEL_ORDER[level],
+                       'question': q['question'].strip(), 'options': json.dumps(q['options']),
+                       'correct_option': q['correct_option'], 'explanation': q['explanation']}
+                      for q in questions]
+            storage.add_generated_drafts(job_id, drafts, failures, time.time())
+    
+        storage.finish_generation_job(job_id, 'done', time.time())
+    except Exception as e:
+        app.logger.exception('Generation job %s failed', job_id)
+        storage.finish_generation_job(job_id, 'failed', time.time(), error=str(e))
+
 def calculate_solo_performance(answers):
     """Calculate performance across SOLO levels"""
     solo_levels = ['Pre-structural', 'Uni-structural', 'Multi-structural', 'Relational', 'Extended Abstract']
@@ -654,47 +1840,202 @@ def calculate_solo_performance(answers):
     
     return performance
 
-def calculate_progress_metrics(attempts):
-    """Calculate detailed progress metrics"""
-    if not attempts:
+def calculate_progress_metrics(topic_stats, level_stats):
+    """Calculate detailed progress metrics from topic and level rollups"""
+    total_attempts = sum(row['total'] for row in level_stats)
+    if not total_attempts:
         return {}
     
-    # Group by topic and level
     topic_performance = {}
     level_performance = {}
     
-    for attempt in attempts:
-        topic = attempt['topic']
-        level = attempt['level']
-        
-        if topic not in topic_performance:
-            topic_performance[topic] = {'correct': 0, 'total': 0}
-        if level not in level_performance:
-            level_performance[level] = {'correct': 0, 'total': 0}
-        
-        topic_performance[topic]['total'] += 1
-        level_performance[level]['total'] += 1
-        
-        if attempt['is_correct']:
-            topic_performance[topic]['correct'] += 1
-            level_performance[level]['correct'] += 1
+    for row in topic_stats:
+        topic_performance[row['topic']] = {'correct': row['correct'], 'total': row['total']}
+    for row in level_stats:
+        level_performance[row['level']] = {'correct': row['correct'], 'total': row['total']}
     
     # Calculate percentages
-    for topic in topic_performance:
-        total = topic_performance[topic]['total']
-        if total > 0:
-            topic_performance[topic]['percentage'] = (topic_performance[topic]['correct'] / total) * 100
-    
-    for level in level_performance:
-        total = level_performance[level]['total']
-        if total > 0:
-            level_performance[level]['percentage'] = (level_performance[level]['correct'] / total) * 100
+    for performance in list(topic_performance.values()) + list(level_performance.values()):
+        if performance['total'] > 0:
+            performance['percentage'] = (performance['correct'] / performance['total']) * 100
     
     return {
         'topic_performance': topic_performance,
         'level_performance': level_performance,
-        'total_attempts': len(attempts)
+        'total_attempts': total_attempts
     }
 
+# Write-behind queue used when ATTEMPT_WRITE_MODE is 'batched'
+attempt_writer = WriteBehindQueue(
+    write_batch=storage.add_attempts,
+    retry_on=storage.transient_errors,
+    batch_size=app.config['ATTEMPT_BATCH_SIZE'],
+    max_latency=app.config['ATTEMPT_FLUSH_INTERVAL'],
+    max_queue=app.config['ATTEMPT_QUEUE_SIZE'],
+    spill_path=app.config['ATTEMPT_SPILL_PATH'] or f"{app.config['DATABASE']}-spilled-attempts.jsonl"
+)
+
+def rebuild_progress_rollups(conn, commit=True):
+    """Recompute all progress rollups from the attempt history in one transaction"""
+    conn.execute('DELETE FROM topic_stats')
+    conn.execute('DELETE FROM level_stats')
+    conn.execute('DELETE FROM user_level_stats')
+    conn.execute('''INSERT INTO topic_stats (topic, correct, total)
+                    SELECT q.topic, SUM(a.is_correct), COUNT(*)
+                    FROM attempts a JOIN questions q ON a.question_id = q.id
+                    GROUP BY q.topic''')
+    conn.execute('''INSERT INTO level_stats (level, level_order, correct, total)
+                    SELECT q.level, MIN(q.level_order), SUM(a.is_correct), COUNT(*)
+                    FROM attempts a JOIN questions q ON a.question_id = q.id
+                    GROUP BY q.level''')
+    conn.execute('''INSERT INTO user_level_stats (username, level, level_order, correct, total)
+                    SELECT a.username, q.level, MIN(q.level_order), SUM(a.is_correct), COUNT(*)
+                    FROM attempts a JOIN questions q ON a.question_id = q.id
+                    GROUP BY a.username, q.level''')
+    if commit:
+        conn.commit()
+
+def rebuild_user_topic_rollup(conn):
+    """Recompute the per-user topic rollup, added after the others, from the attempts table"""
+    conn.execute('DELETE FROM user_topic_stats')
+    conn.execute('''INSERT INTO user_topic_stats (username, topic, correct, total)
+                    SELECT a.username, q.topic, SUM(a.is_correct), COUNT(*)
+                    FROM attempts a JOIN questions q ON a.question_id = q.id
+                    GROUP BY a.username, q.topic''')
+
+# CLI commands
+@app.cli.command('warm-feedback')
+@click.option('--workers', default=4, show_default=True, help='Concurrent Gemini requests.')
+def warm_feedback_command(workers):
+    """Precompute AI feedback for every question/option pair.
+
+    Only questions that are new or changed since the last run are processed.
+    """
+    bank = get_question_bank()
+    existing = storage.precomputed_feedback_hashes()
+    
+    # Drop feedback for questions that no longer exist
+    stale_ids = {question_id for question_id, _ in existing} - set(bank.by_id)
+    if stale_ids:
+        storage.delete_precomputed_feedback(stale_ids)
+    
+    pending = [q for q in bank.questions
+               if any(existing.get((q['id'], i)) != q['content_hash'] for i in range(len(q['options'])))]
+    click.echo(f'{len(pending)} of {len(bank.questions)} questions need feedback')
+    
+    def warm_question(question):
+        results = []
+        for index, option in enumerate(question['options']):
+            prompt = build_feedback_prompt(question, option, option == question['correct_option'])
+            results.append((index, question['content_hash'], generate_text('feedback', prompt)))
+        return results
+    
+    warmed = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(warm_question, q): q for q in pending}
+        for future in as_completed(futures):
+            question = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                failed += 1
+                click.echo(f'Question {question["id"]}: {e}', err=True)
+                continue
+            storage.save_precomputed_feedback(question['id'], rows)
+            warmed += 1
+    
+    click.echo(f'Warmed {warmed} questions, {failed} failed')
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Backfill or rebuild the progress rollups from the attempt history."""
+    click.echo(f'Rebuilt progress rollups from {storage.rebuild_rollups()} attempts')
+
+@app.cli.command('export-questions')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+def export_questions_command(output):
+    """Write the question bank as JSONL to OUTPUT (default: stdout)."""
+    for line in export_questions(storage):
+        output.write(line)
+
+@app.cli.command('import-questions')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', default=500, show_default=True, help='Rows per transaction.')
+def import_questions_command(source, batch_size):
+    """Upsert questions from a JSONL file (use - for stdin)."""
+    result = import_questions(storage, source, SOLO_LEVEL_ORDER, batch_size=batch_size,
+                              check=duplicate_import_check())
+    for line, error in result.errors:
+        click.echo(f'Line {line}: {error}', err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f'... and {result.error_count - len(result.errors)} more errors', err=True)
+    click.echo(f'Imported {result.imported} questions, {result.error_count} lines rejected')
+
+@app.cli.command('replay-attempts')
+def replay_attempts_command():
+    """Write attempts spilled by write-behind batches that could not be written."""
+    click.echo(f'Replayed {attempt_writer.replay_spilled()} spilled attempts')
+
+@app.cli.command('archive-attempts')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive attempts older than this many days  [default: ATTEMPT_HOT_DAYS]')
+@click.option('--batch-size', default=100000, show_default=True, help='Attempts moved per transaction.')
+@click.option('--vacuum', is_flag=True, help='Return the freed space to the filesystem afterwards.')
+def archive_attempts_command(older_than_days, batch_size, vacuum):
+    """Move old attempts out of the database into the compressed monthly archive."""
+    days = app.config['ATTEMPT_HOT_DAYS'] if older_than_days is None else older_than_days
+    before = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - days * 86400))
+    try:
+        archived, segments = storage.archive_attempts(before, batch_size=batch_size, vacuum=vacuum)
+    except NotImplementedError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(f'Archived {archived} attempts from before {before} into {segments} segments '
+               f'under {get_attempt_archive().directory}')
+    if vacuum and archived:
+        click.echo('Database vacuumed')
+
+@app.cli.command('item-analysis')
+@click.option('--chunk-size', default=100000, show_default=True, help='Attempts loaded per query.')
+def item_analysis_command(chunk_size):
+    """Print difficulty, discrimination and flags for every question."""
+    from item_analysis import analyze_items
+    start = time.perf_counter()
+    chunks = storage.scan_attempts(('username', 'question_id', 'selected_option'), chunk_size=chunk_size)
+    analysis = analyze_items(chunks, get_question_bank().questions)
+    
+    fmt = lambda value: '-' if value is None else f'{value:.2f}'
+    for item in analysis.items:
+        click.echo(f'{item.question_id:>6}  n={item.responses:<7} p={fmt(item.p_value):<5} '
+                   f'r={fmt(item.discrimination):<5} {", ".join(item.flags)}')
+    for level, reliability in analysis.reliability.items():
+        click.echo(f'Reliability {level}: {fmt(reliability)} ({analysis.reliability_users[level]} users)')
+    click.echo(f'{analysis.attempts} attempts by {analysis.users} users in {time.perf_counter() - start:.1f}s')
+
+@app.cli.command('rebuild-leaderboards')
+@click.option('--chunk-size', default=100000, show_default=True, help='Attempts loaded per query.')
+def rebuild_leaderboards_command(chunk_size):
+    """Recompute every leaderboard from the attempt history in one streaming pass."""
+    start = time.perf_counter()
+    chunks = storage.scan_attempts(('username', 'question_id', 'is_correct', 'timestamp'), chunk_size=chunk_size)
+    results = scan_results(chunks, get_question_bank().by_id)
+    storage.replace_leaderboards(results)
+    boards = len({(scope, period) for scope, period, _ in results})
+    click.echo(f'Rebuilt {boards} leaderboards ({len(results)} scores) in {time.perf_counter() - start:.1f}s')
+
+@app.cli.command('init-db')
+@click.option('--seed/--no-seed', default=True, show_default=True,
+              help='Load the sample questions into an empty question bank.')
+def init_db_command(seed):
+    """Create the database or migrate it to the latest schema version."""
+    applied = init_db()
+    for description in applied:
+        click.echo(f'Applied migration {description}')
+    click.echo(f'Database at schema version {SCHEMA_VERSION}')
+    if seed:
+        seed_database()
+
 if __name__ == '__main__':
+    init_db()
+    seed_database()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,252 @@
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+
+# Columns of an archived attempt, in row order
+ATTEMPT_COLUMNS = ('id', 'username', 'question_id', 'selected_option', 'is_correct', 'timestamp')
+
+# How each column is stored: fixed-width integers, or strings as a dictionary plus int32 codes
+_COLUMN_TYPES = {'id': 'q', 'username': 'dict', 'question_id': 'q', 'selected_option': 'dict',
+                 'is_correct': 'b', 'timestamp': 'q'}
+
+_MAGIC = b'SQATTv1\n'
+_HEADER_LENGTH = struct.Struct('<I')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _encode_column(kind, values):
+    if kind == 'dict':
+        codes = {}
+        encoded = array('i', [codes.setdefault(value, len(codes)) for value in values])
+        return [json.dumps(list(codes), ensure_ascii=False).encode('utf-8'), encoded.tobytes()]
+    return [array(kind, values).tobytes()]
+
+
+class AttemptArchive:
+    """Append-only columnar archive of old attempts, partitioned by month.
+
+    Each archival batch is written as one immutable segment file per month,
+    ``<directory>/<YYYY-MM>/attempts-<first id>-<last id>.seg``. A segment
+    holds a JSON header followed by one zlib-compressed block per column;
+    strings are dictionary-encoded. Segments are read through ``mmap`` and
+    only the requested columns are decompressed.
+
+    The archive only manages files. Which segments are committed is recorded
+    by the caller (the ``attempt_archive`` table), so a segment left behind
+    by an interrupted run is never read.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def write_segment(self, month, columns):
+        """Write {column: values} as a new segment of `month`; returns its path relative to the archive"""
+        ids = columns['id']
+        path = os.path.join(month, f'attempts-{ids[0]:012d}-{ids[-1]:012d}.seg')
+        full_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        blocks = []
+        header = {'rows': len(ids), 'columns': {}}
+        offset = 0
+        for name in ATTEMPT_COLUMNS:
+            kind = _COLUMN_TYPES[name]
+            parts = [zlib.compress(part, 6) for part in _encode_column(kind, columns[name])]
+            header['columns'][name] = {'type': kind, 'blocks': []}
+            for part in parts:
+                header['columns'][name]['blocks'].append([offset, len(part)])
+                offset += len(part)
+            blocks.extend(parts)
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        # Write to a temporary name and rename, so a segment is either complete or absent
+        tmp_path = f'{full_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+            f.write(header_bytes)
+            for block in blocks:
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, full_path)
+        return path
+
+    @contextmanager
+    def _open_segment(self, path):
+        """Map a segment into memory; yields (buffer, header, offset of the first block)"""
+        with open(os.path.join(self.directory, path), 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                if view[:len(_MAGIC)] != _MAGIC:
+                    raise ValueError(f'{path} is not an attempt archive segment')
+                start = len(_MAGIC) + _HEADER_LENGTH.size
+                header_length, = _HEADER_LENGTH.unpack(view[len(_MAGIC):start])
+                header = json.loads(bytes(view[start:start + header_length]))
+                yield view, header, start + header_length
+            finally:
+                view.release()
+
+    def read_columns(self, path, columns=ATTEMPT_COLUMNS):
+        """Return the requested columns of a segment as a tuple of sequences"""
+        with self._open_segment(path) as (view, header, data):
+            result = []
+            for name in columns:
+                column = header['columns'][name]
+                blocks = [zlib.decompress(view[data + offset:data + offset + length])
+                          for offset, length in column['blocks']]
+                if column['type'] == 'dict':
+                    values = json.loads(blocks[0])
+                    codes = array('i')
+                    codes.frombytes(blocks[1])
+                    result.append([values[code] for code in codes])
+                else:
+                    values = array(column['type'])
+                    values.frombytes(blocks[0])
+                    result.append(values)
+            return tuple(result)
+
+    def read_dictionary(self, path, column):
+        """Distinct values of a dictionary-encoded column, without decoding its rows"""
+        with self._open_segment(path) as (view, header, data):
+            offset, length = header['columns'][column]['blocks'][0]
+            return json.loads(zlib.decompress(view[data + offset:data + offset + length]))
+
+    def segment_paths(self):
+        """Every segment file on disk, committed or not"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(month, name)
+                      for month in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, month))
+                      for name in os.listdir(os.path.join(self.directory, month))
+                      if name.endswith('.seg'))
+
+    def remove(self, path):
+        os.remove(os.path.join(self.directory, path))
+
+
+def format_timestamp(epoch):
+    """Inverse of the epoch seconds stored for the `timestamp` column"""
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(epoch))
+
+
+def archive_attempts(conn, archive, before, batch_size=100000):
+    """Move attempts older than `before` (a UTC timestamp string) from the attempts table into the archive.
+
+    Attempts are moved one batch at a time. For each batch the segments are
+    written first, then the rows are deleted and the segments recorded in
+    ``attempt_archive`` in a single transaction. Segment files that were
+    never recorded (left by an interrupted run) are removed first. Only one
+    archiver should run at a time. Returns (attempts archived, segments written).
+    """
+    committed = {row[0] for row in conn.execute('SELECT path FROM attempt_archive')}
+    for path in archive.segment_paths():
+        if path not in committed:
+            archive.remove(path)
+
+    archived = segments = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''SELECT id, username, question_id, selected_option, is_correct,
+                                   CAST(strftime('%s', timestamp) AS INTEGER), substr(timestamp, 1, 7)
+                                FROM attempts WHERE timestamp < ? AND id > ?
+                                ORDER BY id LIMIT ?''', (before, last_id, batch_size)).fetchall()
+        if not rows:
+            return archived, segments
+        last_id = rows[-1][0]
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row[6], []).append(row)
+        manifest = []
+        for month, month_rows in sorted(by_month.items()):
+            columns = dict(zip(ATTEMPT_COLUMNS, zip(*(row[:6] for row in month_rows))))
+            columns['is_correct'] = [int(bool(value)) for value in columns['is_correct']]
+            path = archive.write_segment(month, columns)
+            manifest.append((path, month, len(month_rows), month_rows[0][0], month_rows[-1][0],
+                             format_timestamp(min(columns['timestamp'])),
+                             format_timestamp(max(columns['timestamp'])), time.time()))
+
+        try:
+            conn.executemany('DELETE FROM attempts WHERE id = ?', [(row[0],) for row in rows])
+            conn.executemany('''INSERT INTO attempt_archive
+                                (path, month, rows, min_id, max_id, min_timestamp, max_timestamp, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', manifest)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        archived += len(rows)
+        segments += len(manifest)
+
+
+def scan_archived_attempts(conn, archive, columns=ATTEMPT_COLUMNS):
+    """Stream the archived attempts, oldest segment first, one segment per chunk of column sequences"""
+    for (path,) in conn.execute('SELECT path FROM attempt_archive ORDER BY min_id').fetchall():
+        chunk = archive.read_columns(path, columns)
+        if 'timestamp' in columns:
+            chunk = list(chunk)
+            position = columns.index('timestamp')
+            chunk[position] = [format_timestamp(value) for value in chunk[position]]
+        yield tuple(chunk)
+
+
+def scan_attempts(conn, archive, columns=ATTEMPT_COLUMNS, chunk_size=100000):
+    """Stream every attempt, archived ones first, as chunks of column sequences.
+
+    Each chunk is a tuple with one sequence per requested column. Archived
+    chunks are whole segments, oldest first; the attempts table follows in
+    id order, `chunk_size` rows at a time. Timestamps are returned as
+    strings in both cases.
+    """
+    yield from scan_archived_attempts(conn, archive, columns)
+
+    # Plain tuples rather than the connection's row factory; this loop handles every attempt
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    select = ', '.join(columns)
+    last_id = 0
+    while True:
+        rows = cursor.execute(f'''SELECT id, {select} FROM attempts WHERE id > ?
+                                 ORDER BY id LIMIT ?''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield tuple(zip(*rows))[1:]
+
+
+def archived_user_attempts(conn, archive, username, before=None, limit=20):
+    """A user's archived attempts as row dicts, newest first.
+
+    `before` is an optional (timestamp, id) position to continue after.
+    Segments are visited newest first and skipped without decoding their
+    rows when the user does not appear in them.
+    """
+    segments = conn.execute('''SELECT path, max_timestamp FROM attempt_archive
+                               WHERE min_timestamp <= ?
+                               ORDER BY max_timestamp DESC, max_id DESC''',
+                            (before[0] if before else '9999',)).fetchall()
+    found = []
+    for path, max_timestamp in segments:
+        # Later segments are all older than the rows already collected
+        if len(found) >= limit and max_timestamp < found[limit - 1]['timestamp']:
+            break
+        if username not in archive.read_dictionary(path, 'username'):
+            continue
+        for row in zip(*archive.read_columns(path)):
+            record = dict(zip(ATTEMPT_COLUMNS, row))
+            if record['username'] != username:
+                continue
+            record['timestamp'] = format_timestamp(record['timestamp'])
+            if before is None or (record['timestamp'], record['id']) < tuple(before):
+                found.append(record)
+        found.sort(key=lambda record: (record['timestamp'], record['id']), reverse=True)
+    return found[:limit]
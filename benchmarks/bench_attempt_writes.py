@@ -0,0 +1,115 @@
+"""Benchmark concurrent attempt inserts: legacy connections vs. the managed connection layer.
+
+Each writer process inserts attempts one at a time with a commit per answer,
+the same way submit_answer does. The legacy run opens a fresh default
+connection per insert (rollback journal, synchronous=FULL); the managed run
+reuses one connection per writer configured by app.connect_db(). The
+batched run queues attempts through the write-behind queue used when
+ATTEMPT_WRITE_MODE=batched (which also maintains the progress rollups).
+
+Usage: python benchmarks/bench_attempt_writes.py [--writers 8] [--inserts 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+INSERT_ATTEMPT = '''INSERT INTO attempts (username, question_id, selected_option, is_correct)
+                    VALUES (?, ?, ?, ?)'''
+
+
+def load_app(db_path):
+    """Import the app against db_path, creating and seeding the schema if needed"""
+    os.environ['SOLOQUIZ_DB'] = db_path
+    import app
+    app.app.config['DATABASE'] = db_path
+    app.init_db()
+    app.seed_database()
+    return app
+
+
+def legacy_writer(db_path, writer_id, inserts, results):
+    errors = 0
+    for i in range(inserts):
+        try:
+            conn = sqlite3.connect(db_path)
+            conn.execute(INSERT_ATTEMPT, (f'user{writer_id}', 1 + i % 16, 'option', i % 2 == 0))
+            conn.commit()
+            conn.close()
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(errors)
+
+
+def managed_writer(db_path, writer_id, inserts, results):
+    app = load_app(db_path)
+    conn = app.connect_db()
+    errors = 0
+    for i in range(inserts):
+        try:
+            conn.execute(INSERT_ATTEMPT, (f'user{writer_id}', 1 + i % 16, 'option', i % 2 == 0))
+            conn.commit()
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    results.put(errors)
+
+
+def batched_writer(db_path, writer_id, inserts, results):
+    app = load_app(db_path)
+    question = app.get_question_bank().questions[0]
+    for i in range(inserts):
+        app.attempt_writer.put({'username': f'user{writer_id}', 'question': question,
+                                'selected_option': 'option', 'is_correct': i % 2 == 0})
+    app.attempt_writer.close()
+    results.put(0)
+
+
+def run(writer, db_path, writers, inserts):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=writer, args=(db_path, i, inserts, results))
+                 for i in range(writers)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+    errors = sum(results.get() for _ in processes)
+    return (writers * inserts - errors) / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--inserts', type=int, default=200, help='inserts per writer')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'legacy.db')
+        managed_db = os.path.join(tmp, 'managed.db')
+        batched_db = os.path.join(tmp, 'batched.db')
+
+        # All databases get the same schema; the legacy one goes back to the rollback journal
+        load_app(managed_db)
+        load_app(batched_db)
+        load_app(legacy_db)
+        conn = sqlite3.connect(legacy_db)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+        runs = (('legacy', legacy_writer, legacy_db),
+                ('managed', managed_writer, managed_db),
+                ('batched', batched_writer, batched_db))
+        for name, writer, path in runs:
+            rate, errors = run(writer, path, args.writers, args.inserts)
+            print(f'{name:8s} {rate:10.1f} attempts/s  {errors} failed with "database is locked"')
+
+
+if __name__ == '__main__':
+    main()
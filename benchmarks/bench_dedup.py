@@ -0,0 +1,62 @@
+"""Measure the near-duplicate index: build time and query latency at question bank scale.
+
+Builds a NearDuplicateIndex over --size synthetic questions, then times
+queries for near copies of indexed questions (which must be found) and for
+unrelated text (which must not be).
+
+Usage: python benchmarks/bench_dedup.py [--size 100000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from near_duplicates import NearDuplicateIndex  # noqa: E402
+
+
+def make_question(rng, vocabulary):
+    return ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(8, 16))) + '?'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--vocabulary', type=int, default=5000, help='distinct words in the synthetic questions')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [f'term{i}' for i in range(args.vocabulary)]
+    texts = {question_id: make_question(rng, vocabulary) for question_id in range(1, args.size + 1)}
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    index.sync(texts, version=1)
+    print(f'Indexed {len(index)} questions in {time.perf_counter() - start:.1f}s')
+
+    for label, expect_match in (('near copies', True), ('unrelated', False)):
+        latencies = []
+        misses = 0
+        for _ in range(args.queries):
+            if expect_match:
+                question_id = rng.randint(1, args.size)
+                text = texts[question_id].replace('?', f' {rng.choice(vocabulary)}?')
+            else:
+                text = make_question(rng, vocabulary)
+            start = time.perf_counter()
+            matches = index.query(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = any(key == question_id for key, _ in matches) if expect_match else bool(matches)
+            if found != expect_match:
+                misses += 1
+        latencies.sort()
+        print(f'{label:12} p50 {statistics.median(latencies):.3f}ms  '
+              f'p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}ms  wrong {misses}/{args.queries}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Track the cost of importing app.py, i.e. the startup work every gunicorn worker and CLI call pays.
+
+Each sample runs `import app` in a fresh interpreter with -X importtime and
+records the wall time and the slowest imported modules. Pass --json to save
+the results for comparison between commits.
+
+Usage: python benchmarks/bench_import.py [--runs 10] [--json import_time.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def sample(env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the module that triggered them
+        modules[name[1:].rstrip()] = int(cumulative)
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports made by app.py to show')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SOLOQUIZ_DB=os.path.join(tmp, 'bench.db'))
+        samples = [sample(env) for _ in range(args.runs)]
+
+    times = sorted(elapsed for elapsed, _ in samples)
+    modules = samples[-1][1]
+    # Modules imported directly by app.py are indented one level
+    direct = {name.strip(): us for name, us in modules.items() if name.startswith('  ') and name[2] != ' '}
+    slowest = sorted(direct.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f'import app: median {statistics.median(times) * 1000:.1f} ms, '
+          f'min {times[0] * 1000:.1f} ms, max {times[-1] * 1000:.1f} ms over {args.runs} runs')
+    print('slowest imports made by app.py (cumulative):')
+    for name, us in slowest:
+        print(f'  {us / 1000:8.1f} ms  {name}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'runs': args.runs,
+                'median_ms': statistics.median(times) * 1000,
+                'min_ms': times[0] * 1000,
+                'max_ms': times[-1] * 1000,
+                'slowest_imports_ms': {name: us / 1000 for name, us in slowest}
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
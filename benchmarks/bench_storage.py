@@ -0,0 +1,125 @@
+"""Measure the storage repository on one backend: bulk writes, concurrent answers and the read paths.
+
+Seeds --questions questions and --attempts attempts with the bulk
+operations, then times single-answer writes from --writers threads (as
+submit_answer does in sync mode), progress and history reads, a full
+attempt scan and LLM cache round trips. Run it once per backend to compare
+them; PostgreSQL needs a scratch database passed as --dsn.
+
+Usage: python benchmarks/bench_storage.py [--backend sqlite|postgres|memory] [--dsn URL]
+           [--questions 2000] [--attempts 200000] [--writers 8] [--answers 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SOLO_LEVELS = [('Pre-structural', 1), ('Uni-structural', 2), ('Multi-structural', 3),
+               ('Relational', 4), ('Extended Abstract', 5)]
+
+
+def timed(label, func, repeat=1):
+    """Run func `repeat` times and print its p50/p99 latency"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f'{label:28s} p50 {statistics.median(latencies):9.3f}ms  '
+          f'p99 {latencies[max(int(len(latencies) * 0.99) - 1, 0)]:9.3f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'postgres', 'memory'], default='sqlite')
+    parser.add_argument('--dsn', help='PostgreSQL connection string for --backend postgres')
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--attempts', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--writers', type=int, default=8, help='threads answering concurrently')
+    parser.add_argument('--answers', type=int, default=200, help='answers per writer')
+    args = parser.parse_args()
+    if args.backend == 'postgres' and not args.dsn:
+        parser.error('--backend postgres needs --dsn')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SOLOQUIZ_DB'] = os.path.join(tmp, 'bench_storage.db')
+        os.environ['STORAGE_BACKEND'] = args.backend
+        if args.dsn:
+            os.environ['DATABASE_URL'] = args.dsn
+        import app as soloquiz
+        soloquiz.init_db()
+        storage = soloquiz.storage
+        rng = random.Random(0)
+
+        questions = []
+        for i in range(args.questions):
+            level, level_order = SOLO_LEVELS[i % len(SOLO_LEVELS)]
+            options = [f'Option {j} for question {i}' for j in range(4)]
+            questions.append({'topic': f'Topic {i % 8}', 'level': level, 'level_order': level_order,
+                              'question': f'Storage benchmark question {i}?', 'options': json.dumps(options),
+                              'correct_option': options[0], 'explanation': 'Explanation.'})
+        start = time.perf_counter()
+        storage.add_questions(questions)
+        print(f'add_questions: {args.questions} questions in {time.perf_counter() - start:.2f}s')
+        bank = soloquiz.get_question_bank().questions
+
+        def make_attempt(username):
+            question = rng.choice(bank)
+            option = rng.choice(question['options'])
+            return {'username': username, 'question': question, 'selected_option': option,
+                    'is_correct': option == question['correct_option']}
+
+        start = time.perf_counter()
+        for offset in range(0, args.attempts, 10000):
+            storage.add_attempts([make_attempt(f'user{rng.randrange(args.users)}')
+                                  for _ in range(min(10000, args.attempts - offset))])
+        elapsed = time.perf_counter() - start
+        print(f'add_attempts (bulk): {args.attempts} attempts in {elapsed:.2f}s '
+              f'({args.attempts / elapsed:,.0f}/s)')
+
+        def writer(writer_id):
+            for _ in range(args.answers):
+                storage.add_attempts([make_attempt(f'writer{writer_id}')])
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.writers) as executor:
+            list(executor.map(writer, range(args.writers)))
+        elapsed = time.perf_counter() - start
+        total = args.writers * args.answers
+        print(f'add_attempts (single, {args.writers} threads): {total / elapsed:,.0f} answers/s')
+
+        timed('progress_stats (everyone)', lambda: storage.progress_stats(), repeat=200)
+        timed('progress_stats (one user)', lambda: storage.progress_stats(f'user{rng.randrange(args.users)}'),
+              repeat=200)
+        timed('user_attempts (first page)',
+              lambda: storage.user_attempts(f'user{rng.randrange(args.users)}', limit=20), repeat=200)
+        timed('list_questions', storage.list_questions, repeat=20)
+        timed('search_questions (first page)', lambda: storage.search_questions(limit=20), repeat=200)
+        timed('search_questions (text, topic)',
+              lambda: storage.search_questions(text=f'question {rng.randrange(args.questions)}',
+                                               topic=f'Topic {rng.randrange(8)}', limit=20), repeat=200)
+
+        start = time.perf_counter()
+        scanned = sum(len(chunk[0]) for chunk in storage.scan_attempts(('username', 'question_id',
+                                                                          'selected_option')))
+        elapsed = time.perf_counter() - start
+        print(f'scan_attempts: {scanned} attempts in {elapsed:.2f}s ({scanned / elapsed:,.0f}/s)')
+
+        keys = [f'bench-{i}' for i in range(200)]
+        now = time.time()
+        timed('cache_put', lambda: storage.cache_put(rng.choice(keys), 'hint', 'x' * 500, now, now + 3600),
+              repeat=200)
+        timed('cache_get', lambda: storage.cache_get(rng.choice(keys)), repeat=200)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Local stand-in for the Gemini model used by the benchmarks.
+
+FakeGeminiModel implements the part of genai.GenerativeModel that app.py
+uses: generate_content(prompt) and generate_content(prompt, stream=True).
+Latency, jitter, failure rate and stream chunking are configurable, so
+benchmarks can reproduce a slow or flaky upstream without network access.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiError(Exception):
+    pass
+
+
+class FakeGeminiModel:
+    def __init__(self, latency=0.2, jitter=0.1, failure_rate=0.0, stream_chunks=8, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a fake from FAKE_GEMINI_* environment variables"""
+        return cls(latency=float(os.getenv('FAKE_GEMINI_LATENCY', '0.2')),
+                   jitter=float(os.getenv('FAKE_GEMINI_JITTER', '0.1')),
+                   failure_rate=float(os.getenv('FAKE_GEMINI_FAILURE_RATE', '0')),
+                   stream_chunks=int(os.getenv('FAKE_GEMINI_STREAM_CHUNKS', '8')))
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+            # Streams fail somewhere in the middle rather than up front
+            fail_at = self._random.randrange(self.stream_chunks) if fail else None
+        text = self._respond(prompt)
+
+        if stream:
+            return self._stream(text, delay, fail_at)
+
+        time.sleep(delay)
+        if fail:
+            self._fail()
+        return FakeResponse(text)
+
+    def _stream(self, text, delay, fail_at):
+        size = max(1, -(-len(text) // self.stream_chunks))
+        for index in range(self.stream_chunks):
+            time.sleep(delay / self.stream_chunks)
+            if index == fail_at:
+                self._fail()
+            chunk = text[index * size:(index + 1) * size]
+            if chunk:
+                yield FakeResponse(chunk)
+
+    def _fail(self):
+        with self._lock:
+            self.failures += 1
+        raise FakeGeminiError('simulated Gemini failure')
+
+    def _respond(self, prompt):
+        if "review this student's quiz" in prompt:
+            return json.dumps({
+                'analysis': self._respond("analyze this student's learning journey"),
+                'feedback': [{'answer_number': int(number), 'feedback': 'Nice reasoning on this one!'}
+                             for number in re.findall(r'Answer Number: (\d+)', prompt)]
+            })
+        if 'Return a JSON object' in prompt:
+            n = self._random.randrange(1_000_000)
+            options = [f'Generated option {n}-{i}' for i in range(4)]
+            return json.dumps({
+                'question': f'Generated benchmark question {n}?',
+                'options': options,
+                'correct_option': options[0],
+                'explanation': 'Generated by the local Gemini stand-in.'
+            })
+        if 'analyze this student' in prompt:
+            return ('**Strengths** You handle the core definitions well.\n'
+                    '**Growth Areas** Connect concepts across SOLO levels.\n'
+                    '**Next Steps** Practice relational questions.\n'
+                    '**Encouragement** Keep going!')
+        if 'hint' in prompt:
+            return 'Think about how entities and relationships fit together.'
+        return 'Nice reasoning! Review why the correct option captures the full picture.'
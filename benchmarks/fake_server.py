@@ -0,0 +1,16 @@
+"""WSGI entry point that serves app.py with the local Gemini stand-in.
+
+Run the load test against real worker processes with e.g.
+
+    SOLOQUIZ_DB=/tmp/bench.db FAKE_GEMINI_LATENCY=0.3 \
+        gunicorn -w 4 --threads 8 'benchmarks.fake_server:app'
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --db /tmp/bench.db
+
+Configure the fake with the FAKE_GEMINI_* variables read by
+FakeGeminiModel.from_env().
+"""
+import app as soloquiz
+from benchmarks.fake_gemini import FakeGeminiModel
+
+soloquiz.model = FakeGeminiModel.from_env()
+app = soloquiz.app
@@ -0,0 +1,273 @@
+"""Route-level load test: simulated students taking quizzes against a scaled-up database.
+
+Each simulated student runs a full session:
+
+    /start_quiz -> N x (/quiz, /get_ai_hint, /submit_answer) -> /results
+    (+ its analysis stream) -> /progress
+
+Gemini is replaced by benchmarks.fake_gemini.FakeGeminiModel with
+configurable latency, failure rate and streaming. The storage backend
+(--backend: a temporary SQLite file by default, PostgreSQL at --dsn, or
+in memory) is seeded with --questions questions and --attempts historical
+attempts through the storage repository. Throughput and p50/p95/p99 latency are reported per
+route and written to --output as JSON so runs can be compared.
+
+By default requests go through Flask's test client in this process. With
+--url they are sent over HTTP to a running server instead (see
+benchmarks/fake_server.py); pass the server's database with --db so it is
+seeded first.
+
+Usage: python benchmarks/load_test.py [--students 50] [--answers 10]
+           [--questions 10000] [--attempts 1000000] [--latency 0.2]
+           [--failure-rate 0.05] [--backend sqlite|postgres|memory] [--dsn URL]
+           [--output load_test.json]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.fake_gemini import FakeGeminiModel
+
+SOLO_LEVELS = [('Pre-structural', 1), ('Uni-structural', 2), ('Multi-structural', 3),
+               ('Relational', 4), ('Extended Abstract', 5)]
+TOPICS = ['Basics of Knowledge Graphs', 'Triples, RDF & Ontologies', 'SPARQL Queries', 'Schema vs Instance',
+          'Applications of KG', 'Building a KG: Tools & Standards', 'Reasoning & Inference in KG',
+          'KGs in LLM Prompt Engineering']
+
+OPTION_RE = re.compile(r'<input type="radio" name="answer" value="([^"]*)"')
+HINT_RE = re.compile(r"question_id: (\d+),\s*question: '(.*?)',\s*level: '(.*?)',\s*topic: '(.*?)'", re.DOTALL)
+
+
+def seed(soloquiz, questions, attempts, users=5000, chunk=50000):
+    """Fill the storage backend with synthetic questions and attempt history"""
+    rng = random.Random(42)
+
+    rows = []
+    for i in range(questions):
+        level, level_order = SOLO_LEVELS[i % len(SOLO_LEVELS)]
+        options = [f'Option {j} for question {i}' for j in range(4)]
+        rows.append({'topic': TOPICS[i % len(TOPICS)], 'level': level, 'level_order': level_order,
+                     'question': f'Benchmark question {i}?', 'options': json.dumps(options),
+                     'correct_option': options[i % 4], 'explanation': f'Explanation for question {i}.'})
+    soloquiz.storage.add_questions(rows)
+    bank = soloquiz.get_question_bank().questions
+
+    # add_attempts maintains the progress rollups as it goes
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, attempts, chunk):
+        batch = []
+        for _ in range(min(chunk, attempts - offset)):
+            timestamp = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            batch.append({'username': f'student{rng.randrange(users)}', 'question': rng.choice(bank),
+                          'selected_option': 'Option 0', 'is_correct': rng.random() < 0.6,
+                          'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S')})
+        soloquiz.storage.add_attempts(batch)
+
+
+class TestClientTransport:
+    """Sends requests through Flask's test client (one per simulated student)"""
+
+    def __init__(self, flask_app):
+        self._client = flask_app.test_client()
+
+    def get(self, path):
+        response = self._client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post_form(self, path, data):
+        response = self._client.post(path, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post_json(self, path, data):
+        response = self._client.post(path, json=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTransport:
+    """Sends requests to a running server, keeping cookies per simulated student"""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _send(self, request):
+        try:
+            with self._opener.open(request, timeout=120) as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self._base_url + path))
+
+    def post_form(self, path, data):
+        body = urllib.parse.urlencode(data).encode('utf-8')
+        return self._send(urllib.request.Request(self._base_url + path, data=body))
+
+    def post_json(self, path, data):
+        return self._send(urllib.request.Request(self._base_url + path, data=json.dumps(data).encode('utf-8'),
+                                                 headers={'Content-Type': 'application/json'}))
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def timed(self, route, call, *args):
+        start = time.perf_counter()
+        try:
+            status, body = call(*args)
+        except Exception:
+            status, body = None, ''
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if status is None or status >= 500:
+                self.errors[route] += 1
+        return status, body
+
+
+def run_student(transport, recorder, student, answers):
+    rng = random.Random(student)
+    recorder.timed('start_quiz', transport.get, f'/start_quiz?username=loadtest{student}')
+    for _ in range(answers):
+        status, html = recorder.timed('quiz', transport.get, '/quiz')
+        options = OPTION_RE.findall(html)
+        if status != 200 or not options:
+            break
+        hint = HINT_RE.search(html)
+        if hint:
+            recorder.timed('get_ai_hint', transport.post_json, '/get_ai_hint',
+                           {'question_id': int(hint.group(1)), 'question': hint.group(2),
+                            'level': hint.group(3), 'topic': hint.group(4)})
+        recorder.timed('submit_answer', transport.post_form, '/submit_answer', {'answer': rng.choice(options)})
+    recorder.timed('results', transport.get, '/results')
+    recorder.timed('results_analysis_stream', transport.get, '/results/analysis_stream')
+    recorder.timed('progress', transport.get, '/progress')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        routes[route] = {
+            'requests': len(values),
+            'errors': recorder.errors[route],
+            'throughput_rps': len(values) / elapsed,
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50, help='concurrent simulated students')
+    parser.add_argument('--answers', type=int, default=10, help='questions answered per session')
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--attempts', type=int, default=1000000, help='historical attempts to seed')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake Gemini latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--stream-chunks', type=int, default=8)
+    parser.add_argument('--cold-llm-cache', action='store_true', help='disable the LLM response cache')
+    parser.add_argument('--ai-policy', choices=['local', 'local_first', 'llm'],
+                        help='provider policy for hints, feedback and analysis (in-process runs only); '
+                             '"local" runs without any Gemini calls')
+    parser.add_argument('--url', help='drive a running server instead of the in-process test client')
+    parser.add_argument('--db', help='database to seed (required with --url; a temp file otherwise)')
+    parser.add_argument('--backend', choices=['sqlite', 'postgres', 'memory'], default='sqlite',
+                        help='storage backend (in-process runs, or the one the --url server uses)')
+    parser.add_argument('--dsn', help='PostgreSQL connection string for --backend postgres')
+    parser.add_argument('--output', default='load_test.json')
+    args = parser.parse_args()
+
+    if args.url and not args.db:
+        parser.error('--url needs --db pointing at the server database')
+    if args.backend == 'postgres' and not args.dsn:
+        parser.error('--backend postgres needs --dsn')
+    if args.url and args.backend == 'memory':
+        parser.error('a memory backend cannot be shared with a --url server')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SOLOQUIZ_DB'] = args.db or os.path.join(tmp, 'load_test.db')
+        os.environ['STORAGE_BACKEND'] = args.backend
+        if args.dsn:
+            os.environ['DATABASE_URL'] = args.dsn
+        if args.cold_llm_cache:
+            for kind in ('HINT', 'FEEDBACK', 'ANALYSIS', 'QUESTION', 'REVIEW'):
+                os.environ[f'LLM_CACHE_TTL_{kind}'] = '0'
+        if args.ai_policy:
+            for kind in ('HINT', 'FEEDBACK', 'ANALYSIS'):
+                os.environ[f'AI_POLICY_{kind}'] = args.ai_policy
+        import app as soloquiz
+
+        soloquiz.init_db()
+        start = time.perf_counter()
+        seed(soloquiz, args.questions, args.attempts)
+        print(f'Seeded {args.questions} questions and {args.attempts} attempts '
+              f'in {time.perf_counter() - start:.1f}s')
+
+        fake = FakeGeminiModel(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                               stream_chunks=args.stream_chunks, seed=1)
+        soloquiz.model = fake
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.students) as executor:
+            for student in range(args.students):
+                transport = HTTPTransport(args.url) if args.url else TestClientTransport(soloquiz.app)
+                executor.submit(run_student, transport, recorder, student, args.answers)
+        elapsed = time.perf_counter() - start
+        soloquiz.feedback_executor.shutdown(wait=True)
+
+    routes = summarize(recorder, elapsed)
+    print(f'{"route":26s} {"reqs":>6s} {"err":>5s} {"rps":>8s} {"p50 ms":>9s} {"p95 ms":>9s} {"p99 ms":>9s}')
+    for route, stats in routes.items():
+        print(f'{route:26s} {stats["requests"]:6d} {stats["errors"]:5d} {stats["throughput_rps"]:8.1f} '
+              f'{stats["p50_ms"]:9.1f} {stats["p95_ms"]:9.1f} {stats["p99_ms"]:9.1f}')
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'config': vars(args),
+            'duration_s': elapsed,
+            'fake_gemini': {'calls': fake.calls, 'failures': fake.failures},
+            'routes': routes
+        }, f, indent=2)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+from collections import defaultdict, namedtuple
+from itertools import repeat
+
+import numpy as np
+
+# Choice code of a stored answer that is not one of the question's current options
+UNMATCHED = -2
+
+ItemStats = namedtuple('ItemStats', ['question_id', 'topic', 'level', 'question', 'responses', 'p_value',
+                                     'discrimination', 'option_rates', 'flags'])
+ItemAnalysis = namedtuple('ItemAnalysis', ['items', 'reliability', 'reliability_users', 'users', 'attempts'])
+Responses = namedtuple('Responses', ['users', 'columns', 'choices', 'user_count', 'attempts'])
+
+
+def load_responses(chunks, questions):
+    """Collect every user's latest answer to each question from a stream of attempts.
+
+    `chunks` yields (usernames, question_ids, selected_options) column
+    sequences in attempt order, so only one chunk of rows is held in Python
+    objects at once. Only answered cells are kept, as parallel arrays of
+    user row, question column and choice sorted by (user, question), so
+    memory grows with the (user, question) pairs actually answered rather
+    than with users x questions. A choice is the option index, or UNMATCHED.
+    Attempts for questions not in `questions` are ignored.
+    """
+    column = {q['id']: j for j, q in enumerate(questions)}
+    option_codes = {(q['id'], option): i for q in questions for i, option in enumerate(q['options'])}
+    users = defaultdict(lambda: len(users))
+    width = max(len(questions), 1)
+    keys = np.empty(0, dtype=np.int64)  # user row * width + column, unique and sorted
+    choices = np.empty(0, dtype=np.int8)
+    pending_keys, pending_choices, pending = [], [], 0
+    attempts = 0
+
+    def merge():
+        # Later attempts come later in the arrays, so the last occurrence of a cell is the latest answer
+        merged_keys = np.concatenate([keys] + pending_keys)[::-1]
+        merged_choices = np.concatenate([choices] + pending_choices)[::-1]
+        unique, latest = np.unique(merged_keys, return_index=True)
+        pending_keys.clear()
+        pending_choices.clear()
+        return unique, merged_choices[latest]
+
+    for usernames, question_ids, selected in chunks:
+        attempts += len(question_ids)
+        columns = np.fromiter(map(column.get, question_ids, repeat(-1)), dtype=np.int64, count=len(question_ids))
+        chosen = np.fromiter(map(option_codes.get, zip(question_ids, selected), repeat(UNMATCHED)),
+                             dtype=np.int8, count=len(question_ids))
+        user_rows = np.fromiter(map(users.__getitem__, usernames), dtype=np.int64, count=len(usernames))
+        known = columns >= 0
+        pending_keys.append(user_rows[known] * width + columns[known])
+        pending_choices.append(chosen[known])
+        pending += int(known.sum())
+        # Deduplicating once the new cells outnumber the kept ones keeps the sorting cost amortized
+        if pending >= len(keys):
+            keys, choices = merge()
+            pending = 0
+    if pending_keys:
+        keys, choices = merge()
+
+    return Responses(keys // width, keys % width, choices, len(users), attempts)
+
+
+def point_biserial(columns, correct, rest, k):
+    """Correlation of each of `k` items with the rest score (total minus the item), over the users who answered it.
+
+    The arguments hold one entry per answered cell: its item column, 0/1
+    correctness and the user's rest score.
+    """
+    n = np.bincount(columns, minlength=k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.bincount(columns, weights=correct, minlength=k) / n
+        mean_rest = np.bincount(columns, weights=rest, minlength=k) / n
+        cov = np.bincount(columns, weights=correct * rest, minlength=k) / n - p * mean_rest
+        var_rest = np.bincount(columns, weights=rest ** 2, minlength=k) / n - mean_rest ** 2
+        r = cov / np.sqrt(p * (1 - p) * var_rest)
+    return np.where(np.isfinite(r), r, np.nan)
+
+
+def reliability(answered, correct):
+    """Reliability of each learner's share of correct answers, from per-learner answered and correct counts.
+
+    Compares the variance of the share across learners with its binomial
+    sampling error for the number of items each learner answered. When
+    every learner answered the same items this is KR-21, a lower bound of
+    KR-20, but it does not need anyone to have answered every item. Only
+    learners with at least two answers count. Returns (value or None if
+    undefined, learners used).
+    """
+    keep = answered >= 2
+    users = int(keep.sum())
+    if users < 2:
+        return None, users
+    share = correct[keep] / answered[keep]
+    variance = share.var()
+    if variance == 0:
+        return None, users
+    error = (share * (1 - share) / (answered[keep] - 1)).mean()
+    return float(1 - error / variance), users
+
+
+def analyze_items(chunks, questions, min_responses=10):
+    """Item statistics for every question plus the reliability of each SOLO level's scores.
+
+    `chunks` is an attempt stream as taken by load_responses; `questions`
+    are question bank dicts (id, topic, level, question, options,
+    correct_option). Flags are only raised for questions with at least
+    `min_responses` answers.
+    """
+    responses = load_responses(chunks, questions)
+    k = len(questions)
+    correct_index = np.array([q['options'].index(q['correct_option']) if q['correct_option'] in q['options']
+                              else UNMATCHED for q in questions], dtype=np.int8)
+
+    columns = responses.columns
+    correct = (responses.choices == correct_index[columns]).astype(np.float64)
+    answers = np.bincount(columns, minlength=k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_values = np.bincount(columns, weights=correct, minlength=k) / answers
+    totals = np.bincount(responses.users, weights=correct, minlength=responses.user_count)
+    discrimination = point_biserial(columns, correct, totals[responses.users] - correct, k)
+
+    # Option choice counts for every question in one bincount over (question, option) cells
+    width = max((len(q['options']) for q in questions), default=0)
+    counts = np.zeros((k, width), dtype=np.int64)
+    if width:
+        picked = responses.choices >= 0
+        cells = columns[picked] * width + responses.choices[picked]
+        counts = np.bincount(cells, minlength=k * width).reshape(k, width)
+
+    items = []
+    for j, q in enumerate(questions):
+        n = int(answers[j])
+        rates = {option: (float(counts[j, i] / n) if n else None) for i, option in enumerate(q['options'])}
+        p = float(p_values[j]) if n else None
+        r = float(discrimination[j]) if not np.isnan(discrimination[j]) else None
+
+        flags = []
+        if n >= min_responses:
+            if p > 0.9:
+                flags.append('too easy')
+            elif p < 0.2:
+                flags.append('too hard')
+            if r is not None and r < 0.2:
+                flags.append('low discrimination')
+            if any(rate < 0.05 for option, rate in rates.items() if option != q['correct_option']):
+                flags.append('unused distractor')
+        items.append(ItemStats(q['id'], q['topic'], q['level'], q['question'], n, p, r, rates, flags))
+
+    # Reliability per SOLO level over each learner's answers to that level's questions
+    levels = {}
+    for j, q in enumerate(questions):
+        levels.setdefault(q['level'], []).append(j)
+    level_of = np.zeros(k, dtype=np.int64)
+    for index, level_columns in enumerate(levels.values()):
+        level_of[level_columns] = index
+    reliabilities, reliability_users = {}, {}
+    for index, level in enumerate(levels):
+        in_level = level_of[columns] == index
+        users = responses.users[in_level]
+        reliabilities[level], reliability_users[level] = reliability(
+            np.bincount(users, minlength=responses.user_count),
+            np.bincount(users, weights=correct[in_level], minlength=responses.user_count))
+
+    return ItemAnalysis(items, reliabilities, reliability_users, responses.user_count, responses.attempts)
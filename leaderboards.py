@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+# Leaderboards exist for every scope below and for two windows: all time and the ISO week.
+# A weekly board is dropped once its week is over (see prune_leaderboards in storage).
+SCOPES = ('overall', 'topic', 'level')
+ALL_TIME = 'all'
+
+
+def week_of(timestamp=None):
+    """ISO week ('2024-W07') of a 'YYYY-MM-DD HH:MM:SS' UTC timestamp, or of now"""
+    if timestamp is None:
+        moment = datetime.now(timezone.utc)
+    else:
+        moment = datetime.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S')
+    year, week, _ = moment.isocalendar()
+    return f'{year}-W{week:02d}'
+
+
+def board_keys(question, week, current_week):
+    """(scope, period) of every leaderboard an answer to `question` in `week` counts towards.
+
+    Answers from before `current_week` only count all time, as their
+    weekly board has expired.
+    """
+    scopes = ('overall', f"topic:{question['topic']}", f"level:{question['level']}")
+    periods = (ALL_TIME, week) if week >= current_week else (ALL_TIME,)
+    return [(scope, period) for scope in scopes for period in periods]
+
+
+def aggregate_results(attempts):
+    """Sum attempts into {(scope, period, username): [correct, total]}.
+
+    Each attempt is a dict with username, question (a question bank dict),
+    is_correct and an optional timestamp, as taken by add_attempts.
+    """
+    current_week = week_of()
+    results = {}
+    for a in attempts:
+        week = week_of(a['timestamp']) if a.get('timestamp') else current_week
+        for scope, period in board_keys(a['question'], week, current_week):
+            counts = results.setdefault((scope, period, a['username']), [0, 0])
+            counts[0] += int(bool(a['is_correct']))
+            counts[1] += 1
+    return results
+
+
+def scan_results(chunks, by_id):
+    """Aggregate a stream of (usernames, question_ids, is_correct, timestamps) chunks in one pass.
+
+    Attempts at questions no longer in the bank are skipped, and only the
+    current week gets a weekly board. Returns the same mapping as
+    aggregate_results.
+    """
+    current_week = week_of()
+    results = {}
+    weeks = {}
+    for usernames, question_ids, corrects, timestamps in chunks:
+        for username, question_id, is_correct, timestamp in zip(usernames, question_ids, corrects, timestamps):
+            question = by_id.get(question_id)
+            if question is None:
+                continue
+            # Timestamps sort by day first, so one week lookup per distinct day suffices
+            day = timestamp[:10]
+            week = weeks.get(day)
+            if week is None:
+                week = weeks[day] = week_of(timestamp)
+            for scope, period in board_keys(question, week, current_week):
+                counts = results.setdefault((scope, period, username), [0, 0])
+                counts[0] += int(is_correct)
+                counts[1] += 1
+    return results
+
+
+def rank_order(row):
+    """Sort key of a leaderboard row: most correct answers first, then fewest attempts"""
+    return (-row['correct'], row['total'], row['username'])
+
+
+def current_periods():
+    """{window: period} of the windows offered on the leaderboard page: all time and this week"""
+    return {'all': ALL_TIME, 'week': week_of()}
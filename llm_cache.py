@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """An upstream call in progress that identical concurrent requests wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMCache:
+    """Two-level cache for LLM responses with single-flight de-duplication.
+
+    Lookups go to an in-memory LRU first and then to the persistent
+    ``llm_cache`` table of the storage repository. On a miss only one caller per key runs the upstream
+    generation; concurrent callers with the same (kind, prompt) wait for and
+    share its result. Each kind has its own TTL; a TTL of 0 disables caching
+    for that kind but keeps the request coalescing.
+
+    ``store`` is a storage repository (see storage.py); its cache_* methods
+    hold the persisted responses.
+    """
+
+    def __init__(self, store, ttls, memory_size=1024, max_rows=10000):
+        self._store = store
+        self._ttls = dict(ttls)
+        self._memory_size = memory_size
+        self._max_rows = max_rows
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._stats = {
+            'memory_hits': 0,
+            'db_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def make_key(kind, prompt):
+        return hashlib.sha256(f'{kind}\0{prompt}'.encode('utf-8')).hexdigest()
+
+    def get_or_generate(self, kind, prompt, generate):
+        """Return the cached response for (kind, prompt), calling generate() on a miss"""
+        key = self.make_key(kind, prompt)
+        ttl = self._ttls.get(kind, 0)
+
+        if ttl > 0:
+            cached = self._memory_get(key)
+            if cached is not None:
+                self._count('memory_hits')
+                return cached
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not leader:
+            self._count('coalesced')
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = self._db_get(key) if ttl > 0 else None
+            if result is not None:
+                self._count('db_hits')
+            else:
+                self._count('misses')
+                result = generate()
+                if ttl > 0:
+                    self._db_put(key, kind, result, ttl)
+            if ttl > 0:
+                self._memory_put(key, result, time.time() + ttl)
+            flight.result = result
+            return result
+        except Exception as e:
+            self._count('errors')
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def get(self, kind, prompt):
+        """Return the cached response for (kind, prompt) without generating, or None"""
+        if self._ttls.get(kind, 0) <= 0:
+            return None
+        key = self.make_key(kind, prompt)
+        result = self._memory_get(key)
+        if result is not None:
+            self._count('memory_hits')
+            return result
+        result = self._db_get(key)
+        self._count('db_hits' if result is not None else 'misses')
+        return result
+
+    def put(self, kind, prompt, response):
+        """Store a response produced outside get_or_generate(), e.g. a streamed one"""
+        ttl = self._ttls.get(kind, 0)
+        if ttl <= 0:
+            return
+        key = self.make_key(kind, prompt)
+        self._db_put(key, kind, response, ttl)
+        self._memory_put(key, response, time.time() + ttl)
+
+    def invalidate(self, kind, prompt):
+        """Drop a cached response, e.g. when it turned out to be unusable"""
+        key = self.make_key(kind, prompt)
+        with self._lock:
+            self._memory.pop(key, None)
+        self._store.cache_delete(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = ((stats['memory_hits'] + stats['db_hits'] + stats['coalesced']) / lookups) if lookups else 0.0
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_put(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _db_get(self, key):
+        try:
+            row = self._store.cache_get(key)
+        except self._store.transient_errors:
+            # An unavailable persistent tier is a miss, like a failed write is skipped
+            return None
+        if row is None or row[1] <= time.time():
+            return None
+        # Keep the in-memory copy no longer than the persisted one
+        self._memory_put(key, row[0], row[1])
+        return row[0]
+
+    def _db_put(self, key, kind, response, ttl):
+        now = time.time()
+        try:
+            self._store.cache_put(key, kind, response, now, now + ttl)
+
+            with self._lock:
+                self._writes_since_evict += 1
+                evict = self._writes_since_evict >= 100
+                if evict:
+                    self._writes_since_evict = 0
+            if evict:
+                # Remove expired rows, then the oldest rows beyond max_rows
+                self._count('evictions', self._store.cache_evict(now, self._max_rows))
+        except self._store.transient_errors:
+            # A cache write is best effort; never fail the request over it
+            pass
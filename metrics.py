@@ -0,0 +1,236 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Values live in process memory. When ``multiprocess_dir`` is set (one
+    directory shared by all gunicorn workers), each process writes a
+    snapshot of its values there from a background thread every
+    ``flush_interval`` seconds, and render() sums the snapshots of every
+    live process, so a scrape that lands on any worker sees totals for the
+    whole server. Recording a value never touches the disk. A process
+    removes its snapshot at exit; snapshots of processes that died without
+    doing so are skipped and deleted. Snapshot files are named by pid and a
+    random token so a later process reusing the pid cannot overwrite one.
+    """
+
+    def __init__(self, multiprocess_dir=None, flush_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self._dir = multiprocess_dir
+        self._flush_interval = flush_interval
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._histograms = {}
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        self._file_owner = None
+        self._closed = False
+        if self._dir:
+            os.makedirs(self._dir, exist_ok=True)
+            atexit.register(self.close)
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Values recorded before the fork are the parent's to report, and a lock held by
+        # one of its threads at the fork would never be released in the child
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._ensure_flusher()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self._buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self._buckets):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+        self._ensure_flusher()
+
+    def time(self, name, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, name, labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, dict(h, buckets=list(h['buckets']))]
+                               for (name, labels), h in self._histograms.items()]
+            }
+
+    def _ensure_flusher(self):
+        # Started lazily so a forked worker (e.g. gunicorn --preload) gets its own flusher
+        if not self._dir or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while not self._closed:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                # Metrics are best effort; try again next interval
+                pass
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory"""
+        if not self._dir:
+            return
+        with self._flush_lock:
+            if self._closed:
+                return
+            path = self._path()
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp_path, path)
+
+    def close(self):
+        """Stop flushing and remove this process's snapshot, as its values die with it"""
+        with self._flush_lock:
+            self._closed = True
+            try:
+                os.remove(self._path())
+            except FileNotFoundError:
+                pass
+
+    def _path(self):
+        return os.path.join(self._dir, f'metrics-{self._file_token()}.json')
+
+    def _file_token(self):
+        # Regenerated after a fork, since a forked worker inherits the registry
+        pid = os.getpid()
+        if self._file_owner is None or self._file_owner[0] != pid:
+            self._file_owner = (pid, f'{pid}-{uuid.uuid4().hex[:12]}')
+        return self._file_owner[1]
+
+    def _collect(self):
+        if not self._dir:
+            snapshots = [self._snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            for path in glob.glob(os.path.join(self._dir, 'metrics-*.json')):
+                if not _process_alive(os.path.basename(path).split('-')[1]):
+                    # Left by a worker that died without removing it
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        counters = {}
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, h in snapshot['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = histograms.setdefault(key, {'buckets': [0] * len(self._buckets), 'sum': 0.0, 'count': 0})
+                for i, count in enumerate(h['buckets']):
+                    total['buckets'][i] += count
+                total['sum'] += h['sum']
+                total['count'] += h['count']
+        return counters, histograms
+
+    def render(self):
+        """Render all metrics, summed across processes, in the Prometheus text format"""
+        counters, histograms = self._collect()
+        lines = []
+        emitted = set()
+
+        def header(name, default_kind):
+            if name not in emitted:
+                emitted.add(name)
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {self._types.get(name, default_kind)}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), h in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self._buckets, h['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {h["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {h["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {h["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._registry.observe(self._name, time.perf_counter() - self._start, **self._labels)
+        return False
@@ -0,0 +1,110 @@
+import hashlib
+import re
+import struct
+import threading
+
+# Words that carry no meaning on their own; left in, they make unrelated questions look alike
+_STOPWORDS = frozenset('''a an and are as be by can do does for following from how in is it of on or
+                          that the this to what when which who why with'''.split())
+
+
+def shingles(text):
+    """Word unigrams and bigrams of a question, ignoring case, punctuation and stopwords"""
+    words = [word for word in re.findall(r'[a-z0-9]+', text.lower()) if word not in _STOPWORDS]
+    result = set(words)
+    result.update(f'{first} {second}' for first, second in zip(words, words[1:]))
+    return frozenset(result)
+
+
+class NearDuplicateIndex:
+    """In-memory MinHash/LSH index for finding near-duplicate question texts.
+
+    Each text is reduced to a set of shingles and a MinHash signature of
+    ``bands * rows`` values, one per 32-bit slice of a SHAKE-128 digest of
+    each shingle, so a signature costs one hash call per shingle. Texts whose signatures agree on every value of
+    at least one band are candidates; candidates are then scored by the
+    exact Jaccard similarity of their shingle sets. A query therefore costs
+    one signature plus a few bucket lookups, independent of the number of
+    indexed texts. With the defaults a pair at similarity 0.7 is found
+    about 99% of the time.
+    """
+
+    def __init__(self, threshold=0.7, bands=16, rows=4):
+        self.threshold = threshold
+        self._bands = bands
+        self._rows = rows
+        self._unpack = struct.Struct(f'<{bands * rows}I').unpack
+        self._lock = threading.Lock()
+        self._buckets = [{} for _ in range(bands)]
+        self._entries = {}  # key -> (text, shingles, band keys)
+        self.version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, shingle_set):
+        size = self._bands * self._rows * 4
+        hashes = [self._unpack(hashlib.shake_128(shingle.encode('utf-8')).digest(size)) for shingle in shingle_set]
+        signature = [min(column) for column in zip(*hashes)]
+        return [hash(tuple(signature[band * self._rows:(band + 1) * self._rows])) for band in range(self._bands)]
+
+    def add(self, key, text):
+        """Index `text` under `key`, replacing whatever the key held before"""
+        shingle_set = shingles(text)
+        band_keys = self._band_keys(shingle_set) if shingle_set else []
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (text, shingle_set, band_keys)
+            for buckets, band_key in zip(self._buckets, band_keys):
+                buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for buckets, band_key in zip(self._buckets, entry[2]):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def query(self, text, exclude=None, threshold=None):
+        """Return [(key, similarity)] of indexed texts at least `threshold` similar to `text`, best first"""
+        threshold = self.threshold if threshold is None else threshold
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return []
+        band_keys = self._band_keys(shingle_set)
+
+        matches = []
+        with self._lock:
+            candidates = set()
+            for buckets, band_key in zip(self._buckets, band_keys):
+                candidates.update(buckets.get(band_key, ()))
+            candidates.discard(exclude)
+            for key in candidates:
+                other = self._entries[key][1]
+                similarity = len(shingle_set & other) / len(shingle_set | other)
+                if similarity >= threshold:
+                    matches.append((key, similarity))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def sync(self, texts, version):
+        """Bring the index in line with {key: text}, re-hashing only new or changed texts"""
+        if version is not None and version == self.version:
+            return
+        with self._lock:
+            stale = [key for key in self._entries if key not in texts]
+            changed = [(key, text) for key, text in texts.items()
+                       if key not in self._entries or self._entries[key][0] != text]
+        for key in stale:
+            self.remove(key)
+        for key, text in changed:
+            self.add(key, text)
+        self.version = version
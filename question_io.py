@@ -0,0 +1,120 @@
+import json
+from collections import namedtuple
+
+# Columns of the questions table, in export order; `options` is written as a JSON list
+QUESTION_FIELDS = ('id', 'topic', 'level', 'level_order', 'question', 'options', 'correct_option',
+                   'explanation', 'created_at')
+
+ImportResult = namedtuple('ImportResult', ['imported', 'errors', 'error_count'])
+
+
+def export_questions(store, batch_size=500):
+    """Yield the question bank of a storage repository as JSONL lines, one row per line.
+
+    Rows are read in id order, one keyset batch at a time, so neither the
+    whole bank nor a long-running read transaction is held while a slow
+    client downloads the file.
+    """
+    last_id = 0
+    while True:
+        rows = store.questions_after(last_id, batch_size)
+        if not rows:
+            return
+        for row in rows:
+            record = {field: row[field] for field in QUESTION_FIELDS}
+            record['options'] = json.loads(record['options'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        last_id = rows[-1]['id']
+
+
+def parse_question_record(line, level_orders):
+    """Turn one JSONL line into a row for the questions table; raises ValueError if invalid"""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'invalid JSON: {e.msg}')
+    if not isinstance(record, dict):
+        raise ValueError('expected a JSON object')
+
+    for field in ('topic', 'level', 'question', 'correct_option', 'explanation'):
+        if not isinstance(record.get(field), str) or not record[field].strip():
+            raise ValueError(f'missing or empty "{field}"')
+
+    level = record['level']
+    if level not in level_orders:
+        raise ValueError(f'unknown SOLO level "{level}"')
+    if record.get('level_order') is not None and record['level_order'] != level_orders[level]:
+        raise ValueError(f'level_order {record["level_order"]} does not match level "{level}"')
+
+    options = record.get('options')
+    if isinstance(options, str):
+        # Accept the table's own encoding as well as a plain list
+        try:
+            options = json.loads(options)
+        except json.JSONDecodeError:
+            raise ValueError('"options" is not a JSON list')
+    if not isinstance(options, list) or len(options) < 2 or \
+            not all(isinstance(option, str) and option.strip() for option in options):
+        raise ValueError('"options" must be a list of at least two non-empty strings')
+    if record['correct_option'] not in options:
+        raise ValueError('"correct_option" is not one of the options')
+
+    question_id = record.get('id')
+    if question_id is not None and (not isinstance(question_id, int) or isinstance(question_id, bool)
+                                    or question_id < 1):
+        raise ValueError('"id" must be a positive integer')
+
+    return {
+        'id': question_id,
+        'topic': record['topic'].strip(),
+        'level': level,
+        'level_order': level_orders[level],
+        'question': record['question'].strip(),
+        'options': json.dumps(options),
+        'correct_option': record['correct_option'],
+        'explanation': record['explanation']
+    }
+
+
+def import_questions(store, lines, level_orders, batch_size=500, max_errors=1000, check=None):
+    """Upsert questions from an iterable of JSONL lines into a storage repository.
+
+    Lines are parsed one at a time and written in transactions of
+    `batch_size` rows. Rows with an id replace the existing question with
+    that id; rows without one are inserted. Invalid lines are skipped and
+    reported as (line_number, message), up to `max_errors` of them.
+    `check(row, line_number)` may reject a valid row by returning a message.
+    """
+    imported = 0
+    error_count = 0
+    errors = []
+    batch = []
+
+    def flush():
+        store.upsert_questions(batch)
+        batch.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            row = parse_question_record(line, level_orders)
+            problem = check(row, line_number) if check else None
+            if problem:
+                raise ValueError(problem)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < max_errors:
+                errors.append((line_number, str(e)))
+            continue
+
+        batch.append(row)
+        imported += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return ImportResult(imported, errors, error_count)
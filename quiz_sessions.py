@@ -0,0 +1,153 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# answers is a list of (question_id, option_index); option_index is -1 when
+# the submitted text matched none of the options
+QuizState = namedtuple('QuizState', ['session_id', 'username', 'current_index', 'score', 'answers'])
+
+
+def encode_answer(question_id, option_index):
+    return f'{question_id}:{option_index},'
+
+
+def decode_answers(text):
+    answers = []
+    for item in text.split(','):
+        if item:
+            question_id, option_index = item.split(':')
+            answers.append((int(question_id), int(option_index)))
+    return answers
+
+
+class SQLiteQuizSessionStore:
+    """Quiz progress kept server-side in the quiz_sessions table.
+
+    The browser cookie only carries the session id. Answers are appended as
+    compact ``question_id:option_index`` pairs with a single UPDATE, so
+    recording an answer never rewrites the whole history.
+    """
+
+    def __init__(self, connect, max_age=7 * 24 * 3600):
+        self._connect = connect
+        self._max_age = max_age
+
+    def create(self, username):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        # Expire abandoned quizzes whenever a new one starts
+        conn.execute('DELETE FROM quiz_sessions WHERE updated_at < ?', (now - self._max_age,))
+        conn.execute('''INSERT INTO quiz_sessions (session_id, username, current_index, score, answers, updated_at)
+                        VALUES (?, ?, 0, 0, '', ?)''',
+                     (session_id, username, now))
+        conn.commit()
+        return session_id
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        row = self._connect().execute('''SELECT session_id, username, current_index, score, answers
+                                         FROM quiz_sessions WHERE session_id = ?''',
+                                      (session_id,)).fetchone()
+        if row is None:
+            return None
+        return QuizState(row[0], row[1], row[2], row[3], decode_answers(row[4]))
+
+    def record_answer(self, session_id, index, question_id, option_index, is_correct):
+        """Append an answer for question number `index`; returns False if it was already answered"""
+        conn = self._connect()
+        cursor = conn.execute('''UPDATE quiz_sessions
+                                 SET current_index = current_index + 1,
+                                     score = score + ?,
+                                     answers = answers || ?,
+                                     updated_at = ?
+                                 WHERE session_id = ? AND current_index = ?''',
+                              (int(is_correct), encode_answer(question_id, option_index), time.time(),
+                               session_id, index))
+        conn.commit()
+        return cursor.rowcount == 1
+
+
+class MemoryQuizSessionStore:
+    """Process-local quiz session store for development and tests (single worker only)"""
+
+    def __init__(self, max_age=7 * 24 * 3600):
+        self._max_age = max_age
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, username):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            for expired in [sid for sid, (_, updated_at) in self._sessions.items()
+                            if updated_at < now - self._max_age]:
+                del self._sessions[expired]
+            self._sessions[session_id] = (QuizState(session_id, username, 0, 0, []), now)
+        return session_id
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry[0] if entry else None
+
+    def record_answer(self, session_id, index, question_id, option_index, is_correct):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0].current_index != index:
+                return False
+            state = entry[0]
+            self._sessions[session_id] = (state._replace(
+                current_index=state.current_index + 1,
+                score=state.score + int(is_correct),
+                answers=state.answers + [(question_id, option_index)]
+            ), time.time())
+        return True
+
+
+class PostgresQuizSessionStore:
+    """The quiz_sessions table on PostgreSQL, shared by every app node.
+
+    ``connection`` is a context manager factory yielding a pooled connection
+    for one transaction (see storage.PostgresStorage).
+    """
+
+    def __init__(self, connection, max_age=7 * 24 * 3600):
+        self._connection = connection
+        self._max_age = max_age
+
+    def create(self, username):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM quiz_sessions WHERE updated_at < %s', (now - self._max_age,))
+            cur.execute('''INSERT INTO quiz_sessions (session_id, username, current_index, score, answers, updated_at)
+                           VALUES (%s, %s, 0, 0, '', %s)''',
+                        (session_id, username, now))
+        return session_id
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute('''SELECT session_id, username, current_index, score, answers
+                           FROM quiz_sessions WHERE session_id = %s''', (session_id,))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return QuizState(row[0], row[1], row[2], row[3], decode_answers(row[4]))
+
+    def record_answer(self, session_id, index, question_id, option_index, is_correct):
+        """Append an answer for question number `index`; returns False if it was already answered"""
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute('''UPDATE quiz_sessions
+                           SET current_index = current_index + 1,
+                               score = score + %s,
+                               answers = answers || %s,
+                               updated_at = %s
+                           WHERE session_id = %s AND current_index = %s''',
+                        (int(is_correct), encode_answer(question_id, option_index), time.time(),
+                         session_id, index))
+            return cur.rowcount == 1
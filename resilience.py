@@ -0,0 +1,182 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream call was not made or not waited for; callers should use their fallback"""
+
+    reason = 'unavailable'
+
+
+class CircuitOpen(UpstreamUnavailable):
+    reason = 'circuit_open'
+
+
+class Overloaded(UpstreamUnavailable):
+    reason = 'overloaded'
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    reason = 'deadline'
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures and probes for recovery.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    every call is refused for ``reset_timeout`` seconds. It then lets a
+    single probe call through (half-open): success closes the breaker,
+    failure opens it again for another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go through now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self._reset_timeout:
+                    raise CircuitOpen('circuit open after repeated upstream failures')
+                self._state = self.HALF_OPEN
+            if self._probing:
+                raise CircuitOpen('waiting for the recovery probe')
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Give up a probe slot without a verdict, e.g. when the call was never made"""
+        with self._lock:
+            self._probing = False
+
+
+class UpstreamGuard:
+    """Concurrency cap, deadlines and a circuit breaker around a slow upstream.
+
+    At most ``max_concurrent`` calls run at once in this process; up to
+    ``max_waiting`` more may wait for a slot and anything beyond that is
+    refused straight away with Overloaded. Each call has a deadline covering
+    both the wait and the call itself. A call that misses its deadline is
+    abandoned by the caller, but keeps its slot until it actually returns,
+    so a hung upstream cannot be flooded with retries.
+    """
+
+    def __init__(self, max_concurrent=8, max_waiting=32, breaker=None):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='upstream')
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.breaker = breaker or CircuitBreaker()
+
+    def call(self, fn, timeout):
+        """Return fn(), or raise UpstreamUnavailable if it cannot finish within timeout seconds"""
+        deadline = time.monotonic() + timeout
+        self.breaker.before_call()
+        try:
+            self._acquire(deadline)
+        except UpstreamUnavailable:
+            self.breaker.release_probe()
+            raise
+
+        try:
+            future = self._executor.submit(fn)
+        except BaseException:
+            self._slots.release()
+            self.breaker.release_probe()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            raise DeadlineExceeded(f'upstream call exceeded its {timeout:g}s deadline')
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def stream(self, open_stream, timeout):
+        """Yield the items of open_stream(), giving up once timeout seconds have passed.
+
+        The deadline is checked as items arrive, so a stalled read is only
+        cut short by the client's own request timeout.
+        """
+        deadline = time.monotonic() + timeout
+        self.breaker.before_call()
+        try:
+            self._acquire(deadline)
+        except UpstreamUnavailable:
+            self.breaker.release_probe()
+            raise
+
+        try:
+            for item in open_stream():
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded(f'upstream stream exceeded its {timeout:g}s deadline')
+                yield item
+        except GeneratorExit:
+            # The consumer went away; that says nothing about the upstream
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            waiting = self._waiting
+        return {'breaker': self.breaker.state, 'waiting': waiting}
+
+    def _acquire(self, deadline):
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            if self._waiting >= self._max_waiting:
+                raise Overloaded('too many upstream calls waiting')
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise Overloaded('no upstream slot became free before the deadline')
+        finally:
+            with self._lock:
+                self._waiting -= 1
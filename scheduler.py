@@ -0,0 +1,116 @@
+import bisect
+import threading
+
+# Days, in seconds, for the review intervals below
+DAY = 24 * 3600
+
+
+class AdaptiveScheduler:
+    """Chooses each student's next question from SOLO-level mastery and a spaced-repetition queue.
+
+    Mastery is an exponential moving average of correctness per user and
+    level, starting at 0.5. A level counts as mastered once it has
+    `min_answers` answers (or as many as it has questions) and mastery of
+    at least `mastery_threshold`. New questions come from the lowest level
+    the student has not mastered; a higher level is only opened early when
+    the current one has no unseen questions left.
+
+    A missed question enters the user's review queue, due again after
+    `relearn_interval` seconds. Each correct review multiplies its interval
+    by the item's ease (starting at `first_interval`), and it leaves the
+    queue once the interval passes `max_interval`. Another miss starts it
+    over with a lower ease.
+
+    The next question is the most overdue review if any, otherwise a new
+    question. Reviews come from the repository's (username, due_at) index
+    and new questions from a per-level cursor (the highest question id
+    introduced), so choosing never scans the attempt history.
+    """
+
+    def __init__(self, storage, mastery_threshold=0.8, min_answers=3, learning_rate=0.3,
+                 relearn_interval=600, first_interval=DAY, max_interval=60 * DAY, ease=2.5, min_ease=1.3):
+        self._storage = storage
+        self.mastery_threshold = mastery_threshold
+        self.min_answers = min_answers
+        self.learning_rate = learning_rate
+        self.relearn_interval = relearn_interval
+        self.first_interval = first_interval
+        self.max_interval = max_interval
+        self.ease = ease
+        self.min_ease = min_ease
+        self._levels = (None, [])
+        self._levels_lock = threading.Lock()
+
+    def _bank_levels(self, bank):
+        """[(level, level_order, sorted question ids)] of the bank, cached per bank version"""
+        version, levels = self._levels
+        if version == bank.version:
+            return levels
+        by_level = {}
+        for question in bank.questions:
+            by_level.setdefault((question['level_order'], question['level']), []).append(question['id'])
+        levels = [(level, level_order, sorted(ids)) for (level_order, level), ids in sorted(by_level.items())]
+        with self._levels_lock:
+            self._levels = (bank.version, levels)
+        return levels
+
+    def is_mastered(self, entry, mastery):
+        level, _, ids = entry
+        state = mastery.get(level)
+        return (state is not None and state['answered'] >= min(self.min_answers, len(ids))
+                and state['mastery'] >= self.mastery_threshold)
+
+    def current_level(self, username, bank):
+        """The lowest SOLO level of the bank the user has not mastered, or None if all are"""
+        mastery = self._storage.level_mastery(username)
+        for entry in self._bank_levels(bank):
+            if not self.is_mastered(entry, mastery):
+                return entry[0]
+        return None
+
+    def next_question(self, username, bank, now):
+        """Pick the user's next question, or None when no review is due and every question has been seen"""
+        for question_id, _ in self._storage.due_reviews(username, until=now, limit=1):
+            if question_id in bank.by_id:
+                return bank.by_id[question_id]
+
+        # Unmastered levels in SOLO order first, then mastered levels that still have unseen questions
+        mastery = self._storage.level_mastery(username)
+        levels = self._bank_levels(bank)
+        for entry in sorted(levels, key=lambda entry: self.is_mastered(entry, mastery)):
+            question = self._new_question(entry, mastery)
+            if question is not None:
+                return bank.by_id[question]
+        return None
+
+    @staticmethod
+    def _new_question(entry, mastery):
+        """The first question of a level after the user's cursor there, or None"""
+        level, _, ids = entry
+        state = mastery.get(level)
+        position = bisect.bisect_right(ids, state['last_new_id'] if state else 0)
+        return ids[position] if position < len(ids) else None
+
+    def record_answer(self, username, question, is_correct, now):
+        """Update the user's mastery of the question's level and its review schedule"""
+        state = self._storage.level_mastery(username).get(question['level'])
+        if state is None:
+            state = {'level': question['level'], 'level_order': question['level_order'],
+                     'mastery': 0.5, 'answered': 0, 'last_new_id': 0}
+        state = dict(state,
+                     mastery=state['mastery'] + self.learning_rate * (int(is_correct) - state['mastery']),
+                     answered=state['answered'] + 1,
+                     last_new_id=max(state['last_new_id'], question['id']))
+
+        review = self._storage.review_state(username, question['id'])
+        if not is_correct:
+            ease = max(self.min_ease, (review['ease'] if review else self.ease) - 0.2)
+            review = {'interval': self.relearn_interval, 'ease': ease, 'repetitions': 0,
+                      'due_at': now + self.relearn_interval}
+        elif review is not None:
+            interval = self.first_interval if review['repetitions'] == 0 else review['interval'] * review['ease']
+            # A question answered right at long enough intervals is learned; stop reviewing it
+            review = None if interval > self.max_interval else {
+                'interval': interval, 'ease': review['ease'], 'repetitions': review['repetitions'] + 1,
+                'due_at': now + interval}
+        self._storage.save_schedule(username, state, question['id'], review)
@@ -0,0 +1,1567 @@
+import heapq
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from attempt_archive import ATTEMPT_COLUMNS, archive_attempts, archived_user_attempts, scan_attempts
+from leaderboards import ALL_TIME, aggregate_results, rank_order, week_of
+from quiz_sessions import MemoryQuizSessionStore, PostgresQuizSessionStore
+
+# Columns written for a question, in the order of the bulk insert parameters
+QUESTION_COLUMNS = ('topic', 'level', 'level_order', 'question', 'options', 'correct_option', 'explanation')
+
+# Drafts as PostgresStorage returns them, timestamps formatted as SQLite stores them
+DRAFT_SELECT = '''SELECT id, job_id, topic, level, level_order, question, options, correct_option, explanation,
+                         to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at
+                  FROM question_drafts'''
+
+
+def _search_terms(text):
+    """Lower-cased words of a free-text search; each matches as a word prefix, and all must match.
+
+    Words are runs of letters and digits, as split by the SQLite unicode61
+    tokenizer and the PostgreSQL search expression, so every backend finds
+    the same questions.
+    """
+    return re.findall(r'[^\W_]+', (text or '').lower())
+
+
+def _expire_weekly_leaderboards(store):
+    """Drop the weekly leaderboards of past weeks on a store's first write of each ISO week"""
+    week = week_of()
+    if store._pruned_week != week:
+        store.prune_leaderboards(week)
+        store._pruned_week = week
+
+
+def _score_count_deltas(moves):
+    """Net change of each leaderboard score bucket as sorted (scope, period, correct, users) rows.
+
+    `moves` holds (scope, period, old, new) per changed score, `old` being
+    None for a user new to the leaderboard.
+    """
+    deltas = Counter()
+    for scope, period, old, new in moves:
+        if old == new:
+            continue
+        if old is not None:
+            deltas[(scope, period, old)] -= 1
+        deltas[(scope, period, new)] += 1
+    return sorted(key + (users,) for key, users in deltas.items() if users)
+
+
+def _columns(rows, width):
+    """Transpose rows into `width` column lists, e.g. for PostgreSQL unnest() parameters"""
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+
+
+def _rollup_rows(attempts):
+    """Aggregate attempts into (*key, correct, total) rows for each of the four progress rollups.
+
+    Pre-aggregating lets a batch be applied with one upsert per key, which
+    PostgreSQL requires when several rows of a bulk upsert share a key.
+    """
+    rollups = ({}, {}, {}, {})
+    for a in attempts:
+        _count_rollups(rollups, a['username'], a['question'], a['is_correct'])
+    # Sorted, so concurrent batches lock rollup rows in the same order and cannot deadlock
+    return [sorted(key + tuple(counts) for key, counts in rollup.items()) for rollup in rollups]
+
+
+def _count_rollups(rollups, username, q, is_correct):
+    keys = ((q['topic'],), (q['level'], q['level_order']),
+            (username, q['level'], q['level_order']), (username, q['topic']))
+    for rollup, key in zip(rollups, keys):
+        counts = rollup.setdefault(key, [0, 0])
+        counts[0] += int(bool(is_correct))
+        counts[1] += 1
+
+
+def _scan_rollups(store, chunk_size):
+    """(rollup rows as from _rollup_rows, attempts counted) over a repository's whole attempt history.
+
+    Attempts at questions no longer in the bank are skipped.
+    """
+    by_id = {question['id']: question for question in store.list_questions()}
+    rollups = ({}, {}, {}, {})
+    counted = 0
+    for usernames, question_ids, corrects in store.scan_attempts(('username', 'question_id', 'is_correct'),
+                                                                 chunk_size=chunk_size):
+        for username, question_id, is_correct in zip(usernames, question_ids, corrects):
+            question = by_id.get(question_id)
+            if question is not None:
+                _count_rollups(rollups, username, question, is_correct)
+                counted += 1
+    return [sorted(key + tuple(counts) for key, counts in rollup.items()) for rollup in rollups], counted
+
+
+class SQLiteStorage:
+    """Repository over the application's SQLite database.
+
+    `connect` returns the shared connection for the current request or
+    thread (the app's get_db_connection), so the repository adds no
+    connection handling of its own. Attempts moved out by
+    `flask archive-attempts` are included when reading history, through
+    the archive returned by `archive()`.
+    """
+
+    name = 'sqlite'
+    transient_errors = (sqlite3.OperationalError,)
+
+    def __init__(self, connect, sessions, archive, leaderboard_size=20):
+        self._connect = connect
+        self.sessions = sessions
+        self._archive = archive
+        self._leaderboard_size = leaderboard_size
+        self._pruned_week = None
+
+    # Questions
+    def question_bank_version(self):
+        return self._connect().execute(
+            "SELECT value FROM app_meta WHERE key = 'question_bank_version'").fetchone()[0]
+
+    def question_count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+
+    def list_questions(self):
+        """Every question as a dict with `options` still JSON-encoded, in quiz order"""
+        rows = self._connect().execute('SELECT * FROM questions ORDER BY level_order, id').fetchall()
+        return [dict(row) for row in rows]
+
+    def add_question(self, question):
+        conn = self._connect()
+        cursor = conn.execute('''INSERT INTO questions
+                                 (topic, level, level_order, question, options, correct_option, explanation)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                              [question[column] for column in QUESTION_COLUMNS])
+        conn.commit()
+        return cursor.lastrowid
+
+    def add_questions(self, questions):
+        conn = self._connect()
+        conn.executemany('''INSERT INTO questions
+                            (topic, level, level_order, question, options, correct_option, explanation)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         [[question[column] for column in QUESTION_COLUMNS] for question in questions])
+        conn.commit()
+        return len(questions)
+
+    def questions_after(self, after_id=0, limit=500):
+        """Up to `limit` questions with ids above `after_id`, in id order, with `options` still JSON-encoded"""
+        rows = self._connect().execute('SELECT * FROM questions WHERE id > ? ORDER BY id LIMIT ?',
+                                       (after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def upsert_questions(self, questions):
+        """Write questions in one transaction: one with an `id` replaces that question, the others are added"""
+        conn = self._connect()
+        try:
+            conn.executemany('''INSERT INTO questions
+                                (id, topic, level, level_order, question, options, correct_option, explanation)
+                                VALUES (:id, :topic, :level, :level_order, :question, :options, :correct_option, :explanation)
+                                ON CONFLICT(id) DO UPDATE SET
+                                    topic = excluded.topic, level = excluded.level, level_order = excluded.level_order,
+                                    question = excluded.question, options = excluded.options,
+                                    correct_option = excluded.correct_option, explanation = excluded.explanation''',
+                             [question for question in questions if question.get('id') is not None])
+            conn.executemany('''INSERT INTO questions
+                                (topic, level, level_order, question, options, correct_option, explanation)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                             [[question[column] for column in QUESTION_COLUMNS]
+                              for question in questions if question.get('id') is None])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(questions)
+
+    def search_questions(self, text=None, topic=None, level=None, after=None, limit=20):
+        """Questions matching every filter, ordered by (topic, level_order, id), after the position `after`.
+
+        Free text is matched against the question, its options and its
+        explanation through the questions_fts index.
+        """
+        where, params = [], []
+        terms = _search_terms(text)
+        if terms:
+            # A subquery evaluates the match once; as a join, it would be repeated for every filtered row
+            where.append('id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)')
+            params.append(' '.join(f'"{term}"*' for term in terms))
+        if topic:
+            where.append('topic = ?')
+            params.append(topic)
+        if level:
+            where.append('level = ?')
+            params.append(level)
+        if after:
+            where.append('(topic, level_order, id) > (?, ?, ?)')
+            params.extend(after)
+        rows = self._connect().execute(f'''SELECT * FROM questions {'WHERE ' + ' AND '.join(where) if where else ''}
+                                           ORDER BY topic, level_order, id LIMIT ?''', params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    # Attempts
+    def add_attempts(self, attempts):
+        """Insert attempts, their rollups and leaderboard scores in one transaction; returns the last attempt id.
+
+        Each attempt is a dict with username, question (a question bank
+        dict), selected_option and is_correct, plus an optional timestamp.
+        """
+        _expire_weekly_leaderboards(self)
+        conn = self._connect()
+        try:
+            conn.executemany('''INSERT INTO attempts
+                                (username, question_id, selected_option, is_correct, timestamp)
+                                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))''',
+                             [(a['username'], a['question']['id'], a['selected_option'], a['is_correct'],
+                               a.get('timestamp')) for a in attempts])
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            topics, levels, user_levels, user_topics = _rollup_rows(attempts)
+            conn.executemany('''INSERT INTO topic_stats (topic, correct, total) VALUES (?, ?, ?)
+                                ON CONFLICT(topic) DO UPDATE SET
+                                    correct = correct + excluded.correct, total = total + excluded.total''',
+                             topics)
+            conn.executemany('''INSERT INTO level_stats (level, level_order, correct, total) VALUES (?, ?, ?, ?)
+                                ON CONFLICT(level) DO UPDATE SET
+                                    correct = correct + excluded.correct, total = total + excluded.total''',
+                             levels)
+            conn.executemany('''INSERT INTO user_level_stats (username, level, level_order, correct, total)
+                                VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT(username, level) DO UPDATE SET
+                                    correct = correct + excluded.correct, total = total + excluded.total''',
+                             user_levels)
+            conn.executemany('''INSERT INTO user_topic_stats (username, topic, correct, total) VALUES (?, ?, ?, ?)
+                                ON CONFLICT(username, topic) DO UPDATE SET
+                                    correct = correct + excluded.correct, total = total + excluded.total''',
+                             user_topics)
+            self._update_leaderboards(conn, aggregate_results(attempts))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return last_id
+
+    def rebuild_rollups(self, chunk_size=100000):
+        """Recompute the progress rollups from every attempt, archive included; returns the attempts counted"""
+        (topics, levels, user_levels, user_topics), counted = _scan_rollups(self, chunk_size)
+        conn = self._connect()
+        try:
+            for table in ('topic_stats', 'level_stats', 'user_level_stats', 'user_topic_stats'):
+                conn.execute(f'DELETE FROM {table}')
+            conn.executemany('INSERT INTO topic_stats (topic, correct, total) VALUES (?, ?, ?)', topics)
+            conn.executemany('INSERT INTO level_stats (level, level_order, correct, total) VALUES (?, ?, ?, ?)', levels)
+            conn.executemany('''INSERT INTO user_level_stats (username, level, level_order, correct, total)
+                                VALUES (?, ?, ?, ?, ?)''', user_levels)
+            conn.executemany('INSERT INTO user_topic_stats (username, topic, correct, total) VALUES (?, ?, ?, ?)',
+                             user_topics)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return counted
+
+    def progress_stats(self, username=None):
+        """(topic rows, level rows) of correct/total counts, for one user or everyone"""
+        conn = self._connect()
+        if username is None:
+            topics = conn.execute('SELECT topic, correct, total FROM topic_stats ORDER BY topic').fetchall()
+            levels = conn.execute('SELECT level, correct, total FROM level_stats ORDER BY level_order').fetchall()
+        else:
+            topics = conn.execute('''SELECT topic, correct, total FROM user_topic_stats
+                                     WHERE username = ? ORDER BY topic''', (username,)).fetchall()
+            levels = conn.execute('''SELECT level, correct, total FROM user_level_stats
+                                     WHERE username = ? ORDER BY level_order''', (username,)).fetchall()
+        return [dict(row) for row in topics], [dict(row) for row in levels]
+
+    def user_attempts(self, username, before=None, limit=20):
+        """A user's attempts newest first, after the (timestamp, id) position `before`"""
+        conn = self._connect()
+        # Both queries are range scans of idx_attempts_username_timestamp, which covers every column read
+        if before:
+            rows = conn.execute('''SELECT id, question_id, selected_option, is_correct, timestamp FROM attempts
+                                   WHERE username = ? AND (timestamp, id) < (?, ?)
+                                   ORDER BY timestamp DESC, id DESC LIMIT ?''',
+                                (username, before[0], before[1], limit)).fetchall()
+        else:
+            rows = conn.execute('''SELECT id, question_id, selected_option, is_correct, timestamp FROM attempts
+                                   WHERE username = ?
+                                   ORDER BY timestamp DESC, id DESC LIMIT ?''',
+                                (username, limit)).fetchall()
+        rows = [dict(row) for row in rows]
+
+        # Archived attempts are all older than the ones still in the table, so the history continues there
+        if len(rows) < limit:
+            rows += archived_user_attempts(conn, self._archive(), username, before=before, limit=limit - len(rows))
+        return rows
+
+    def scan_attempts(self, columns=ATTEMPT_COLUMNS, chunk_size=100000):
+        """Stream every attempt, archived ones included, as chunks of column sequences"""
+        return scan_attempts(self._connect(), self._archive(), columns, chunk_size)
+
+    def archive_attempts(self, before, batch_size=100000, vacuum=False):
+        """Move attempts older than `before` into the archive; returns (attempts archived, segments written)"""
+        conn = self._connect()
+        archived, segments = archive_attempts(conn, self._archive(), before, batch_size=batch_size)
+        if vacuum and archived:
+            conn.execute('VACUUM')
+        return archived, segments
+
+    # Adaptive scheduling
+    def level_mastery(self, username):
+        """{level: mastery row} of a user's SOLO levels"""
+        rows = self._connect().execute('''SELECT level, level_order, mastery, answered, last_new_id
+                                          FROM user_mastery WHERE username = ?''', (username,)).fetchall()
+        return {row['level']: dict(row) for row in rows}
+
+    def due_reviews(self, username, until=None, limit=1):
+        """(question_id, due_at) of the user's queued reviews, soonest first; a range scan of idx_review_queue_due"""
+        if until is None:
+            rows = self._connect().execute('''SELECT question_id, due_at FROM review_queue WHERE username = ?
+                                              ORDER BY due_at LIMIT ?''', (username, limit)).fetchall()
+        else:
+            rows = self._connect().execute('''SELECT question_id, due_at FROM review_queue
+                                              WHERE username = ? AND due_at <= ?
+                                              ORDER BY due_at LIMIT ?''', (username, until, limit)).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def review_state(self, username, question_id):
+        row = self._connect().execute('''SELECT interval_seconds AS interval, ease, repetitions, due_at
+                                         FROM review_queue WHERE username = ? AND question_id = ?''',
+                                      (username, question_id)).fetchone()
+        return dict(row) if row is not None else None
+
+    def save_schedule(self, username, mastery, question_id, review):
+        """Store a user's mastery of one level and the review of one question (None removes it)"""
+        conn = self._connect()
+        try:
+            conn.execute('''INSERT OR REPLACE INTO user_mastery
+                            (username, level, level_order, mastery, answered, last_new_id)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         (username, mastery['level'], mastery['level_order'], mastery['mastery'],
+                          mastery['answered'], mastery['last_new_id']))
+            if review is None:
+                conn.execute('DELETE FROM review_queue WHERE username = ? AND question_id = ?',
+                             (username, question_id))
+            else:
+                conn.execute('''INSERT OR REPLACE INTO review_queue
+                                (username, question_id, due_at, interval_seconds, ease, repetitions)
+                                VALUES (?, ?, ?, ?, ?, ?)''',
+                             (username, question_id, review['due_at'], review['interval'], review['ease'],
+                              review['repetitions']))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Leaderboards
+    def _update_leaderboards(self, conn, results):
+        """Add {(scope, period, username): [correct, total]} to the scores, their histogram and the top lists"""
+        rows = [key + tuple(counts) for key, counts in sorted(results.items())]
+        moves, best = [], {}
+        # Multi-row upserts, each within SQLite's limit of 32766 bound parameters
+        for start in range(0, len(rows), 1000):
+            chunk = rows[start:start + 1000]
+            updated = conn.execute(f'''INSERT INTO leaderboard_scores (scope, period, username, correct, total)
+                                       VALUES {', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))}
+                                       ON CONFLICT(scope, period, username) DO UPDATE SET
+                                           correct = correct + excluded.correct, total = total + excluded.total
+                                       RETURNING scope, period, username, correct, total''',
+                                   [value for row in chunk for value in row]).fetchall()
+            for scope, period, username, new_correct, new_total in updated:
+                correct, total = results[(scope, period, username)]
+                # Stored totals are never zero, so the row is new exactly when its total is this batch's
+                moves.append((scope, period, None if new_total == total else new_correct - correct, new_correct))
+                best[(scope, period)] = max(best.get((scope, period), 0), new_correct)
+
+        deltas = _score_count_deltas(moves)
+        conn.executemany('''INSERT INTO leaderboard_score_counts (scope, period, correct, users) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(scope, period, correct) DO UPDATE SET users = users + excluded.users''',
+                         deltas)
+        conn.executemany('''DELETE FROM leaderboard_score_counts
+                            WHERE scope = ? AND period = ? AND correct = ? AND users = 0''',
+                         [bucket[:3] for bucket in deltas if bucket[3] < 0])
+
+        # Only rematerialize a top list the changed scores can enter (or reorder)
+        cutoffs = {}
+        boards = sorted(best)
+        for start in range(0, len(boards), 1000):
+            chunk = boards[start:start + 1000]
+            for scope, period, size, cutoff in conn.execute(
+                    f'''SELECT scope, period, COUNT(*), MIN(correct) FROM leaderboard_top
+                        WHERE (scope, period) IN (VALUES {', '.join(['(?, ?)'] * len(chunk))})
+                        GROUP BY scope, period''', [value for board in chunk for value in board]):
+                cutoffs[(scope, period)] = (size, cutoff)
+        for scope, period in boards:
+            size, cutoff = cutoffs.get((scope, period), (0, None))
+            if size < self._leaderboard_size or best[(scope, period)] >= cutoff:
+                conn.execute('DELETE FROM leaderboard_top WHERE scope = ? AND period = ?', (scope, period))
+                conn.execute('''INSERT INTO leaderboard_top (scope, period, position, username, correct, total)
+                                SELECT scope, period,
+                                       ROW_NUMBER() OVER (ORDER BY correct DESC, total, username),
+                                       username, correct, total
+                                FROM leaderboard_scores WHERE scope = ? AND period = ?
+                                ORDER BY correct DESC, total, username LIMIT ?''',
+                             (scope, period, self._leaderboard_size))
+
+    def leaderboard(self, scope, period):
+        """The materialized top list of a leaderboard, best first"""
+        rows = self._connect().execute('''SELECT position, username, correct, total FROM leaderboard_top
+                                          WHERE scope = ? AND period = ? ORDER BY position''',
+                                       (scope, period)).fetchall()
+        return [dict(row) for row in rows]
+
+    def leaderboard_rank(self, scope, period, username):
+        """A user's standing on a leaderboard (users with the same score share a rank), or None"""
+        conn = self._connect()
+        row = conn.execute('''SELECT correct, total FROM leaderboard_scores
+                              WHERE scope = ? AND period = ? AND username = ?''',
+                           (scope, period, username)).fetchone()
+        if row is None:
+            return None
+        # One pass over the histogram: the number of distinct scores, not the number of users
+        ahead, users = conn.execute('''SELECT COALESCE(SUM(CASE WHEN correct > ? THEN users END), 0),
+                                              COALESCE(SUM(users), 0)
+                                       FROM leaderboard_score_counts WHERE scope = ? AND period = ?''',
+                                    (row['correct'], scope, period)).fetchone()
+        return {'rank': ahead + 1, 'users': users, 'correct': row['correct'], 'total': row['total']}
+
+    def replace_leaderboards(self, results, commit=True):
+        """Replace every leaderboard with {(scope, period, username): [correct, total]} in one transaction"""
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM leaderboard_scores')
+            conn.execute('DELETE FROM leaderboard_score_counts')
+            conn.execute('DELETE FROM leaderboard_top')
+            conn.executemany('''INSERT INTO leaderboard_scores (scope, period, username, correct, total)
+                                VALUES (?, ?, ?, ?, ?)''',
+                             [key + tuple(counts) for key, counts in results.items()])
+            conn.execute('''INSERT INTO leaderboard_score_counts (scope, period, correct, users)
+                            SELECT scope, period, correct, COUNT(*) FROM leaderboard_scores
+                            GROUP BY scope, period, correct''')
+            conn.execute('''INSERT INTO leaderboard_top (scope, period, position, username, correct, total)
+                            SELECT scope, period, position, username, correct, total FROM (
+                                SELECT scope, period, username, correct, total,
+                                       ROW_NUMBER() OVER (PARTITION BY scope, period
+                                                          ORDER BY correct DESC, total, username) AS position
+                                FROM leaderboard_scores
+                            ) WHERE position <= ?''', (self._leaderboard_size,))
+            if commit:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def prune_leaderboards(self, current_week):
+        """Delete the weekly leaderboards of weeks before `current_week`; returns the number of scores removed"""
+        conn = self._connect()
+        expired = (ALL_TIME, current_week)
+        try:
+            removed = conn.execute('DELETE FROM leaderboard_scores WHERE period <> ? AND period < ?', expired).rowcount
+            conn.execute('DELETE FROM leaderboard_score_counts WHERE period <> ? AND period < ?', expired)
+            conn.execute('DELETE FROM leaderboard_top WHERE period <> ? AND period < ?', expired)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return removed
+
+    # Caches
+    def precomputed_feedback(self, question_id, option_index, content_hash):
+        row = self._connect().execute('''SELECT feedback FROM precomputed_feedback
+                                         WHERE question_id = ? AND option_index = ? AND content_hash = ?''',
+                                      (question_id, option_index, content_hash)).fetchone()
+        return row[0] if row is not None else None
+
+    def precomputed_feedback_hashes(self):
+        """{(question_id, option_index): content_hash} of every precomputed feedback"""
+        rows = self._connect().execute('SELECT question_id, option_index, content_hash FROM precomputed_feedback')
+        return {(row[0], row[1]): row[2] for row in rows}
+
+    def delete_precomputed_feedback(self, question_ids):
+        conn = self._connect()
+        conn.executemany('DELETE FROM precomputed_feedback WHERE question_id = ?', [(i,) for i in question_ids])
+        conn.commit()
+
+    def save_precomputed_feedback(self, question_id, feedback):
+        """Replace a question's precomputed feedback with (option_index, content_hash, feedback) rows"""
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM precomputed_feedback WHERE question_id = ?', (question_id,))
+            conn.executemany('''INSERT INTO precomputed_feedback (question_id, option_index, content_hash, feedback)
+                                VALUES (?, ?, ?, ?)''', [(question_id,) + tuple(row) for row in feedback])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def attempt_feedback(self, attempt_id):
+        """(status, feedback) of an attempt's background feedback, or None while it is being generated"""
+        row = self._connect().execute('SELECT status, feedback FROM attempt_feedback WHERE attempt_id = ?',
+                                      (attempt_id,)).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def save_attempt_feedback(self, attempt_id, feedback, status='ready'):
+        conn = self._connect()
+        conn.execute('''INSERT INTO attempt_feedback (attempt_id, status, feedback) VALUES (?, ?, ?)
+                        ON CONFLICT(attempt_id) DO UPDATE SET
+                            status = excluded.status, feedback = excluded.feedback, updated_at = CURRENT_TIMESTAMP''',
+                     (attempt_id, status, feedback))
+        conn.commit()
+
+    def cache_get(self, key):
+        """(response, expires_at) of a persisted LLM response, or None"""
+        row = self._connect().execute('SELECT response, expires_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def cache_put(self, key, kind, response, created_at, expires_at):
+        conn = self._connect()
+        try:
+            conn.execute('''INSERT OR REPLACE INTO llm_cache (key, kind, response, created_at, expires_at)
+                            VALUES (?, ?, ?, ?, ?)''',
+                         (key, kind, response, created_at, expires_at))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def cache_delete(self, key):
+        conn = self._connect()
+        conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+        conn.commit()
+
+    def cache_evict(self, now, max_rows):
+        """Remove expired responses, then the oldest beyond max_rows; returns how many were removed"""
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,)).rowcount
+        removed += conn.execute('''DELETE FROM llm_cache WHERE key IN (
+                                       SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                                   )''', (max_rows,)).rowcount
+        conn.commit()
+        return removed
+
+    # Question generation
+    def create_generation_job(self, job_id, total, created_at):
+        conn = self._connect()
+        conn.execute('''INSERT INTO generation_jobs (job_id, status, total, created_at, updated_at)
+                        VALUES (?, 'running', ?, ?, ?)''', (job_id, total, created_at, created_at))
+        conn.commit()
+
+    def add_generated_drafts(self, job_id, drafts, failed, updated_at):
+        """Stage a generation job's drafts and count them, with its failures, in one transaction"""
+        conn = self._connect()
+        try:
+            conn.executemany('''INSERT INTO question_drafts
+                                (job_id, topic, level, level_order, question, options, correct_option, explanation)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                             [[job_id] + [draft[column] for column in QUESTION_COLUMNS] for draft in drafts])
+            conn.execute('''UPDATE generation_jobs SET generated = generated + ?, failed = failed + ?, updated_at = ?
+                            WHERE job_id = ?''', (len(drafts), failed, updated_at, job_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def finish_generation_job(self, job_id, status, updated_at, error=None):
+        conn = self._connect()
+        conn.execute('UPDATE generation_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                     (status, error, updated_at, job_id))
+        conn.commit()
+
+    def generation_job(self, job_id):
+        row = self._connect().execute('''SELECT job_id, status, total, generated, failed, error, created_at, updated_at
+                                         FROM generation_jobs WHERE job_id = ?''', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def question_drafts(self):
+        """Every draft awaiting review, oldest first, with `options` still JSON-encoded"""
+        return [dict(row) for row in self._connect().execute('SELECT * FROM question_drafts ORDER BY id')]
+
+    def question_draft(self, draft_id):
+        row = self._connect().execute('SELECT * FROM question_drafts WHERE id = ?', (draft_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def delete_question_draft(self, draft_id):
+        conn = self._connect()
+        conn.execute('DELETE FROM question_drafts WHERE id = ?', (draft_id,))
+        conn.commit()
+
+class PostgresStorage:
+    """Repository over a PostgreSQL server, shared by any number of app nodes.
+
+    Connections come from a thread-safe pool of `min_connections` to
+    `max_connections`; each repository call borrows one for a single
+    transaction. Bulk writes use multi-row VALUES lists. Call
+    create_schema() once to create the tables. Requires psycopg2.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, dsn, min_connections=1, max_connections=10, session_max_age=7 * 24 * 3600,
+                 leaderboard_size=20):
+        # Imported here so the SQLite deployment doesn't need the driver installed
+        import psycopg2
+        import psycopg2.extras
+        import psycopg2.pool
+        self._extras = psycopg2.extras
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections, dsn)
+        self.transient_errors = (psycopg2.OperationalError,)
+        self.sessions = PostgresQuizSessionStore(self.connection, max_age=session_max_age)
+        self._leaderboard_size = leaderboard_size
+        self._pruned_week = None
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for one transaction, committed unless it raises"""
+        conn = self._pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+
+    def close(self):
+        self._pool.closeall()
+
+    def create_schema(self):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS questions (
+                    id BIGSERIAL PRIMARY KEY,
+                    topic TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    level_order INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    correct_option TEXT NOT NULL,
+                    explanation TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                );
+                -- Admin question browser: keyset order, and free-text search kept current by the index itself.
+                -- Punctuation becomes spaces so words split as in SQLite's unicode61 tokenizer.
+                CREATE INDEX IF NOT EXISTS idx_questions_browse ON questions (topic, level_order, id);
+                CREATE INDEX IF NOT EXISTS idx_questions_words ON questions USING GIN (to_tsvector('simple',
+                    regexp_replace(question || ' ' || options || ' ' || explanation, '[^[:alnum:]]+', ' ', 'g')));
+                CREATE TABLE IF NOT EXISTS attempts (
+                    id BIGSERIAL PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    question_id BIGINT NOT NULL,
+                    selected_option TEXT,
+                    is_correct BOOLEAN NOT NULL,
+                    timestamp TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+                );
+                CREATE INDEX IF NOT EXISTS idx_attempts_username_timestamp
+                    ON attempts (username, timestamp, id) INCLUDE (question_id, selected_option, is_correct);
+                CREATE INDEX IF NOT EXISTS idx_attempts_question_id ON attempts (question_id);
+
+                CREATE TABLE IF NOT EXISTS topic_stats (
+                    topic TEXT PRIMARY KEY, correct BIGINT NOT NULL DEFAULT 0, total BIGINT NOT NULL DEFAULT 0);
+                CREATE TABLE IF NOT EXISTS level_stats (
+                    level TEXT PRIMARY KEY, level_order INTEGER NOT NULL,
+                    correct BIGINT NOT NULL DEFAULT 0, total BIGINT NOT NULL DEFAULT 0);
+                CREATE TABLE IF NOT EXISTS user_level_stats (
+                    username TEXT NOT NULL, level TEXT NOT NULL, level_order INTEGER NOT NULL,
+                    correct BIGINT NOT NULL DEFAULT 0, total BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (username, level));
+                CREATE TABLE IF NOT EXISTS user_topic_stats (
+                    username TEXT NOT NULL, topic TEXT NOT NULL,
+                    correct BIGINT NOT NULL DEFAULT 0, total BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (username, topic));
+
+                CREATE TABLE IF NOT EXISTS quiz_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    current_index INTEGER NOT NULL DEFAULT 0,
+                    score INTEGER NOT NULL DEFAULT 0,
+                    answers TEXT NOT NULL DEFAULT '',
+                    updated_at DOUBLE PRECISION NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_updated_at ON quiz_sessions (updated_at);
+
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at DOUBLE PRECISION NOT NULL,
+                    expires_at DOUBLE PRECISION NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at);
+
+                CREATE TABLE IF NOT EXISTS user_mastery (
+                    username TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    level_order INTEGER NOT NULL,
+                    mastery DOUBLE PRECISION NOT NULL,
+                    answered INTEGER NOT NULL,
+                    last_new_id BIGINT NOT NULL,
+                    PRIMARY KEY (username, level)
+                );
+                CREATE TABLE IF NOT EXISTS review_queue (
+                    username TEXT NOT NULL,
+                    question_id BIGINT NOT NULL,
+                    due_at DOUBLE PRECISION NOT NULL,
+                    interval_seconds DOUBLE PRECISION NOT NULL,
+                    ease DOUBLE PRECISION NOT NULL,
+                    repetitions INTEGER NOT NULL,
+                    PRIMARY KEY (username, question_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_review_queue_due ON review_queue (username, due_at, question_id);
+
+                CREATE TABLE IF NOT EXISTS leaderboard_scores (
+                    scope TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    correct BIGINT NOT NULL,
+                    total BIGINT NOT NULL,
+                    PRIMARY KEY (scope, period, username)
+                );
+                CREATE INDEX IF NOT EXISTS idx_leaderboard_scores_rank
+                    ON leaderboard_scores (scope, period, correct DESC, total, username);
+                CREATE TABLE IF NOT EXISTS leaderboard_score_counts (
+                    scope TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    correct BIGINT NOT NULL,
+                    users BIGINT NOT NULL,
+                    PRIMARY KEY (scope, period, correct)
+                );
+                CREATE TABLE IF NOT EXISTS leaderboard_top (
+                    scope TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    username TEXT NOT NULL,
+                    correct BIGINT NOT NULL,
+                    total BIGINT NOT NULL,
+                    PRIMARY KEY (scope, period, position)
+                );
+                CREATE TABLE IF NOT EXISTS attempt_feedback (
+                    attempt_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    feedback TEXT,
+                    updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                );
+                CREATE TABLE IF NOT EXISTS precomputed_feedback (
+                    question_id BIGINT NOT NULL,
+                    option_index INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    feedback TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+                    PRIMARY KEY (question_id, option_index)
+                );
+
+                -- Bulk generation jobs and the drafts they produce, which admins review before publishing
+                CREATE TABLE IF NOT EXISTS generation_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    generated INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at DOUBLE PRECISION NOT NULL,
+                    updated_at DOUBLE PRECISION NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS question_drafts (
+                    id BIGSERIAL PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    level_order INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    correct_option TEXT NOT NULL,
+                    explanation TEXT,
+                    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                );
+                CREATE INDEX IF NOT EXISTS idx_question_drafts_job_id ON question_drafts (job_id);
+
+                -- Bump the question bank version on every write so cached copies are invalidated
+                CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value BIGINT NOT NULL);
+                INSERT INTO app_meta (key, value) VALUES ('question_bank_version', 0) ON CONFLICT DO NOTHING;
+                CREATE OR REPLACE FUNCTION bump_question_bank_version() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE app_meta SET value = value + 1 WHERE key = 'question_bank_version';
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql;
+                DROP TRIGGER IF EXISTS questions_version ON questions;
+                CREATE TRIGGER questions_version AFTER INSERT OR UPDATE OR DELETE ON questions
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_question_bank_version();
+            ''')
+
+    def _fetch_dicts(self, sql, params=()):
+        with self.connection() as conn, conn.cursor(cursor_factory=self._extras.RealDictCursor) as cur:
+            cur.execute(sql, params)
+            return [dict(row) for row in cur.fetchall()]
+
+    # Questions
+    def question_bank_version(self):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT value FROM app_meta WHERE key = 'question_bank_version'")
+            return cur.fetchone()[0]
+
+    def question_count(self):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM questions')
+            return cur.fetchone()[0]
+
+    def list_questions(self):
+        """Every question as a dict with `options` still JSON-encoded, in quiz order"""
+        return self._fetch_dicts('SELECT * FROM questions ORDER BY level_order, id')
+
+    def add_question(self, question):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO questions
+                           (topic, level, level_order, question, options, correct_option, explanation)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id''',
+                        [question[column] for column in QUESTION_COLUMNS])
+            return cur.fetchone()[0]
+
+    def add_questions(self, questions):
+        with self.connection() as conn, conn.cursor() as cur:
+            self._extras.execute_values(cur, '''INSERT INTO questions
+                                                (topic, level, level_order, question, options, correct_option,
+                                                 explanation) VALUES %s''',
+                                        [[question[column] for column in QUESTION_COLUMNS]
+                                         for question in questions], page_size=1000)
+        return len(questions)
+
+    def questions_after(self, after_id=0, limit=500):
+        """Up to `limit` questions with ids above `after_id`, in id order, with `options` still JSON-encoded"""
+        return self._fetch_dicts('''SELECT id, topic, level, level_order, question, options, correct_option,
+                                           explanation, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at
+                                    FROM questions WHERE id > %s ORDER BY id LIMIT %s''', (after_id, limit))
+
+    def upsert_questions(self, questions):
+        """Write questions in one transaction: one with an `id` replaces that question, the others are added"""
+        # A bulk upsert may not touch a row twice, so the last row for an id wins, as it would row by row
+        with_id = list({question['id']: question for question in questions if question.get('id') is not None}.values())
+        with self.connection() as conn, conn.cursor() as cur:
+            if with_id:
+                self._extras.execute_values(cur, '''INSERT INTO questions
+                                                    (id, topic, level, level_order, question, options,
+                                                     correct_option, explanation) VALUES %s
+                                                    ON CONFLICT (id) DO UPDATE SET
+                                                        topic = excluded.topic, level = excluded.level,
+                                                        level_order = excluded.level_order,
+                                                        question = excluded.question, options = excluded.options,
+                                                        correct_option = excluded.correct_option,
+                                                        explanation = excluded.explanation''',
+                                            [[question['id']] + [question[column] for column in QUESTION_COLUMNS]
+                                             for question in with_id], page_size=1000)
+                # Move the id sequence past the ids written so later inserts don't collide with them
+                cur.execute('''SELECT setval(pg_get_serial_sequence('questions', 'id'),
+                                             GREATEST(nextval(pg_get_serial_sequence('questions', 'id')), %s))''',
+                            (max(question['id'] for question in with_id),))
+            self._extras.execute_values(cur, '''INSERT INTO questions
+                                                (topic, level, level_order, question, options, correct_option,
+                                                 explanation) VALUES %s''',
+                                        [[question[column] for column in QUESTION_COLUMNS]
+                                         for question in questions if question.get('id') is None], page_size=1000)
+        return len(questions)
+
+    def search_questions(self, text=None, topic=None, level=None, after=None, limit=20):
+        """Questions matching every filter, ordered by (topic, level_order, id), after the position `after`"""
+        where, params = [], []
+        terms = _search_terms(text)
+        if terms:
+            # Must match the expression of idx_questions_words for the index to be used
+            where.append("to_tsvector('simple', regexp_replace(question || ' ' || options || ' ' || explanation, "
+                         "'[^[:alnum:]]+', ' ', 'g')) @@ to_tsquery('simple', %s)")
+            params.append(' & '.join(f'{term}:*' for term in terms))
+        if topic:
+            where.append('topic = %s')
+            params.append(topic)
+        if level:
+            where.append('level = %s')
+            params.append(level)
+        if after:
+            where.append('(topic, level_order, id) > (%s, %s, %s)')
+            params.extend(after)
+        return self._fetch_dicts(f'''SELECT * FROM questions {'WHERE ' + ' AND '.join(where) if where else ''}
+                                     ORDER BY topic, level_order, id LIMIT %s''', params + [limit])
+
+    # Attempts
+    def add_attempts(self, attempts):
+        """Insert attempts, their rollups and leaderboard scores in one transaction; returns the last attempt id"""
+        _expire_weekly_leaderboards(self)
+        topics, levels, user_levels, user_topics = _rollup_rows(attempts)
+        with self.connection() as conn, conn.cursor() as cur:
+            ids = self._extras.execute_values(
+                cur, '''INSERT INTO attempts (username, question_id, selected_option, is_correct, timestamp)
+                        VALUES %s RETURNING id''',
+                [(a['username'], a['question']['id'], a['selected_option'], bool(a['is_correct']),
+                  a.get('timestamp')) for a in attempts],
+                template="(%s, %s, %s, %s, COALESCE(%s::timestamp, now() AT TIME ZONE 'utc'))",
+                page_size=1000, fetch=True)
+            self._extras.execute_values(cur, '''INSERT INTO topic_stats (topic, correct, total) VALUES %s
+                                                ON CONFLICT (topic) DO UPDATE SET
+                                                    correct = topic_stats.correct + excluded.correct,
+                                                    total = topic_stats.total + excluded.total''', topics)
+            self._extras.execute_values(cur, '''INSERT INTO level_stats (level, level_order, correct, total) VALUES %s
+                                                ON CONFLICT (level) DO UPDATE SET
+                                                    correct = level_stats.correct + excluded.correct,
+                                                    total = level_stats.total + excluded.total''', levels)
+            self._extras.execute_values(cur, '''INSERT INTO user_level_stats (username, level, level_order, correct, total)
+                                                VALUES %s
+                                                ON CONFLICT (username, level) DO UPDATE SET
+                                                    correct = user_level_stats.correct + excluded.correct,
+                                                    total = user_level_stats.total + excluded.total''', user_levels)
+            self._extras.execute_values(cur, '''INSERT INTO user_topic_stats (username, topic, correct, total)
+                                                VALUES %s
+                                                ON CONFLICT (username, topic) DO UPDATE SET
+                                                    correct = user_topic_stats.correct + excluded.correct,
+                                                    total = user_topic_stats.total + excluded.total''', user_topics)
+            self._update_leaderboards(cur, aggregate_results(attempts))
+        return max(row[0] for row in ids)
+
+    def rebuild_rollups(self, chunk_size=100000):
+        """Recompute the progress rollups from the whole attempt history; returns the attempts counted"""
+        (topics, levels, user_levels, user_topics), counted = _scan_rollups(self, chunk_size)
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('TRUNCATE topic_stats, level_stats, user_level_stats, user_topic_stats')
+            self._extras.execute_values(cur, 'INSERT INTO topic_stats (topic, correct, total) VALUES %s', topics)
+            self._extras.execute_values(cur, 'INSERT INTO level_stats (level, level_order, correct, total) VALUES %s',
+                                        levels)
+            self._extras.execute_values(cur, '''INSERT INTO user_level_stats (username, level, level_order, correct, total)
+                                                VALUES %s''', user_levels, page_size=1000)
+            self._extras.execute_values(cur, '''INSERT INTO user_topic_stats (username, topic, correct, total)
+                                                VALUES %s''', user_topics, page_size=1000)
+        return counted
+
+    def progress_stats(self, username=None):
+        """(topic rows, level rows) of correct/total counts, for one user or everyone"""
+        if username is None:
+            return (self._fetch_dicts('SELECT topic, correct, total FROM topic_stats ORDER BY topic'),
+                    self._fetch_dicts('SELECT level, correct, total FROM level_stats ORDER BY level_order'))
+        return (self._fetch_dicts('''SELECT topic, correct, total FROM user_topic_stats
+                                     WHERE username = %s ORDER BY topic''', (username,)),
+                self._fetch_dicts('''SELECT level, correct, total FROM user_level_stats
+                                     WHERE username = %s ORDER BY level_order''', (username,)))
+
+    def user_attempts(self, username, before=None, limit=20):
+        """A user's attempts newest first, after the (timestamp, id) position `before`"""
+        # Microseconds included, so a cursor taken from a row never skips the rows in the same second
+        select = '''SELECT id, question_id, selected_option, is_correct,
+                           to_char(timestamp, 'YYYY-MM-DD HH24:MI:SS.US') AS timestamp
+                    FROM attempts WHERE username = %s'''
+        if before:
+            return self._fetch_dicts(select + ''' AND (timestamp, id) < (%s::timestamp, %s)
+                                                ORDER BY attempts.timestamp DESC, id DESC LIMIT %s''',
+                                     (username, before[0], before[1], limit))
+        return self._fetch_dicts(select + ' ORDER BY attempts.timestamp DESC, id DESC LIMIT %s', (username, limit))
+
+    def scan_attempts(self, columns=ATTEMPT_COLUMNS, chunk_size=100000):
+        """Stream every attempt in id order as chunks of column sequences, through a server-side cursor.
+
+        PostgreSQL keeps the whole history in the attempts table (see
+        archive_attempts), so there is no archive to include.
+        """
+        select = ', '.join("to_char(timestamp, 'YYYY-MM-DD HH24:MI:SS')" if column == 'timestamp'
+                           else f'{column}::int' if column == 'is_correct' else column for column in columns)
+        with self.connection() as conn, conn.cursor(name='scan_attempts') as cur:
+            cur.itersize = chunk_size
+            cur.execute(f'SELECT {select} FROM attempts ORDER BY id')
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield tuple(zip(*rows))
+
+    def archive_attempts(self, before, batch_size=100000, vacuum=False):
+        raise NotImplementedError('PostgreSQL keeps every attempt in the attempts table; '
+                                  'archive-attempts only supports the SQLite backend')
+
+    # Adaptive scheduling
+    def level_mastery(self, username):
+        """{level: mastery row} of a user's SOLO levels"""
+        rows = self._fetch_dicts('''SELECT level, level_order, mastery, answered, last_new_id
+                                    FROM user_mastery WHERE username = %s''', (username,))
+        return {row['level']: row for row in rows}
+
+    def due_reviews(self, username, until=None, limit=1):
+        """(question_id, due_at) of the user's queued reviews, soonest first; a range scan of idx_review_queue_due"""
+        with self.connection() as conn, conn.cursor() as cur:
+            if until is None:
+                cur.execute('''SELECT question_id, due_at FROM review_queue WHERE username = %s
+                               ORDER BY due_at LIMIT %s''', (username, limit))
+            else:
+                cur.execute('''SELECT question_id, due_at FROM review_queue
+                               WHERE username = %s AND due_at <= %s
+                               ORDER BY due_at LIMIT %s''', (username, until, limit))
+            return [tuple(row) for row in cur.fetchall()]
+
+    def review_state(self, username, question_id):
+        rows = self._fetch_dicts('''SELECT interval_seconds AS interval, ease, repetitions, due_at
+                                    FROM review_queue WHERE username = %s AND question_id = %s''',
+                                 (username, question_id))
+        return rows[0] if rows else None
+
+    def save_schedule(self, username, mastery, question_id, review):
+        """Store a user's mastery of one level and the review of one question (None removes it)"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO user_mastery (username, level, level_order, mastery, answered, last_new_id)
+                           VALUES (%s, %s, %s, %s, %s, %s)
+                           ON CONFLICT (username, level) DO UPDATE SET
+                               level_order = excluded.level_order, mastery = excluded.mastery,
+                               answered = excluded.answered, last_new_id = excluded.last_new_id''',
+                        (username, mastery['level'], mastery['level_order'], mastery['mastery'],
+                         mastery['answered'], mastery['last_new_id']))
+            if review is None:
+                cur.execute('DELETE FROM review_queue WHERE username = %s AND question_id = %s',
+                            (username, question_id))
+            else:
+                cur.execute('''INSERT INTO review_queue
+                               (username, question_id, due_at, interval_seconds, ease, repetitions)
+                               VALUES (%s, %s, %s, %s, %s, %s)
+                               ON CONFLICT (username, question_id) DO UPDATE SET
+                                   due_at = excluded.due_at, interval_seconds = excluded.interval_seconds,
+                                   ease = excluded.ease, repetitions = excluded.repetitions''',
+                            (username, question_id, review['due_at'], review['interval'], review['ease'],
+                             review['repetitions']))
+
+    # Leaderboards
+    def _update_leaderboards(self, cur, results):
+        """Add {(scope, period, username): [correct, total]} to the scores, their histogram and the top lists.
+
+        Statements are sent a few at a time, with rows as arrays, so a batch
+        costs three round trips whatever its size.
+        """
+        if not results:
+            return
+        # Rows are upserted, and so locked, in sorted key order so concurrent batches cannot deadlock
+        keys = sorted(results)
+        cur.execute('''INSERT INTO leaderboard_scores AS s (scope, period, username, correct, total)
+                       SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::bigint[], %s::bigint[])
+                       ON CONFLICT (scope, period, username) DO UPDATE SET
+                           correct = s.correct + excluded.correct, total = s.total + excluded.total
+                       RETURNING scope, period, username, correct, total''',
+                    _columns([key + tuple(results[key]) for key in keys], 5))
+        moves, best = [], {}
+        for scope, period, username, new_correct, new_total in cur.fetchall():
+            correct, total = results[(scope, period, username)]
+            # Stored totals are never zero, so the row is new exactly when its total is this batch's
+            moves.append((scope, period, None if new_total == total else new_correct - correct, new_correct))
+            best[(scope, period)] = max(best.get((scope, period), 0), new_correct)
+
+        # Apply the histogram changes and read the cutoff of every top list touched
+        deltas = _score_count_deltas(moves)
+        boards = sorted(best)
+        cur.execute('''INSERT INTO leaderboard_score_counts AS c (scope, period, correct, users)
+                       SELECT * FROM unnest(%s::text[], %s::text[], %s::bigint[], %s::bigint[])
+                       ON CONFLICT (scope, period, correct) DO UPDATE SET users = c.users + excluded.users;
+                       DELETE FROM leaderboard_score_counts c
+                       USING unnest(%s::text[], %s::text[], %s::bigint[]) AS e (scope, period, correct)
+                       WHERE c.scope = e.scope AND c.period = e.period AND c.correct = e.correct AND c.users = 0;
+                       SELECT scope, period, COUNT(*), MIN(correct) FROM leaderboard_top
+                       WHERE (scope, period) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+                       GROUP BY scope, period''',
+                    _columns(deltas, 4) + _columns([bucket[:3] for bucket in deltas if bucket[3] < 0], 3)
+                    + _columns(boards, 2))
+        cutoffs = {(scope, period): (size, cutoff) for scope, period, size, cutoff in cur.fetchall()}
+
+        # Only rematerialize a top list the changed scores can enter (or reorder). Cutoffs only ever
+        # rise, so reading them before taking the lock can cause an extra refresh but never miss one.
+        statements, params = [], []
+        for scope, period in boards:
+            size, cutoff = cutoffs.get((scope, period), (0, None))
+            if size < self._leaderboard_size or best[(scope, period)] >= cutoff:
+                statements.append('''SELECT pg_advisory_xact_lock(hashtext(%s));
+                                     DELETE FROM leaderboard_top WHERE scope = %s AND period = %s;
+                                     INSERT INTO leaderboard_top (scope, period, position, username, correct, total)
+                                     SELECT scope, period,
+                                            ROW_NUMBER() OVER (ORDER BY correct DESC, total, username),
+                                            username, correct, total
+                                     FROM leaderboard_scores WHERE scope = %s AND period = %s
+                                     ORDER BY correct DESC, total, username LIMIT %s''')
+                params += [f'leaderboard_top|{scope}|{period}', scope, period, scope, period, self._leaderboard_size]
+        if statements:
+            cur.execute(';\n'.join(statements), params)
+
+    def leaderboard(self, scope, period):
+        """The materialized top list of a leaderboard, best first"""
+        return self._fetch_dicts('''SELECT position, username, correct, total FROM leaderboard_top
+                                    WHERE scope = %s AND period = %s ORDER BY position''', (scope, period))
+
+    def leaderboard_rank(self, scope, period, username):
+        """A user's standing on a leaderboard (users with the same score share a rank), or None"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''SELECT correct, total FROM leaderboard_scores
+                           WHERE scope = %s AND period = %s AND username = %s''', (scope, period, username))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute('''SELECT COALESCE(SUM(users) FILTER (WHERE correct > %s), 0), COALESCE(SUM(users), 0)
+                           FROM leaderboard_score_counts WHERE scope = %s AND period = %s''',
+                        (row[0], scope, period))
+            ahead, users = cur.fetchone()
+        return {'rank': int(ahead) + 1, 'users': int(users), 'correct': row[0], 'total': row[1]}
+
+    def replace_leaderboards(self, results):
+        """Replace every leaderboard with {(scope, period, username): [correct, total]} in one transaction"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('TRUNCATE leaderboard_scores, leaderboard_score_counts, leaderboard_top')
+            self._extras.execute_values(cur, '''INSERT INTO leaderboard_scores (scope, period, username, correct, total)
+                                                VALUES %s''',
+                                        [key + tuple(counts) for key, counts in results.items()], page_size=1000)
+            cur.execute('''INSERT INTO leaderboard_score_counts (scope, period, correct, users)
+                           SELECT scope, period, correct, COUNT(*) FROM leaderboard_scores
+                           GROUP BY scope, period, correct''')
+            cur.execute('''INSERT INTO leaderboard_top (scope, period, position, username, correct, total)
+                           SELECT scope, period, position, username, correct, total FROM (
+                               SELECT scope, period, username, correct, total,
+                                      ROW_NUMBER() OVER (PARTITION BY scope, period
+                                                         ORDER BY correct DESC, total, username) AS position
+                               FROM leaderboard_scores
+                           ) ranked WHERE position <= %s''', (self._leaderboard_size,))
+
+    def prune_leaderboards(self, current_week):
+        """Delete the weekly leaderboards of weeks before `current_week`; returns the number of scores removed"""
+        expired = (ALL_TIME, current_week)
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM leaderboard_scores WHERE period <> %s AND period < %s', expired)
+            removed = cur.rowcount
+            cur.execute('DELETE FROM leaderboard_score_counts WHERE period <> %s AND period < %s', expired)
+            cur.execute('DELETE FROM leaderboard_top WHERE period <> %s AND period < %s', expired)
+        return removed
+
+    # Caches
+    def precomputed_feedback(self, question_id, option_index, content_hash):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''SELECT feedback FROM precomputed_feedback
+                           WHERE question_id = %s AND option_index = %s AND content_hash = %s''',
+                        (question_id, option_index, content_hash))
+            row = cur.fetchone()
+        return row[0] if row is not None else None
+
+    def precomputed_feedback_hashes(self):
+        """{(question_id, option_index): content_hash} of every precomputed feedback"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT question_id, option_index, content_hash FROM precomputed_feedback')
+            return {(row[0], row[1]): row[2] for row in cur.fetchall()}
+
+    def delete_precomputed_feedback(self, question_ids):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM precomputed_feedback WHERE question_id = ANY(%s)', (list(question_ids),))
+
+    def save_precomputed_feedback(self, question_id, feedback):
+        """Replace a question's precomputed feedback with (option_index, content_hash, feedback) rows"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM precomputed_feedback WHERE question_id = %s', (question_id,))
+            self._extras.execute_values(cur, '''INSERT INTO precomputed_feedback
+                                                (question_id, option_index, content_hash, feedback) VALUES %s''',
+                                        [(question_id,) + tuple(row) for row in feedback])
+
+    def attempt_feedback(self, attempt_id):
+        """(status, feedback) of an attempt's background feedback, or None while it is being generated"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT status, feedback FROM attempt_feedback WHERE attempt_id = %s', (attempt_id,))
+            row = cur.fetchone()
+            return (row[0], row[1]) if row is not None else None
+
+    def save_attempt_feedback(self, attempt_id, feedback, status='ready'):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO attempt_feedback (attempt_id, status, feedback) VALUES (%s, %s, %s)
+                           ON CONFLICT (attempt_id) DO UPDATE SET
+                               status = excluded.status, feedback = excluded.feedback,
+                               updated_at = now() AT TIME ZONE 'utc' ''', (attempt_id, status, feedback))
+
+    def cache_get(self, key):
+        """(response, expires_at) of a persisted LLM response, or None"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT response, expires_at FROM llm_cache WHERE key = %s', (key,))
+            row = cur.fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def cache_put(self, key, kind, response, created_at, expires_at):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO llm_cache (key, kind, response, created_at, expires_at)
+                           VALUES (%s, %s, %s, %s, %s)
+                           ON CONFLICT (key) DO UPDATE SET kind = excluded.kind, response = excluded.response,
+                               created_at = excluded.created_at, expires_at = excluded.expires_at''',
+                        (key, kind, response, created_at, expires_at))
+
+    def cache_delete(self, key):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM llm_cache WHERE key = %s', (key,))
+
+    def cache_evict(self, now, max_rows):
+        """Remove expired responses, then the oldest beyond max_rows; returns how many were removed"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM llm_cache WHERE expires_at <= %s', (now,))
+            removed = cur.rowcount
+            cur.execute('''DELETE FROM llm_cache WHERE key IN (
+                               SELECT key FROM llm_cache ORDER BY created_at DESC OFFSET %s
+                           )''', (max_rows,))
+            return removed + cur.rowcount
+
+    # Question generation
+    def create_generation_job(self, job_id, total, created_at):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO generation_jobs (job_id, status, total, created_at, updated_at)
+                           VALUES (%s, 'running', %s, %s, %s)''', (job_id, total, created_at, created_at))
+
+    def add_generated_drafts(self, job_id, drafts, failed, updated_at):
+        """Stage a generation job's drafts and count them, with its failures, in one transaction"""
+        with self.connection() as conn, conn.cursor() as cur:
+            self._extras.execute_values(cur, '''INSERT INTO question_drafts
+                                                (job_id, topic, level, level_order, question, options,
+                                                 correct_option, explanation) VALUES %s''',
+                                        [[job_id] + [draft[column] for column in QUESTION_COLUMNS]
+                                         for draft in drafts])
+            cur.execute('''UPDATE generation_jobs SET generated = generated + %s, failed = failed + %s,
+                               updated_at = %s
+                           WHERE job_id = %s''', (len(drafts), failed, updated_at, job_id))
+
+    def finish_generation_job(self, job_id, status, updated_at, error=None):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('UPDATE generation_jobs SET status = %s, error = %s, updated_at = %s WHERE job_id = %s',
+                        (status, error, updated_at, job_id))
+
+    def generation_job(self, job_id):
+        rows = self._fetch_dicts('''SELECT job_id, status, total, generated, failed, error, created_at, updated_at
+                                    FROM generation_jobs WHERE job_id = %s''', (job_id,))
+        return rows[0] if rows else None
+
+    def question_drafts(self):
+        """Every draft awaiting review, oldest first, with `options` still JSON-encoded"""
+        return self._fetch_dicts(DRAFT_SELECT + ' ORDER BY id')
+
+    def question_draft(self, draft_id):
+        rows = self._fetch_dicts(DRAFT_SELECT + ' WHERE id = %s', (draft_id,))
+        return rows[0] if rows else None
+
+    def delete_question_draft(self, draft_id):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute('DELETE FROM question_drafts WHERE id = %s', (draft_id,))
+
+class MemoryStorage:
+    """Process-local repository for development, tests and benchmarks (single worker only).
+
+    Implements the same interface as the database repositories on plain
+    Python structures, so code written against it behaves the same on
+    SQLite or PostgreSQL.
+    """
+
+    name = 'memory'
+    transient_errors = ()
+
+    def __init__(self, session_max_age=7 * 24 * 3600, leaderboard_size=20):
+        self.sessions = MemoryQuizSessionStore(max_age=session_max_age)
+        self._leaderboard_size = leaderboard_size
+        self._pruned_week = None
+        self._lock = threading.Lock()
+        self._questions = {}
+        self._version = 0
+        self._attempts = []
+        self._by_user = {}
+        self._rollups = ({}, {}, {}, {})  # topic, level, user level, user topic -> [correct, total]
+        self._feedback = {}
+        self._attempt_feedback = {}
+        self._cache = {}
+        self._mastery = {}
+        self._reviews = {}
+        self._scores = {}        # (scope, period) -> {username: [correct, total]}
+        self._score_counts = {}  # (scope, period) -> Counter of users per correct count
+        self._top = {}           # (scope, period) -> top rows
+        self._jobs = {}
+        self._drafts = {}
+
+    # Questions
+    def question_bank_version(self):
+        return self._version
+
+    def question_count(self):
+        return len(self._questions)
+
+    def list_questions(self):
+        with self._lock:
+            questions = [dict(question) for question in self._questions.values()]
+        return sorted(questions, key=lambda question: (question['level_order'], question['id']))
+
+    def add_question(self, question):
+        return self._insert_questions([question])
+
+    def add_questions(self, questions):
+        self._insert_questions(questions)
+        return len(questions)
+
+    def questions_after(self, after_id=0, limit=500):
+        with self._lock:
+            ids = sorted(question_id for question_id in self._questions if question_id > after_id)[:limit]
+            return [dict(self._questions[question_id]) for question_id in ids]
+
+    def upsert_questions(self, questions):
+        with self._lock:
+            created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            for question in questions:
+                if question.get('id') is not None:
+                    existing = self._questions.get(question['id'])
+                    self._questions[question['id']] = dict(
+                        {column: question[column] for column in QUESTION_COLUMNS}, id=question['id'],
+                        created_at=existing['created_at'] if existing else created_at)
+            self._version += 1
+        self._insert_questions([question for question in questions if question.get('id') is None])
+        return len(questions)
+
+    def search_questions(self, text=None, topic=None, level=None, after=None, limit=20):
+        terms = _search_terms(text)
+        matches = []
+        for question in self.list_questions():
+            if (topic and question['topic'] != topic) or (level and question['level'] != level):
+                continue
+            if after and (question['topic'], question['level_order'], question['id']) <= tuple(after):
+                continue
+            if terms:
+                words = _search_terms(' '.join((question['question'], question['options'], question['explanation'])))
+                if not all(any(word.startswith(term) for word in words) for term in terms):
+                    continue
+            matches.append(question)
+        matches.sort(key=lambda question: (question['topic'], question['level_order'], question['id']))
+        return matches[:limit]
+
+    def _insert_questions(self, questions):
+        with self._lock:
+            question_id = max(self._questions, default=0)
+            created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            for question in questions:
+                question_id += 1
+                self._questions[question_id] = dict({column: question[column] for column in QUESTION_COLUMNS},
+                                                    id=question_id, created_at=created_at)
+            self._version += 1
+        return question_id
+
+    # Attempts
+    def add_attempts(self, attempts):
+        _expire_weekly_leaderboards(self)
+        now = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        rollups = _rollup_rows(attempts)
+        with self._lock:
+            for a in attempts:
+                row = {'id': len(self._attempts) + 1, 'username': a['username'], 'question_id': a['question']['id'],
+                       'selected_option': a['selected_option'], 'is_correct': int(bool(a['is_correct'])),
+                       'timestamp': a.get('timestamp') or now}
+                self._attempts.append(row)
+                self._by_user.setdefault(row['username'], []).append(row)
+            for rollup, rows in zip(self._rollups, rollups):
+                for *key, correct, total in rows:
+                    counts = rollup.setdefault(tuple(key), [0, 0])
+                    counts[0] += correct
+                    counts[1] += total
+            self._update_leaderboards(aggregate_results(attempts))
+            return len(self._attempts)
+
+    def rebuild_rollups(self, chunk_size=100000):
+        rows, counted = _scan_rollups(self, chunk_size)
+        with self._lock:
+            self._rollups = tuple({tuple(key): [correct, total] for *key, correct, total in rollup} for rollup in rows)
+        return counted
+
+    def progress_stats(self, username=None):
+        topics, levels, user_levels, user_topics = self._rollups
+        with self._lock:
+            if username is None:
+                topic_rows = [((topic,), counts) for (topic,), counts in topics.items()]
+                level_rows = [((level, order), counts) for (level, order), counts in levels.items()]
+            else:
+                topic_rows = [((topic,), counts) for (user, topic), counts in user_topics.items() if user == username]
+                level_rows = [((level, order), counts) for (user, level, order), counts in user_levels.items()
+                              if user == username]
+            topic_rows.sort(key=lambda row: row[0])
+            level_rows.sort(key=lambda row: row[0][1])
+            return ([{'topic': key[0], 'correct': counts[0], 'total': counts[1]} for key, counts in topic_rows],
+                    [{'level': key[0], 'correct': counts[0], 'total': counts[1]} for key, counts in level_rows])
+
+    def user_attempts(self, username, before=None, limit=20):
+        with self._lock:
+            rows = sorted(self._by_user.get(username, []), key=lambda row: (row['timestamp'], row['id']),
+                          reverse=True)
+        if before:
+            rows = [row for row in rows if (row['timestamp'], row['id']) < tuple(before)]
+        return [{key: row[key] for key in ('id', 'question_id', 'selected_option', 'is_correct', 'timestamp')}
+                for row in rows[:limit]]
+
+    def scan_attempts(self, columns=ATTEMPT_COLUMNS, chunk_size=100000):
+        with self._lock:
+            attempts = list(self._attempts)
+        for start in range(0, len(attempts), chunk_size):
+            chunk = attempts[start:start + chunk_size]
+            yield tuple([row[column] for row in chunk] for column in columns)
+
+    def archive_attempts(self, before, batch_size=100000, vacuum=False):
+        raise NotImplementedError('the memory backend has no attempt archive; '
+                                  'archive-attempts only supports the SQLite backend')
+
+    # Adaptive scheduling
+    def level_mastery(self, username):
+        with self._lock:
+            return {level: dict(state) for level, state in self._mastery.get(username, {}).items()}
+
+    def due_reviews(self, username, until=None, limit=1):
+        with self._lock:
+            reviews = sorted((review['due_at'], question_id)
+                             for question_id, review in self._reviews.get(username, {}).items()
+                             if until is None or review['due_at'] <= until)
+        return [(question_id, due_at) for due_at, question_id in reviews[:limit]]
+
+    def review_state(self, username, question_id):
+        with self._lock:
+            review = self._reviews.get(username, {}).get(question_id)
+            return dict(review) if review is not None else None
+
+    def save_schedule(self, username, mastery, question_id, review):
+        with self._lock:
+            self._mastery.setdefault(username, {})[mastery['level']] = dict(mastery)
+            if review is None:
+                self._reviews.get(username, {}).pop(question_id, None)
+            else:
+                self._reviews.setdefault(username, {})[question_id] = dict(review)
+
+    # Leaderboards
+    def _update_leaderboards(self, results):
+        best = {}
+        for (scope, period, username), (correct, total) in results.items():
+            board = (scope, period)
+            scores = self._scores.setdefault(board, {})
+            histogram = self._score_counts.setdefault(board, Counter())
+            counts = scores.get(username)
+            if counts is None:
+                counts = scores[username] = [0, 0]
+            else:
+                histogram[counts[0]] -= 1
+                if not histogram[counts[0]]:
+                    del histogram[counts[0]]
+            counts[0] += correct
+            counts[1] += total
+            histogram[counts[0]] += 1
+            best[board] = max(best.get(board, 0), counts[0])
+
+        # Only rematerialize a top list the changed scores can enter (or reorder)
+        for board, correct in best.items():
+            top = self._top.get(board, [])
+            if len(top) == self._leaderboard_size and correct < top[-1]['correct']:
+                continue
+            rows = ({'username': username, 'correct': counts[0], 'total': counts[1]}
+                    for username, counts in self._scores[board].items())
+            self._top[board] = [dict(row, position=position) for position, row in
+                                enumerate(heapq.nsmallest(self._leaderboard_size, rows, key=rank_order), 1)]
+
+    def leaderboard(self, scope, period):
+        with self._lock:
+            return [dict(row) for row in self._top.get((scope, period), [])]
+
+    def leaderboard_rank(self, scope, period, username):
+        with self._lock:
+            counts = self._scores.get((scope, period), {}).get(username)
+            if counts is None:
+                return None
+            histogram = self._score_counts[(scope, period)]
+            ahead = sum(users for correct, users in histogram.items() if correct > counts[0])
+            return {'rank': ahead + 1, 'users': sum(histogram.values()), 'correct': counts[0], 'total': counts[1]}
+
+    def replace_leaderboards(self, results):
+        with self._lock:
+            self._scores, self._score_counts, self._top = {}, {}, {}
+            self._update_leaderboards(results)
+
+    def prune_leaderboards(self, current_week):
+        with self._lock:
+            expired = [board for board in self._scores if board[1] != ALL_TIME and board[1] < current_week]
+            removed = 0
+            for board in expired:
+                removed += len(self._scores.pop(board))
+                self._score_counts.pop(board, None)
+                self._top.pop(board, None)
+        return removed
+
+    # Caches
+    def precomputed_feedback(self, question_id, option_index, content_hash):
+        entry = self._feedback.get((question_id, option_index))
+        return entry[1] if entry is not None and entry[0] == content_hash else None
+
+    def precomputed_feedback_hashes(self):
+        with self._lock:
+            return {key: entry[0] for key, entry in self._feedback.items()}
+
+    def delete_precomputed_feedback(self, question_ids):
+        question_ids = set(question_ids)
+        with self._lock:
+            for key in [key for key in self._feedback if key[0] in question_ids]:
+                del self._feedback[key]
+
+    def save_precomputed_feedback(self, question_id, feedback):
+        with self._lock:
+            for key in [key for key in self._feedback if key[0] == question_id]:
+                del self._feedback[key]
+            for option_index, content_hash, text in feedback:
+                self._feedback[(question_id, option_index)] = (content_hash, text)
+
+    def attempt_feedback(self, attempt_id):
+        return self._attempt_feedback.get(attempt_id)
+
+    def save_attempt_feedback(self, attempt_id, feedback, status='ready'):
+        with self._lock:
+            self._attempt_feedback[attempt_id] = (status, feedback)
+
+    def cache_get(self, key):
+        return self._cache.get(key)
+
+    def cache_put(self, key, kind, response, created_at, expires_at):
+        with self._lock:
+            self._cache[key] = (response, expires_at, created_at)
+
+    def cache_delete(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def cache_evict(self, now, max_rows):
+        with self._lock:
+            expired = [key for key, entry in self._cache.items() if entry[1] <= now]
+            for key in expired:
+                del self._cache[key]
+            overflow = sorted(self._cache, key=lambda key: self._cache[key][2], reverse=True)[max_rows:]
+            for key in overflow:
+                del self._cache[key]
+        return len(expired) + len(overflow)
+
+    # Question generation
+    def create_generation_job(self, job_id, total, created_at):
+        with self._lock:
+            self._jobs[job_id] = {'job_id': job_id, 'status': 'running', 'total': total, 'generated': 0, 'failed': 0,
+                                  'error': None, 'created_at': created_at, 'updated_at': created_at}
+
+    def add_generated_drafts(self, job_id, drafts, failed, updated_at):
+        created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        with self._lock:
+            draft_id = max(self._drafts, default=0)
+            for draft in drafts:
+                draft_id += 1
+                self._drafts[draft_id] = dict({column: draft[column] for column in QUESTION_COLUMNS},
+                                              id=draft_id, job_id=job_id, created_at=created_at)
+            job = self._jobs[job_id]
+            job.update(generated=job['generated'] + len(drafts), failed=job['failed'] + failed, updated_at=updated_at)
+
+    def finish_generation_job(self, job_id, status, updated_at, error=None):
+        with self._lock:
+            self._jobs[job_id].update(status=status, error=error, updated_at=updated_at)
+
+    def generation_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def question_drafts(self):
+        with self._lock:
+            return [dict(self._drafts[draft_id]) for draft_id in sorted(self._drafts)]
+
+    def question_draft(self, draft_id):
+        with self._lock:
+            draft = self._drafts.get(draft_id)
+            return dict(draft) if draft is not None else None
+
+    def delete_question_draft(self, draft_id):
+        with self._lock:
+            self._drafts.pop(draft_id, None)
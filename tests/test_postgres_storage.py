@@ -0,0 +1,96 @@
+"""PostgresStorage against a real server.
+
+Skipped unless SOLOQUIZ_TEST_DATABASE_URL names a database the tests may
+write to, e.g.
+
+    SOLOQUIZ_TEST_DATABASE_URL=postgresql://postgres@localhost/soloquiz_test python -m pytest tests
+"""
+import os
+import uuid
+
+import pytest
+
+from storage import PostgresStorage
+
+DSN = os.getenv('SOLOQUIZ_TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not DSN, reason='SOLOQUIZ_TEST_DATABASE_URL is not set')
+
+QUESTION = {'id': 1, 'topic': 'Databases', 'level': 'Uni-structural', 'level_order': 2}
+
+
+@pytest.fixture
+def store():
+    store = PostgresStorage(DSN)
+    store.create_schema()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def username():
+    # A fresh user per test, so tests (and earlier runs) don't see each other's attempts
+    return f'test-{uuid.uuid4().hex}'
+
+
+def attempt(username, timestamp=None):
+    return {'username': username, 'question': QUESTION, 'selected_option': 'A', 'is_correct': True,
+            'timestamp': timestamp}
+
+
+def all_pages(store, username, limit):
+    rows, before = [], None
+    while True:
+        page = store.user_attempts(username, before=before, limit=limit)
+        rows += page
+        if len(page) < limit:
+            return rows
+        before = (page[-1]['timestamp'], page[-1]['id'])
+
+
+def test_user_attempts_pages_through_rows_in_the_same_second(store, username):
+    timestamps = ['2024-03-04 10:00:00.250000', '2024-03-04 10:00:00.500000', '2024-03-04 10:00:00.750000',
+                  '2024-03-04 10:00:01', '2024-03-04 09:59:59.999999']
+    store.add_attempts([attempt(username, timestamp) for timestamp in timestamps])
+
+    rows = all_pages(store, username, limit=2)
+
+    assert [row['timestamp'] for row in rows] == ['2024-03-04 10:00:01.000000', '2024-03-04 10:00:00.750000',
+                                                  '2024-03-04 10:00:00.500000', '2024-03-04 10:00:00.250000',
+                                                  '2024-03-04 09:59:59.999999']
+
+
+def test_user_attempts_pages_through_default_timestamps(store, username):
+    # Stamped by the server's now(), so they share a second and differ in microseconds
+    for _ in range(7):
+        store.add_attempts([attempt(username)])
+    newest_first = sorted((row['id'] for row in store.user_attempts(username, limit=100)), reverse=True)
+
+    for limit in (1, 2, 3):
+        assert [row['id'] for row in all_pages(store, username, limit)] == newest_first
+
+
+def test_user_attempts_breaks_timestamp_ties_by_id(store, username):
+    store.add_attempts([attempt(username, '2024-03-04 10:00:00.123456') for _ in range(5)])
+
+    rows = all_pages(store, username, limit=2)
+
+    assert len(rows) == 5
+    assert [row['id'] for row in rows] == sorted((row['id'] for row in rows), reverse=True)
+
+
+def question(text, **fields):
+    return dict({'topic': 'Databases', 'level': 'Uni-structural', 'level_order': 2, 'question': text,
+                 'options': '["A", "B"]', 'correct_option': 'A', 'explanation': 'Because.'}, **fields)
+
+
+def test_upsert_questions_replaces_by_id_and_keeps_later_ids_unique(store):
+    added = store.add_question(question('Original?'))
+    high_id = added + 1000
+    store.upsert_questions([question('Replaced?', id=added), question('Imported with an id?', id=high_id),
+                            question('Imported without an id?')])
+
+    rows = {row['id']: row for row in store.questions_after(added - 1, limit=10000)}
+    assert rows[added]['question'] == 'Replaced?'
+    assert rows[high_id]['question'] == 'Imported with an id?'
+    assert store.add_question(question('Added after the import?')) > high_id
@@ -0,0 +1,209 @@
+"""The repository interface, against SQLiteStorage and MemoryStorage.
+
+PostgresStorage runs the same kind of checks in test_postgres_storage.py
+when a server is available.
+"""
+import pytest
+
+import app
+from attempt_archive import AttemptArchive
+from leaderboards import ALL_TIME
+from question_io import export_questions, import_questions
+from quiz_sessions import MemoryQuizSessionStore
+from storage import MemoryStorage, SQLiteStorage
+
+
+@pytest.fixture
+def new_store(tmp_path, monkeypatch):
+    """A factory of empty repositories of the backend under test"""
+    connections = []
+
+    def new_store(backend):
+        if backend == 'memory':
+            return MemoryStorage()
+        # A migrated database of its own, with its archive next to it
+        path = tmp_path / f'soloquiz-{len(connections)}.db'
+        monkeypatch.setitem(app.app.config, 'DATABASE', str(path))
+        monkeypatch.setitem(app.app.config, 'ATTEMPT_ARCHIVE_DIR', None)
+        conn = app.connect_db()
+        app.migrate_db(conn)
+        connections.append(conn)
+        return SQLiteStorage(lambda: conn, MemoryQuizSessionStore(), lambda: AttemptArchive(f'{path}-archive'))
+
+    yield new_store
+    for conn in connections:
+        conn.close()
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def store(backend, new_store):
+    return new_store(backend)
+
+
+def question(text, **fields):
+    return dict({'topic': 'Databases', 'level': 'Uni-structural', 'level_order': 2, 'question': text,
+                 'options': '["A", "B"]', 'correct_option': 'A', 'explanation': 'Because.'}, **fields)
+
+
+def attempt(username, q, is_correct=True, timestamp=None):
+    return {'username': username, 'question': q, 'selected_option': 'A' if is_correct else 'B',
+            'is_correct': is_correct, 'timestamp': timestamp}
+
+
+def all_pages(store, username, limit):
+    rows, before = [], None
+    while True:
+        page = store.user_attempts(username, before=before, limit=limit)
+        rows += page
+        if len(page) < limit:
+            return rows
+        before = (page[-1]['timestamp'], page[-1]['id'])
+
+
+def test_add_and_list_questions(store):
+    version = store.question_bank_version()
+    first = store.add_question(question('First?'))
+    assert store.add_questions([question('Second?'), question('Third?', level='Relational', level_order=4)]) == 2
+
+    assert store.question_count() == 3
+    assert store.question_bank_version() != version
+    assert [q['question'] for q in store.list_questions()] == ['First?', 'Second?', 'Third?']
+    assert [q['question'] for q in store.questions_after(first, limit=1)] == ['Second?']
+
+
+def test_upsert_questions_replaces_by_id_and_keeps_later_ids_unique(store):
+    added = store.add_question(question('Original?'))
+    high_id = added + 1000
+    store.upsert_questions([question('Replaced?', id=added), question('Imported with an id?', id=high_id),
+                            question('Imported without an id?')])
+
+    rows = {row['id']: row for row in store.questions_after(added - 1, limit=10000)}
+    assert rows[added]['question'] == 'Replaced?'
+    assert rows[high_id]['question'] == 'Imported with an id?'
+    assert store.add_question(question('Added after the import?')) > high_id
+
+
+def test_search_questions_matches_word_prefixes_and_pages_in_browse_order(store):
+    store.add_questions([question('What is an index?'), question('Why normalize tables?'),
+                         question('What does an index scan read?', topic='Algorithms'),
+                         question('When is an index unused?', level='Relational', level_order=4)])
+
+    assert [q['question'] for q in store.search_questions('ind')] == [
+        'What does an index scan read?', 'What is an index?', 'When is an index unused?']
+    assert [q['question'] for q in store.search_questions('index', topic='Databases', level='Relational')] == [
+        'When is an index unused?']
+
+    first = store.search_questions('index', limit=1)
+    after = (first[0]['topic'], first[0]['level_order'], first[0]['id'])
+    assert [q['question'] for q in store.search_questions('index', after=after)] == [
+        'What is an index?', 'When is an index unused?']
+
+
+def test_add_attempts_updates_progress_stats(store):
+    databases = dict(question('Databases?'), id=store.add_question(question('Databases?')))
+    algorithms = question('Algorithms?', topic='Algorithms', level='Relational', level_order=4)
+    algorithms['id'] = store.add_question(algorithms)
+    store.add_attempts([attempt('ada', databases), attempt('ada', databases, is_correct=False),
+                        attempt('ada', algorithms), attempt('bob', databases)])
+
+    topics, levels = store.progress_stats()
+    assert topics == [{'topic': 'Algorithms', 'correct': 1, 'total': 1},
+                      {'topic': 'Databases', 'correct': 2, 'total': 3}]
+    assert levels == [{'level': 'Uni-structural', 'correct': 2, 'total': 3},
+                      {'level': 'Relational', 'correct': 1, 'total': 1}]
+    topics, levels = store.progress_stats('bob')
+    assert topics == [{'topic': 'Databases', 'correct': 1, 'total': 1}]
+    assert levels == [{'level': 'Uni-structural', 'correct': 1, 'total': 1}]
+
+
+def test_rebuild_rollups_matches_the_incremental_rollups(store):
+    q = dict(question('Rebuilt?'), id=store.add_question(question('Rebuilt?')))
+    store.add_attempts([attempt('ada', q), attempt('ada', q, is_correct=False), attempt('bob', q)])
+    incremental = store.progress_stats(), store.progress_stats('ada')
+
+    assert store.rebuild_rollups(chunk_size=2) == 3
+    assert (store.progress_stats(), store.progress_stats('ada')) == incremental
+
+
+def test_user_attempts_pages_newest_first(store):
+    q = dict(question('Paged?'), id=store.add_question(question('Paged?')))
+    timestamps = ['2024-03-04 10:00:02', '2024-03-04 10:00:00', '2024-03-04 10:00:03', '2024-03-04 10:00:01']
+    store.add_attempts([attempt('ada', q, timestamp=timestamp) for timestamp in timestamps])
+
+    rows = all_pages(store, 'ada', limit=3)
+
+    assert [row['timestamp'] for row in rows] == sorted(timestamps, reverse=True)
+    assert all(row['question_id'] == q['id'] for row in rows)
+
+
+def test_user_attempts_breaks_timestamp_ties_by_id(store):
+    q = dict(question('Tied?'), id=store.add_question(question('Tied?')))
+    store.add_attempts([attempt('ada', q, timestamp='2024-03-04 10:00:00') for _ in range(5)])
+
+    rows = all_pages(store, 'ada', limit=2)
+
+    assert len(rows) == 5
+    assert [row['id'] for row in rows] == sorted((row['id'] for row in rows), reverse=True)
+
+
+def test_archived_attempts_stay_in_the_history(store, backend):
+    q = dict(question('Archived?'), id=store.add_question(question('Archived?')))
+    timestamps = ['2024-01-05 10:00:00', '2024-02-05 10:00:00', '2024-03-05 10:00:00']
+    store.add_attempts([attempt('ada', q, timestamp=timestamp) for timestamp in timestamps])
+    if backend == 'memory':
+        with pytest.raises(NotImplementedError):
+            store.archive_attempts('2024-03-01 00:00:00')
+        return
+
+    assert store.archive_attempts('2024-03-01 00:00:00', batch_size=1) == (2, 2)
+
+    assert [row['timestamp'] for row in all_pages(store, 'ada', limit=2)] == sorted(timestamps, reverse=True)
+    assert sum(len(chunk[0]) for chunk in store.scan_attempts(('id',), chunk_size=2)) == 3
+    assert store.rebuild_rollups() == 3
+
+
+def test_leaderboards_rank_users_by_correct_answers(store):
+    q = dict(question('Ranked?'), id=store.add_question(question('Ranked?')))
+    store.add_attempts([attempt('ada', q), attempt('ada', q), attempt('bob', q), attempt('bob', q, is_correct=False),
+                        attempt('cy', q, is_correct=False)])
+
+    top = store.leaderboard('overall', ALL_TIME)
+    assert [(row['username'], row['correct'], row['total']) for row in top] == [
+        ('ada', 2, 2), ('bob', 1, 2), ('cy', 0, 1)]
+    assert store.leaderboard('topic:Databases', ALL_TIME) == top
+    assert store.leaderboard_rank('overall', ALL_TIME, 'bob') == {'rank': 2, 'users': 3, 'correct': 1, 'total': 2}
+    assert store.leaderboard_rank('overall', ALL_TIME, 'nobody') is None
+
+
+def test_exported_questions_import_into_an_empty_repository(store, new_store, backend):
+    store.add_questions([question('Exported?'), question('Also exported?', level='Relational', level_order=4)])
+    copy = new_store(backend)
+
+    result = import_questions(copy, export_questions(store, batch_size=1), app.SOLO_LEVEL_ORDER, batch_size=1)
+
+    assert (result.imported, result.error_count) == (2, 0)
+    fields = ('id', 'topic', 'level', 'level_order', 'question', 'options', 'correct_option', 'explanation')
+    assert [{field: q[field] for field in fields} for q in copy.list_questions()] == \
+        [{field: q[field] for field in fields} for q in store.list_questions()]
+
+
+def test_generated_drafts_are_staged_and_counted(store):
+    store.create_generation_job('job', total=3, created_at=1.0)
+    store.add_generated_drafts('job', [question('Drafted?'), question('Also drafted?')], failed=1, updated_at=2.0)
+    store.finish_generation_job('job', 'done', updated_at=3.0)
+
+    job = store.generation_job('job')
+    assert {key: job[key] for key in ('status', 'total', 'generated', 'failed', 'error', 'updated_at')} == \
+        {'status': 'done', 'total': 3, 'generated': 2, 'failed': 1, 'error': None, 'updated_at': 3.0}
+    assert store.generation_job('unknown') is None
+
+    drafts = store.question_drafts()
+    assert [(draft['job_id'], draft['question']) for draft in drafts] == [('job', 'Drafted?'), ('job', 'Also drafted?')]
+    store.delete_question_draft(drafts[0]['id'])
+    assert store.question_draft(drafts[0]['id']) is None
+    assert store.question_draft(drafts[1]['id'])['question'] == 'Also drafted?'
@@ -0,0 +1,212 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Bounded in-process queue whose items are written in batches by a flusher thread.
+
+    Each batch is handed to ``write_batch(items)``, which should write it in
+    a single transaction so many rows share one commit (and one fsync), and
+    roll it back on failure. Batches failing with one of ``retry_on`` (e.g. a
+    locked database) are retried with capped backoff.
+    A batch is flushed when it reaches ``batch_size`` items or when its
+    oldest item has waited ``max_latency`` seconds. ``put`` blocks while the
+    queue is full instead of dropping items, and the queue is drained on
+    interpreter shutdown.
+
+    A batch that still fails after ``max_retries`` transient errors, or that
+    fails with any other error, is appended as JSON lines to ``spill_path``
+    and fsynced; the spill file is replayed when the flusher next starts (in
+    any process), so items are written at least once. Items must therefore
+    be JSON-serializable. Without a ``spill_path``, transient errors are
+    retried until they clear.
+    """
+
+    def __init__(self, write_batch, batch_size=100, max_latency=0.05, max_queue=10000,
+                 max_retries=5, retry_on=(sqlite3.OperationalError,), spill_path=None, max_backoff=5.0):
+        self._write_batch = write_batch
+        self._retry_on = retry_on
+        self._batch_size = batch_size
+        self._max_latency = max_latency
+        self._max_retries = max_retries
+        self._max_backoff = max_backoff
+        self._spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._puts_done = threading.Condition(self._lock)
+        self._putting = 0
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def put(self, item):
+        """Queue an item for writing, blocking while the queue is full"""
+        # Counted under the lock so close() can wait for puts already past the check
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('write-behind queue is closed')
+            self._putting += 1
+        try:
+            self._ensure_started()
+            self._queue.put(item)
+        finally:
+            with self._lock:
+                self._putting -= 1
+                if not self._putting:
+                    self._puts_done.notify_all()
+
+    def flush(self):
+        """Block until every queued item has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Stop accepting items and wait for the queue to drain"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Every item queued by an in-flight put must land before the stop marker
+            while self._putting:
+                self._puts_done.wait()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def replay_spilled(self):
+        """Write the items spilled by failed batches; returns how many were written"""
+        if not self._spill_path:
+            return 0
+        written = 0
+        for path in self._claim_spilled():
+            with open(path, encoding='utf-8') as f:
+                items = [json.loads(line) for line in f if line.strip()]
+            for start in range(0, len(items), self._batch_size):
+                batch = items[start:start + self._batch_size]
+                try:
+                    self._write_batch(batch)
+                except Exception:
+                    logger.exception('Replaying spilled write-behind items failed; keeping %d of them',
+                                     len(items) - start)
+                    self._spill(items[start:])
+                    break
+                written += len(batch)
+            os.remove(path)
+        if written:
+            logger.warning('Replayed %d spilled write-behind items', written)
+        return written
+
+    def _claim_spilled(self):
+        # Renaming claims the file, so concurrent workers never replay the same items; replay
+        # files left behind by a process that died mid-replay are claimed again
+        claimed = []
+        candidates = [self._spill_path] + glob.glob(f'{glob.escape(self._spill_path)}.*.replay')
+        for path in candidates:
+            if path != self._spill_path and _process_alive(path[len(self._spill_path) + 1:].split('-')[0]):
+                continue
+            target = f'{self._spill_path}.{os.getpid()}-{len(claimed)}.replay'
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def _spill(self, items):
+        lines = ''.join(json.dumps(item, default=str) + '\n' for item in items)
+        with self._spill_lock, open(self._spill_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _ensure_started(self):
+        # Started lazily so a forked worker (e.g. gunicorn --preload) gets its own flusher
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        try:
+            self.replay_spilled()
+        except Exception:
+            logger.exception('Could not replay spilled write-behind items')
+
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self._max_latency
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _flush_batch(self, batch):
+        attempt = 0
+        while True:
+            try:
+                self._write_batch(batch)
+                return
+            except self._retry_on:
+                if self._spill_path and attempt >= self._max_retries:
+                    logger.exception('Spilling a write-behind batch of %d items after %d retries',
+                                     len(batch), attempt)
+                    self._spill(batch)
+                    return
+                if attempt == self._max_retries:
+                    logger.exception('Write-behind batch of %d items still failing; retrying', len(batch))
+            except Exception:
+                if not self._spill_path:
+                    logger.exception('Dropping a write-behind batch of %d items that cannot be written',
+                                     len(batch))
+                    return
+                logger.exception('Spilling a write-behind batch of %d items that cannot be written', len(batch))
+                self._spill(batch)
+                return
+            time.sleep(min(0.05 * 2 ** attempt, self._max_backoff))
+            attempt += 1
+
+
+def _process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True